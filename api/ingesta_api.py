@@ -0,0 +1,285 @@
+# api/ingesta_api.py
+"""
+Endpoint HTTP local para que n8n registre facturas en Python.
+
+    python -m api.ingesta_api [--host 127.0.0.1] [--puerto 8600]
+
+En el flujo "Asitentente Telegram", un nodo HTTP Request tras Limpia_datos
+(o tras Estructura_datos) hace POST del JSON a /facturas:
+  201 -> {"codigo_mov", "id_transaccion", "fecha_mov", "ids_mov", "duplicada": false}
+  200 -> lo mismo con "duplicada": true si el código ya estaba registrado
+         con el mismo usuario, referencia y líneas (reenvíos de Telegram:
+         no se guarda nada dos veces)
+  409 -> {"codigo_mov", "errores": [...]}  el código ya existe con otro contenido
+  422 -> {"codigo_mov", "errores": [...]}  (factura rechazada, no se guarda nada)
+  400 -> JSON mal formado
+
+Para absorber ráfagas, POST /cola/facturas solo encola la factura
+(services/cola_service.py la registra después):
+  202 -> {"id", "pendientes"}
+  503 -> la cola está llena (COLA_MAX_PENDIENTES), reintentar tras Retry-After
+GET /cola devuelve la profundidad y la latencia de la cola.
+
+Análisis de fotos con caché por SHA-256 (services/analisis_service.py):
+  POST /analisis (bytes de la imagen)
+       200 -> {"hash", "factura", "cache"}; si no está en caché y no hay
+       OPENAI_API_KEY, 404 -> {"hash"} y n8n llama al modelo por su cuenta
+  PUT  /analisis/<hash> (JSON de la factura) guarda lo que devolvió n8n
+  POST /facturas/imagen?id_telegram=... analiza (o toma de la caché) y registra;
+       id_telegram (el chat que envía la foto) es obligatorio y es lo único
+       que decide el usuario: lo que se lea en la imagen no cuenta
+  GET  /analisis/estadisticas  aciertos, latencia del modelo y latencia ahorrada
+
+Usuarios del bot (repositories/usuario_cache.py; caché con TTL corto, ver allí):
+  GET  /usuarios/telegram/<chat id>  200 -> {"id_usuario", "nombre_usuario", "email", "rol"}, 404 si no hay
+  POST /usuarios/telegram  {"email", "id_telegram"} vincula el chat al usuario
+  GET  /usuarios/estadisticas
+
+Si INGESTA_TOKEN está definido, las peticiones deben traer la cabecera
+X-Token con ese valor. GET /salud devuelve el estado del pool de conexiones.
+"""
+import argparse
+import hmac
+import json
+import logging
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from database.connection import estadisticas_pool
+from repositories.usuario_cache import resolvedor_telegram
+from repositories.usuario_repository import UsuarioRepository
+from services.analisis_service import AnalisisError, AnalisisFacturaService, AnalizadorOpenAI, hash_imagen
+from services.cola_service import ColaLlenaError, ColaService
+from services.ingesta_service import FacturaEnConflictoError, FacturaInvalidaError, IngestaService
+
+logger = logging.getLogger(__name__)
+
+MAX_CUERPO = 5 * 1024 * 1024
+
+
+def _json_por_defecto(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f"No serializable: {type(valor).__name__}")
+
+
+class IngestaHandler(BaseHTTPRequestHandler):
+    analisis = AnalisisFacturaService(AnalizadorOpenAI() if os.getenv("OPENAI_API_KEY") else None)
+    service = IngestaService(analisis=analisis)
+    cola = ColaService(max_pendientes=int(os.getenv("COLA_MAX_PENDIENTES", "10000")))
+    token = os.getenv("INGESTA_TOKEN")
+
+    def _responder(self, estado, cuerpo, cabeceras=None):
+        datos = json.dumps(cuerpo, default=_json_por_defecto, ensure_ascii=False).encode("utf-8")
+        self.send_response(estado)
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _autorizado(self):
+        if not self.token:
+            return True
+        return hmac.compare_digest(self.headers.get("X-Token", ""), self.token)
+
+    def _leer_cuerpo(self):
+        longitud = int(self.headers.get("Content-Length") or 0)
+        if longitud <= 0 or longitud > MAX_CUERPO:
+            raise ValueError("Cuerpo vacío o demasiado grande")
+        return self.rfile.read(longitud)
+
+    def _leer_json(self):
+        return json.loads(self._leer_cuerpo())
+
+    def do_GET(self):
+        if self.path == "/salud":
+            self._responder(200, {"estado": "ok", "pool": estadisticas_pool()})
+        elif self.path == "/cola":
+            self._responder(200, self.cola.estadisticas())
+        elif self.path == "/analisis/estadisticas":
+            self._responder(200, self.analisis.estadisticas())
+        elif self.path == "/usuarios/estadisticas":
+            self._responder(200, resolvedor_telegram.estadisticas())
+        elif self.path.startswith("/usuarios/telegram/"):
+            if not self._autorizado():
+                self._responder(401, {"error": "Token no válido"})
+                return
+            try:
+                usuario = resolvedor_telegram.usuario(int(self.path.rsplit("/", 1)[1]))
+            except ValueError:
+                self._responder(400, {"error": "Chat id no válido"})
+                return
+            if usuario:
+                self._responder(200, usuario)
+            else:
+                self._responder(404, {"error": "Chat no vinculado a ningún usuario"})
+        else:
+            self._responder(404, {"error": "Ruta no encontrada"})
+
+    def do_POST(self):
+        if not self._autorizado():
+            self._responder(401, {"error": "Token no válido"})
+            return
+        ruta = urlsplit(self.path)
+        if self.path == "/cola/facturas":
+            self._encolar()
+            return
+        if self.path == "/analisis":
+            self._analizar()
+            return
+        if self.path == "/usuarios/telegram":
+            self._vincular_telegram()
+            return
+        if ruta.path == "/facturas/imagen":
+            self._ingerir_imagen(parse_qs(ruta.query))
+            return
+        if self.path != "/facturas":
+            self._responder(404, {"error": "Ruta no encontrada"})
+            return
+
+        try:
+            datos = self._leer_json()
+        except (ValueError, UnicodeDecodeError) as e:
+            self._responder(400, {"error": f"JSON no válido: {e}"})
+            return
+
+        try:
+            resultado = self.service.ingerir(datos)
+            self._responder(200 if resultado["duplicada"] else 201, resultado)
+        except FacturaEnConflictoError as e:
+            self._responder(409, {"codigo_mov": e.codigo_mov, "errores": e.errores})
+        except FacturaInvalidaError as e:
+            self._responder(422, {"codigo_mov": e.codigo_mov, "errores": e.errores})
+        except Exception as e:
+            logger.exception("Error registrando factura")
+            self._responder(500, {"error": str(e)})
+
+    def do_PUT(self):
+        if not self._autorizado():
+            self._responder(401, {"error": "Token no válido"})
+            return
+        if not self.path.startswith("/analisis/"):
+            self._responder(404, {"error": "Ruta no encontrada"})
+            return
+
+        clave = self.path.rsplit("/", 1)[1]
+        try:
+            self.analisis.guardar(clave, self._leer_json())
+        except (ValueError, UnicodeDecodeError, AnalisisError) as e:
+            self._responder(400, {"error": str(e)})
+            return
+        self._responder(200, {"hash": clave})
+
+    def _analizar(self):
+        try:
+            imagen = self._leer_cuerpo()
+        except ValueError as e:
+            self._responder(400, {"error": str(e)})
+            return
+
+        if self.analisis.analizador is None:
+            # Sin modelo solo se consulta la caché; n8n analiza si no está
+            clave, factura = self.analisis.consultar(imagen)
+            if factura is None:
+                self._responder(404, {"hash": clave})
+            else:
+                self._responder(200, {"hash": clave, "factura": factura, "cache": True})
+            return
+        # analizar ya consulta la caché: una sola búsqueda por petición
+        clave = hash_imagen(imagen)
+        try:
+            clave, factura, cacheado = self.analisis.analizar(imagen)
+            self._responder(200, {"hash": clave, "factura": factura, "cache": cacheado})
+        except Exception as e:
+            logger.exception("Error analizando factura")
+            self._responder(502, {"hash": clave, "error": str(e)})
+
+    def _ingerir_imagen(self, parametros):
+        try:
+            imagen = self._leer_cuerpo()
+        except ValueError as e:
+            self._responder(400, {"error": str(e)})
+            return
+
+        try:
+            id_telegram = int((parametros.get("id_telegram") or [""])[0])
+        except ValueError:
+            self._responder(400, {"error": "Falta id_telegram o no es un chat id válido"})
+            return
+
+        try:
+            resultado = self.service.ingerir_imagen(imagen, id_telegram)
+            self._responder(200 if resultado["duplicada"] else 201, resultado)
+        except FacturaEnConflictoError as e:
+            self._responder(409, {"codigo_mov": e.codigo_mov, "errores": e.errores})
+        except FacturaInvalidaError as e:
+            self._responder(422, {"codigo_mov": e.codigo_mov, "errores": e.errores})
+        except Exception as e:
+            logger.exception("Error registrando factura")
+            self._responder(500, {"error": str(e)})
+
+    def _vincular_telegram(self):
+        try:
+            datos = self._leer_json()
+            email = str(datos["email"]).strip()
+            id_telegram = int(datos["id_telegram"])
+        except (ValueError, KeyError, TypeError, UnicodeDecodeError) as e:
+            self._responder(400, {"error": f"Datos no válidos: {e}"})
+            return
+
+        id_usuario = UsuarioRepository().vincular_telegram(email, id_telegram)
+        if id_usuario is None:
+            self._responder(404, {"error": "No hay ningún usuario con ese email"})
+        else:
+            self._responder(200, {"id_usuario": id_usuario, "id_telegram": id_telegram})
+
+    def _encolar(self):
+        try:
+            datos = self._leer_json()
+        except (ValueError, UnicodeDecodeError) as e:
+            self._responder(400, {"error": f"JSON no válido: {e}"})
+            return
+
+        try:
+            id_cola = self.cola.encolar(datos)
+            self._responder(202, {"id": id_cola, "pendientes": self.cola.repo.pendientes()})
+        except ColaLlenaError as e:
+            self._responder(503, {"error": str(e)}, {"Retry-After": "30"})
+        except Exception as e:
+            logger.exception("Error encolando factura")
+            self._responder(500, {"error": str(e)})
+
+    def log_message(self, formato, *args):
+        if os.getenv("INGESTA_LOG"):
+            super().log_message(formato, *args)
+
+
+def crear_servidor(host="127.0.0.1", puerto=8600):
+    return ThreadingHTTPServer((host, puerto), IngestaHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API de ingesta de facturas")
+    parser.add_argument("--host", default=os.getenv("INGESTA_HOST", "127.0.0.1"))
+    parser.add_argument("--puerto", type=int, default=int(os.getenv("INGESTA_PUERTO", "8600")))
+    args = parser.parse_args()
+
+    servidor = crear_servidor(args.host, args.puerto)
+    print(f"Ingesta de facturas escuchando en http://{args.host}:{args.puerto}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# benchmarks/bench_analisis.py
+"""
+Caché de análisis de facturas con un analizador simulado (AnalizadorStub):
+N fotos de las que una fracción son reenvíos de fotos anteriores, como
+cuando un usuario vuelve a mandar la misma imagen tras un fallo.
+
+    python -m benchmarks.bench_analisis --fotos 200 --reenvios 0.3 --retardo 0.5
+"""
+import argparse
+import os
+import random
+import time
+
+from services.analisis_service import AnalisisFacturaService, AnalizadorStub
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fotos", type=int, default=200)
+    parser.add_argument("--reenvios", type=float, default=0.3, help="fracción de fotos que son reenvíos")
+    parser.add_argument("--retardo", type=float, default=0.5, help="segundos que tarda el analizador simulado")
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    enviadas = []
+    for _ in range(args.fotos):
+        if enviadas and rnd.random() < args.reenvios:
+            enviadas.append(rnd.choice(enviadas))
+        else:
+            enviadas.append(os.urandom(200_000))
+
+    stub = AnalizadorStub(retardo=args.retardo)
+    service = AnalisisFacturaService(stub)
+
+    inicio = time.perf_counter()
+    for imagen in enviadas:
+        service.analizar(imagen)
+    duracion = time.perf_counter() - inicio
+
+    stats = service.estadisticas()
+    sin_cache = args.fotos * args.retardo
+    print(f"fotos: {args.fotos}, llamadas al analizador: {stub.llamadas}")
+    print(f"ratio de aciertos: {stats['ratio_aciertos']:.1%}")
+    print(f"latencia ahorrada: {stats['latencia_ahorrada_ms'] / 1000:.1f}s")
+    print(f"tiempo total: {duracion:.1f}s (sin caché ~{sin_cache:.1f}s)")
+    assert stub.llamadas == len({bytes(i) for i in enviadas}), "Se analizó dos veces la misma foto"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/bench_busqueda.py
+"""
+Latencia de la búsqueda aproximada (ProductoRepository.buscar, índices de
+trigramas) frente al ILIKE '%texto%' anterior sobre un catálogo sintético.
+
+    python -m benchmarks.bench_busqueda --productos 500000 --sembrar --limpiar
+
+Requiere haber aplicado las migraciones (python -m database.migrate).
+"""
+import argparse
+import time
+
+from benchmarks.semilla import PREFIJO, medir
+from database.connection import get_connection
+from repositories.producto_repository import ProductoRepository
+
+TIPOS = ["Monitor", "Teclado", "Ratón", "Portátil", "Cámara", "Auriculares", "Impresora",
+         "Altavoz", "Tableta", "Router", "Micrófono", "Cargador", "Batería", "Proyector"]
+MARCAS = ["Samsung", "Logitech", "Lenovo", "Canon", "Sony", "HP", "Xiaomi", "Philips",
+          "Asus", "Acer", "Epson", "Bosch", "Anker", "TP-Link"]
+CATEGORIAS = ["Informática", "Electrónica", "Fotografía", "Sonido", "Oficina", "Redes"]
+
+# (texto buscado, campo) — incluye erratas y tildes omitidas
+BUSQUEDAS = [
+    ("monitor samsung", "nombre_producto"),
+    ("raton logitec", "nombre_producto"),
+    ("auriculres", "nombre_producto"),
+    ("camara", "nombre_producto"),
+    ("lenvo", "marca"),
+    ("fotografia", "categoria"),
+]
+
+
+def sembrar_catalogo(conn, n_productos):
+    inicio = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO productos (nombre_producto, categoria, marca, stock_actual,
+                                   stock_minimo, precio_unitario, estado)
+            SELECT t.tipos[1 + g %% array_length(t.tipos, 1)] || ' '
+                       || t.marcas[1 + (g / 7) %% array_length(t.marcas, 1)] || ' '
+                       || 'M' || (g %% 9973),
+                   %s || ' ' || t.categorias[1 + g %% array_length(t.categorias, 1)],
+                   t.marcas[1 + (g / 7) %% array_length(t.marcas, 1)],
+                   100, 10, round((1 + random() * 999)::numeric, 2), 'activo'
+            FROM generate_series(1, %s) g,
+                 (SELECT %s::text[] AS tipos, %s::text[] AS marcas, %s::text[] AS categorias) t
+            """,
+            (PREFIJO, n_productos, TIPOS, MARCAS, CATEGORIAS),
+        )
+        cur.execute("ANALYZE productos")
+    conn.commit()
+    print(f"Sembrados {n_productos:,} productos en {time.perf_counter() - inicio:.1f}s")
+
+
+def limpiar_catalogo(conn):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM productos WHERE categoria LIKE %s", (PREFIJO + " %",))
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--productos", type=int, default=500_000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--limite", type=int, default=50)
+    parser.add_argument("--sembrar", action="store_true")
+    parser.add_argument("--limpiar", action="store_true")
+    args = parser.parse_args()
+
+    if args.sembrar:
+        with get_connection() as conn:
+            sembrar_catalogo(conn, args.productos)
+
+    repo = ProductoRepository()
+    try:
+        print(f"{'búsqueda':<22}{'campo':<17}{'ILIKE ms':>10}{'trgm ms':>10}{'ILIKE n':>9}{'trgm n':>8}")
+        for texto, campo in BUSQUEDAS:
+            ilike = medir(lambda: repo.obtener(0, args.limite, campo, texto, "id_producto", True), args.repeticiones)
+            trgm = medir(lambda: repo.buscar(texto, args.limite, [campo]), args.repeticiones)
+            n_ilike = len(repo.obtener(0, args.limite, campo, texto, "id_producto", True))
+            n_trgm = len(repo.buscar(texto, args.limite, [campo]))
+            print(f"{texto:<22}{campo:<17}{ilike[0]:>10.1f}{trgm[0]:>10.1f}{n_ilike:>9}{n_trgm:>8}")
+    finally:
+        if args.limpiar:
+            with get_connection() as conn:
+                limpiar_catalogo(conn)
+
+
+if __name__ == "__main__":
+    main()
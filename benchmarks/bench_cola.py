@@ -0,0 +1,69 @@
+# benchmarks/bench_cola.py
+"""
+Ráfaga de facturas a través de la cola: se encolan N facturas (un % de
+ellas inválidas, que deben acabar en fallidas) y se vacía la cola con
+TrabajadorCola a distintas concurrencias, midiendo throughput y latencia.
+
+    python -m benchmarks.bench_cola --facturas 1000 --concurrencias 1 4 8
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.bench_ingesta import facturas
+from benchmarks.semilla import PREFIJO, limpiar, sembrar
+from database.connection import get_connection
+from services.cola_service import ColaService, TrabajadorCola
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--facturas", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--invalidas", type=float, default=0.05, help="fracción de facturas con un producto inexistente")
+    parser.add_argument("--concurrencias", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        sembrar(conn, n_movimientos=0, n_productos=500)
+        with conn.cursor() as cur:
+            cur.execute("SELECT MIN(id_usuario) FROM usuarios")
+            id_usuario = cur.fetchone()[0]
+            cur.execute(
+                "SELECT nombre_producto, marca FROM productos WHERE nombre_producto LIKE %s",
+                (PREFIJO + " producto %",),
+            )
+            productos = cur.fetchall()
+
+    cola = ColaService(max_pendientes=0)
+    cada_invalida = int(1 / args.invalidas) if args.invalidas else 0
+    try:
+        print(f"{'concurrencia':>12}{'encolar s':>11}{'vaciar s':>10}{'facturas/s':>12}"
+              f"{'hechas':>8}{'fallidas':>9}{'lat. media s':>14}{'lat. p95 s':>12}")
+        for concurrencia in args.concurrencias:
+            inicio = time.perf_counter()
+            for n, factura in enumerate(facturas(f"COLA{concurrencia}", args.facturas, args.items, id_usuario, productos)):
+                if cada_invalida and n % cada_invalida == 0:
+                    factura["items"][0]["nombre_producto"] = "No existe"
+                cola.encolar(factura)
+            encolar = time.perf_counter() - inicio
+
+            trabajador = TrabajadorCola(concurrencia=concurrencia)
+            inicio = time.perf_counter()
+            asyncio.run(trabajador.ejecutar(hasta_vaciar=True))
+            vaciar = time.perf_counter() - inicio
+
+            stats = cola.estadisticas()
+            t = trabajador.estadisticas()
+            print(f"{concurrencia:>12}{encolar:>11.1f}{vaciar:>10.1f}{args.facturas / vaciar:>12.1f}"
+                  f"{t['procesadas']:>8}{t['fallidas']:>9}{stats['latencia_media_s'] or 0:>14.2f}{stats['latencia_p95_s'] or 0:>12.2f}")
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("DELETE FROM cola_facturas WHERE codigo_mov LIKE %s", (PREFIJO + "-%",))
+    finally:
+        with get_connection() as conn:
+            limpiar(conn)
+
+
+if __name__ == "__main__":
+    main()
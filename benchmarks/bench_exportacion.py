@@ -0,0 +1,110 @@
+# benchmarks/bench_exportacion.py
+"""
+Exportación en streaming (services/exportacion_service.py) con un techo
+de memoria fijo:
+
+    python -m benchmarks.bench_exportacion --filas 10000000 --limite-mb 150
+    python -m benchmarks.bench_exportacion --reales --desde 2024-01-01
+
+Por defecto exporta `--filas` filas generadas en el servidor con
+generate_series y las mismas columnas que la exportación de movimientos,
+a CSV y a Parquet, por el mismo camino que las exportaciones reales. Con
+--reales exporta mov_inventario ⨝ transacciones ⨝ productos y productos.
+
+Cada formato se ejecuta en un proceso hijo y se mide su pico de memoria
+residente (ru_maxrss) por encima de la que tenía antes de exportar. Si
+alguno supera --limite-mb el script termina con código 1.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import date
+
+from services.exportacion_service import COLUMNAS_MOVIMIENTOS, FORMATOS, ExportacionService
+
+SQL_SINTETICA = """
+    SELECT g::int8 AS id_mov,
+           'BENCH' || (g / 4)::text AS codigo_mov,
+           TIMESTAMP '2020-01-01' + g * INTERVAL '7 seconds' AS fecha,
+           (ARRAY['venta', 'compra', 'ajuste'])[1 + g %% 3] AS tipo_movimiento,
+           (1 + g %% 100000)::int4 AS id_producto,
+           'Producto ' || (g %% 100000)::text AS nombre_producto,
+           'Marca ' || (g %% 500)::text AS marca,
+           'Categoría ' || (g %% 40)::text AS categoria,
+           (1 + g %% 12)::float8 AS cantidad,
+           round((1 + (g %% 9999) / 100.0)::numeric, 2)::float8 AS precio_unitario,
+           TIMESTAMP '2020-01-01' + (g / 4) * INTERVAL '28 seconds' AS fecha_mov,
+           (1 + g %% 20)::int4 AS id_usuario,
+           NULL::text AS referencia,
+           'manual' AS metodo_registro
+    FROM generate_series(1, %(filas)s) AS g
+"""
+
+
+def pico_mb():
+    # ru_maxrss está en KiB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _exportar(trabajo, formato, args, salida, cola):
+    service = ExportacionService(tam_bloque=args.bloque)
+    base = pico_mb()
+    inicio = time.perf_counter()
+    if trabajo == "sintetica":
+        filas = service.exportar(SQL_SINTETICA, {"filas": args.filas}, COLUMNAS_MOVIMIENTOS, salida, formato)
+    elif trabajo == "movimientos":
+        filas = service.exportar_movimientos(salida, formato, args.desde, args.hasta)
+    else:
+        filas = service.exportar_productos(salida, formato)
+    cola.put((filas, time.perf_counter() - inicio, pico_mb() - base))
+
+
+def medir(trabajo, formato, args):
+    """Exporta en un proceso nuevo para que el pico de memoria sea solo el suyo."""
+    contexto = multiprocessing.get_context("spawn")
+    cola = contexto.Queue()
+    with tempfile.TemporaryDirectory() as directorio:
+        salida = os.path.join(directorio, f"{trabajo}.{formato}")
+        proceso = contexto.Process(target=_exportar, args=(trabajo, formato, args, salida, cola))
+        proceso.start()
+        filas, segundos, memoria = cola.get()
+        proceso.join()
+        tam = os.path.getsize(salida) / 2**20
+    return filas, segundos, memoria, tam
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--filas", type=int, default=10_000_000)
+    parser.add_argument("--bloque", type=int, default=10_000)
+    parser.add_argument("--limite-mb", type=float, default=150)
+    parser.add_argument("--formatos", nargs="+", choices=FORMATOS, default=list(FORMATOS))
+    parser.add_argument("--reales", action="store_true", help="exporta las tablas en lugar de la serie sintética")
+    parser.add_argument("--desde", type=date.fromisoformat, default=None)
+    parser.add_argument("--hasta", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    trabajos = ["movimientos", "productos"] if args.reales else ["sintetica"]
+    print(f"{'exportación':<14}{'formato':<9}{'filas':>13}{'s':>8}{'filas/s':>12}{'MB fichero':>12}{'MB pico':>10}")
+    excedido = False
+    for trabajo in trabajos:
+        for formato in args.formatos:
+            filas, segundos, memoria, tam = medir(trabajo, formato, args)
+            excedido |= memoria > args.limite_mb
+            print(
+                f"{trabajo:<14}{formato:<9}{filas:>13,}{segundos:>8.1f}"
+                f"{filas / max(segundos, 1e-9):>12,.0f}{tam:>12.1f}{memoria:>10.1f}"
+            )
+
+    if excedido:
+        print(f"Se ha superado el límite de {args.limite_mb:.0f} MB")
+        sys.exit(1)
+    print(f"Todas las exportaciones por debajo de {args.limite_mb:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# benchmarks/bench_ingesta.py
+"""
+Throughput de ingesta de facturas de Telegram (N facturas de M items):
+  - n8n:      realiza_validaciones por item (tres subconsultas) y después
+              la transacción y cada movimiento en INSERTs sueltos
+  - servicio: IngestaService.ingerir (una consulta de validación y una
+              transacción de BD por factura)
+  - http:     POST /facturas contra api.ingesta_api con varios clientes a la vez
+
+    python -m benchmarks.bench_ingesta --facturas 1000 --items 5 --clientes 8
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from api.ingesta_api import crear_servidor
+from benchmarks.semilla import PREFIJO, limpiar, sembrar
+from database.connection import get_connection
+from services.ingesta_service import IngestaService
+
+SQL_VALIDACION_N8N = """
+    SELECT %(codigo_mov)s::text AS codigo_mov,
+           (SELECT id_usuario FROM usuarios WHERE id_usuario = %(id_usuario)s LIMIT 1) AS id_usuario,
+           (SELECT id_producto FROM productos
+            WHERE nombre_producto = %(nombre_producto)s AND marca = %(marca)s LIMIT 1) AS id_producto,
+           (SELECT COUNT(*) FROM transacciones WHERE codigo_mov = %(codigo_mov)s) AS duplicado
+"""
+
+
+def facturas(variante, n_facturas, n_items, id_usuario, productos):
+    for f in range(n_facturas):
+        yield {
+            "tipo_movimiento": "venta",
+            "fecha_mov": "2025-01-15",
+            "codigo_mov": f"{PREFIJO}-ING-{variante}-{f}",
+            "id_usuario": str(id_usuario),
+            "metodo_registro": "telegram",
+            "items": [
+                {
+                    "id_producto": "",
+                    "nombre_producto": productos[(f * n_items + i) % len(productos)][0],
+                    "marca": productos[(f * n_items + i) % len(productos)][1],
+                    "cantidad": "1",
+                    "precio_unitario": "",
+                    "precio_total": "",
+                }
+                for i in range(n_items)
+            ],
+        }
+
+
+def ingerir_como_n8n(factura):
+    # Cada nodo Postgres de n8n usa su propia conexión y hace autocommit
+    items = [dict(factura, **item) for item in factura["items"]]
+    validados = []
+    for item in items:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(SQL_VALIDACION_N8N, item)
+                _, id_usuario, id_producto, duplicado = cur.fetchone()
+        if id_usuario and id_producto and duplicado == 0:
+            validados.append((item, id_producto))
+    if not validados:
+        return
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO transacciones (codigo_mov, id_usuario, fecha_mov, metodo_registro) VALUES (%s, %s, %s, %s)",
+                (factura["codigo_mov"], int(factura["id_usuario"]), factura["fecha_mov"], "telegram"),
+            )
+    for item, id_producto in validados:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO mov_inventario (codigo_mov, id_producto, cantidad, tipo_movimiento) VALUES (%s, %s, %s, %s)",
+                    (item["codigo_mov"], id_producto, item["cantidad"], item["tipo_movimiento"]),
+                )
+
+
+def post(url, factura):
+    peticion = urllib.request.Request(
+        url, data=json.dumps(factura).encode(), headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(peticion) as respuesta:
+            return respuesta.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def cronometrar(nombre, n_facturas, funcion):
+    inicio = time.perf_counter()
+    funcion()
+    duracion = time.perf_counter() - inicio
+    print(f"{nombre:<22}{duracion:>10.1f}s{n_facturas / duracion:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--facturas", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--clientes", type=int, default=8, help="peticiones HTTP concurrentes")
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        sembrar(conn, n_movimientos=0, n_productos=500)
+        with conn.cursor() as cur:
+            cur.execute("SELECT MIN(id_usuario) FROM usuarios")
+            id_usuario = cur.fetchone()[0]
+            cur.execute(
+                "SELECT nombre_producto, marca FROM productos WHERE nombre_producto LIKE %s",
+                (PREFIJO + " producto %",),
+            )
+            productos = cur.fetchall()
+
+    service = IngestaService()
+    servidor = crear_servidor("127.0.0.1", 0)
+    url = f"http://127.0.0.1:{servidor.server_address[1]}/facturas"
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    try:
+        print(f"{args.facturas} facturas de {args.items} items")
+        print(f"{'variante':<22}{'tiempo':>11}{'facturas/s':>14}")
+        cronometrar("n8n (por item)", args.facturas, lambda: [
+            ingerir_como_n8n(f) for f in facturas("N8N", args.facturas, args.items, id_usuario, productos)
+        ])
+        cronometrar("servicio", args.facturas, lambda: [
+            service.ingerir(f) for f in facturas("SRV", args.facturas, args.items, id_usuario, productos)
+        ])
+
+        estados = []
+
+        def por_http():
+            with ThreadPoolExecutor(args.clientes) as pool:
+                estados.extend(pool.map(
+                    lambda f: post(url, f),
+                    facturas("HTTP", args.facturas, args.items, id_usuario, productos),
+                ))
+
+        cronometrar(f"http ({args.clientes} clientes)", args.facturas, por_http)
+        rechazadas = sum(1 for e in estados if e != 201)
+        if rechazadas:
+            print(f"Aviso: {rechazadas} peticiones HTTP no devolvieron 201")
+    finally:
+        servidor.shutdown()
+        with get_connection() as conn:
+            limpiar(conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# benchmarks/bench_particiones.py
+"""
+Latencia de las consultas de histórico antes y después de particionar
+mov_inventario (migración 008). Ejecutar una vez con la tabla sin
+particionar, aplicar la migración y volver a ejecutar sobre los mismos datos:
+
+    python -m benchmarks.bench_particiones --movimientos 50000000 --sembrar
+    python -m database.migrate
+    python -m benchmarks.bench_particiones --limpiar
+
+Además de los métodos de los repositorios mide las ventas del mes por
+fecha de movimiento sobre la tabla cruda y cuenta, con EXPLAIN, cuántas
+particiones lee cada consulta.
+"""
+import argparse
+import json
+from datetime import datetime, timedelta
+
+from benchmarks.semilla import limpiar, medir, sembrar
+from database.connection import get_connection
+from repositories.dashboard_repository import DashboardRepository
+from repositories.inventario_repository import InventarioRepository
+
+SQL_VENTAS_MES_CRUDO = """
+    SELECT date_trunc('day', m.fecha) AS dia, SUM(m.cantidad * p.precio_unitario) AS total_dia
+    FROM mov_inventario m
+    JOIN productos p ON p.id_producto = m.id_producto
+    WHERE m.tipo_movimiento = 'venta'
+      AND m.fecha >= %s
+      AND m.fecha < %s
+    GROUP BY 1
+    ORDER BY 1
+"""
+
+
+def ventas_mes_crudo():
+    inicio, fin = DashboardRepository._rango_mes()
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(SQL_VENTAS_MES_CRUDO, (inicio, fin))
+            return cur.fetchall()
+
+
+def tablas_leidas(sql, params):
+    """Tablas/particiones de mov_inventario que aparecen en el plan."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()[0]
+    leidas = set()
+
+    def recorrer(nodo):
+        nombre = nodo.get("Relation Name", "")
+        if nombre.startswith("mov_inventario"):
+            leidas.add(nombre)
+        for hijo in nodo.get("Plans", []):
+            recorrer(hijo)
+
+    recorrer(plan[0]["Plan"] if isinstance(plan, list) else json.loads(plan)[0]["Plan"])
+    return len(leidas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--movimientos", type=int, default=50_000_000)
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--sembrar", action="store_true")
+    parser.add_argument("--limpiar", action="store_true")
+    args = parser.parse_args()
+
+    if args.sembrar:
+        with get_connection() as conn:
+            sembrar(conn, n_movimientos=args.movimientos)
+            with conn.cursor() as cur:
+                cur.execute("ANALYZE mov_inventario")
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = 'mov_inventario'::regclass")
+            particionada = cur.fetchone()[0]
+            cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = 'mov_inventario'::regclass")
+            filas = cur.fetchone()[0]
+
+    dashboard = DashboardRepository()
+    inicio, fin = DashboardRepository._rango_mes()
+    try:
+        print(f"mov_inventario {'particionada' if particionada else 'sin particionar'} (~{filas:,} filas)")
+        print(f"{'consulta':<34}{'mediana ms':>12}{'p95 ms':>10}{'tablas':>8}")
+        casos = [
+            ("obtener_ventas_mes_actual", dashboard.obtener_ventas_mes_actual, None),
+            ("ultimos_movimientos(20)", lambda: InventarioRepository.ultimos_movimientos(20),
+             ("SELECT * FROM mov_inventario m WHERE m.fecha >= %s ORDER BY m.fecha DESC LIMIT 20",
+              ((inicio - timedelta(days=1)).replace(day=1),))),
+            ("ventas del mes por m.fecha", ventas_mes_crudo, (SQL_VENTAS_MES_CRUDO, (inicio, fin))),
+        ]
+        for nombre, funcion, consulta in casos:
+            mediana, p95 = medir(funcion, args.repeticiones)
+            leidas = tablas_leidas(*consulta) if consulta else "-"
+            print(f"{nombre:<34}{mediana:>12.1f}{p95:>10.1f}{leidas:>8}")
+        print("Medido:", datetime.now().isoformat(timespec="seconds"))
+    finally:
+        if args.limpiar:
+            with get_connection() as conn:
+                limpiar(conn)
+
+
+if __name__ == "__main__":
+    main()
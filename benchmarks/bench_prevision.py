@@ -0,0 +1,63 @@
+# benchmarks/bench_prevision.py
+"""
+Ajuste de la previsión de demanda (services/prevision_service.py) sobre
+series sintéticas, sin base de datos:
+
+    python -m benchmarks.bench_prevision --productos 100000 --dias 182 --procesos 1 4 8
+
+Cada producto tiene un nivel y un patrón semanal propios y ventas con
+ruido de Poisson. Mide el ajuste con distinto número de procesos y compara
+el error de la previsión de la semana siguiente con el de la media simple
+de la ventana.
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from services.prevision_service import PrevisionService, prever
+
+
+def series_sinteticas(n_productos, dias, semilla=7):
+    """(series de la ventana, ventas reales de los 7 días siguientes)."""
+    rng = np.random.default_rng(semilla)
+    nivel = rng.gamma(2.0, 3.0, size=n_productos)
+    patron = rng.uniform(0.5, 1.5, size=(n_productos, 7))
+    patron /= patron.mean(axis=1, keepdims=True)
+    dia_semana = np.arange(dias + 7) % 7
+    media = nivel[:, None] * patron[:, dia_semana]
+    ventas = rng.poisson(media).astype(np.float64)
+    return ventas[:, :dias], ventas[:, dias:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--productos", type=int, default=100_000)
+    parser.add_argument("--dias", type=int, default=182)
+    parser.add_argument("--procesos", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--lote", type=int, default=5000)
+    args = parser.parse_args()
+
+    series, siguientes = series_sinteticas(args.productos, args.dias)
+    # La primera fila de la serie es un lunes, así que la semana siguiente también
+    hoy = date(2024, 1, 1) + timedelta(days=args.dias)
+    print(f"{args.productos:,} productos × {args.dias} días")
+
+    print(f"{'procesos':<10}{'ajuste s':>10}{'productos/s':>14}")
+    for procesos in args.procesos:
+        service = PrevisionService(procesos=procesos, tam_lote=args.lote)
+        inicio = time.perf_counter()
+        ajuste = service.ajustar(series, 0)
+        segundos = time.perf_counter() - inicio
+        print(f"{procesos:<10}{segundos:>10.2f}{args.productos / segundos:>14,.0f}")
+
+    prevision = prever(ajuste["nivel"], ajuste["estacionalidad"], hoy, 7)
+    media = np.repeat(series.mean(axis=1, keepdims=True), 7, axis=1)
+    rmse_modelo = np.sqrt(np.mean((prevision - siguientes) ** 2))
+    rmse_media = np.sqrt(np.mean((media - siguientes) ** 2))
+    print(f"RMSE semana siguiente: modelo {rmse_modelo:.3f}, media simple {rmse_media:.3f}")
+
+
+if __name__ == "__main__":
+    main()
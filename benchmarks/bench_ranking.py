@@ -0,0 +1,74 @@
+# benchmarks/bench_ranking.py
+"""
+Ranking de más vendidos: agrupar mov_inventario entero (como hacía
+obtener_ranking_productos_vendidos) frente a los totales por producto de
+la migración 010, y comprobación de que ambos dan las mismas unidades.
+
+    python -m benchmarks.bench_ranking --movimientos 1000000 --sembrar --limpiar
+"""
+import argparse
+
+from benchmarks.semilla import limpiar, medir, sembrar
+from database.connection import get_connection
+from repositories.dashboard_repository import DashboardRepository
+
+# La consulta anterior, agrupando por producto para poder comparar
+SQL_RANKING_COMPLETO = """
+    SELECT m.id_producto, SUM(m.cantidad) AS total_vendido
+    FROM mov_inventario m
+    WHERE m.tipo_movimiento = 'venta'
+    GROUP BY m.id_producto
+    ORDER BY total_vendido DESC, m.id_producto
+    LIMIT %s
+"""
+
+
+def ranking_completo(limite):
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(SQL_RANKING_COMPLETO, (limite,))
+            return cur.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--movimientos", type=int, default=1_000_000)
+    parser.add_argument("--limite", type=int, default=10)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--sembrar", action="store_true")
+    parser.add_argument("--limpiar", action="store_true")
+    args = parser.parse_args()
+
+    if args.sembrar:
+        with get_connection() as conn:
+            sembrar(conn, n_movimientos=args.movimientos)
+            with conn.cursor() as cur:
+                cur.execute("ANALYZE mov_inventario; ANALYZE ventas_producto_totales")
+
+    repo = DashboardRepository()
+    try:
+        esperado = [(i, int(t)) for i, t in ranking_completo(args.limite)]
+        obtenido = [
+            (int(f.id_producto), int(f.total_vendido))
+            for f in repo.ranking_productos("total", args.limite).itertuples()
+        ]
+        print("Mismo top:", "sí" if esperado == obtenido else f"NO\n  {esperado}\n  {obtenido}")
+
+        print(f"{'consulta':<32}{'mediana ms':>12}{'p95 ms':>10}")
+        casos = [
+            ("mov_inventario completo", lambda: ranking_completo(args.limite)),
+            ("totales (histórico)", lambda: repo.ranking_productos("total", args.limite)),
+            ("ventas_diarias (mes)", lambda: repo.ranking_productos("mes", args.limite)),
+            ("ventas_diarias (30 días)", lambda: repo.ranking_productos("30dias", args.limite)),
+        ]
+        for nombre, funcion in casos:
+            mediana, p95 = medir(funcion, args.repeticiones)
+            print(f"{nombre:<32}{mediana:>12.1f}{p95:>10.1f}")
+    finally:
+        if args.limpiar:
+            with get_connection() as conn:
+                limpiar(conn)
+
+
+if __name__ == "__main__":
+    main()
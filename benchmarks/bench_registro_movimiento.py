@@ -0,0 +1,73 @@
+# benchmarks/bench_registro_movimiento.py
+"""
+Coste de registrar una factura de 1, 50 y 500 líneas:
+  - anterior: cabecera en una conexión y después un INSERT ... RETURNING por línea
+  - actual:   InventarioService.registrar_movimiento (una transacción, INSERT multifila)
+
+    python -m benchmarks.bench_registro_movimiento
+"""
+import argparse
+import itertools
+from datetime import datetime
+
+from benchmarks.semilla import PREFIJO, limpiar, medir, sembrar
+from database.connection import get_connection
+from repositories.inventario_repository import InventarioRepository
+from services.inventario_service import InventarioService
+
+_contador = itertools.count(1)
+
+
+def _cabecera(id_usuario):
+    return {
+        "codigo_mov": f"{PREFIJO}-REG-{next(_contador)}",
+        "id_usuario": id_usuario,
+        "fecha_mov": datetime.now(),
+        "metodo_registro": "benchmark",
+        "tipo_movimiento": "compra",
+    }
+
+
+def registrar_linea_a_linea(cabecera, lineas):
+    repo = InventarioRepository
+    conn = get_connection()
+    repo.insertar_transaccion(conn, cabecera["codigo_mov"], cabecera["id_usuario"], cabecera["fecha_mov"], None, "benchmark")
+    conn.commit()
+    conn.close()
+
+    repo.existe_transaccion(cabecera["codigo_mov"])
+    conn = get_connection()
+    for linea in lineas:
+        repo.insertar_mov_inventario(conn, cabecera["codigo_mov"], linea["id_producto"], linea["cantidad"], "compra")
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeticiones", type=int, default=10)
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        sembrar(conn, n_movimientos=0, n_productos=500)
+        with conn.cursor() as cur:
+            cur.execute("SELECT MIN(id_usuario) FROM usuarios")
+            id_usuario = cur.fetchone()[0]
+            cur.execute("SELECT id_producto FROM productos WHERE nombre_producto LIKE %s", (PREFIJO + " producto %",))
+            ids = [r[0] for r in cur.fetchall()]
+
+    service = InventarioService()
+    try:
+        print(f"{'líneas':>7}{'línea a línea ms':>20}{'lote ms':>12}{'mejora':>9}")
+        for n in (1, 50, 500):
+            lineas = [{"id_producto": ids[i % len(ids)], "cantidad": 1} for i in range(n)]
+            anterior = medir(lambda: registrar_linea_a_linea(_cabecera(id_usuario), lineas), args.repeticiones)
+            lote = medir(lambda: service.registrar_movimiento(_cabecera(id_usuario), lineas), args.repeticiones)
+            print(f"{n:>7}{anterior[0]:>20.1f}{lote[0]:>12.1f}{anterior[0] / lote[0]:>8.1f}x")
+    finally:
+        with get_connection() as conn:
+            limpiar(conn)
+
+
+if __name__ == "__main__":
+    main()
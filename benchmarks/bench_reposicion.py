@@ -0,0 +1,145 @@
+# benchmarks/bench_reposicion.py
+"""
+Cálculo de reposición (services/reposicion_service.py) sobre un catálogo
+grande con dos años de ventas diarias:
+
+    python -m benchmarks.bench_reposicion --productos 100000 --dias 730 --sembrar --limpiar
+
+Las ventas se siembran directamente en ventas_diarias (un `--densidad` de
+los días de cada producto tiene ventas) y el cálculo se hace con una
+ventana de `--dias` días. Mide consulta, cálculo NumPy y guardado, y
+compara una muestra de productos con un cálculo fila a fila con statistics.
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from benchmarks.semilla import PREFIJO
+from database.connection import get_connection
+from services.reposicion_service import ReposicionService, factores_z, niveles_servicio
+
+
+def sembrar(conn, n_productos, dias, densidad):
+    inicio = time.perf_counter()
+    hoy = date.today()
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO productos (nombre_producto, categoria, marca, stock_actual,
+                                   stock_minimo, precio_unitario, estado, fecha_creacion)
+            SELECT %s || ' producto ' || g,
+                   'Categoría ' || (g %% 12),
+                   'Marca ' || (g %% 40),
+                   (g * 37) %% 400, 5, 10, 'activo', %s
+            FROM generate_series(1, %s) g
+            """,
+            (PREFIJO, hoy - timedelta(days=dias + 1), n_productos),
+        )
+        cur.execute(
+            """
+            INSERT INTO ventas_diarias (dia, id_producto, categoria, unidades, importe, num_ventas)
+            SELECT d.dia, p.id_producto, p.categoria, u.unidades, u.unidades * 10, 1
+            FROM productos p
+            CROSS JOIN generate_series(%s::date, %s::date, interval '1 day') AS d(dia)
+            CROSS JOIN LATERAL (SELECT 1 + floor(random() * (1 + p.id_producto %% 9)) AS unidades) u
+            WHERE p.nombre_producto LIKE %s
+              AND random() < %s
+            """,
+            (hoy - timedelta(days=dias), hoy - timedelta(days=1), PREFIJO + " producto %", densidad),
+        )
+        filas = cur.rowcount
+    conn.commit()
+    print(f"Sembrados {n_productos:,} productos y {filas:,} días con ventas en {time.perf_counter() - inicio:.1f}s")
+
+
+def limpiar(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            DELETE FROM ventas_diarias
+            WHERE id_producto IN (SELECT id_producto FROM productos WHERE nombre_producto LIKE %s)
+            """,
+            (PREFIJO + " producto %",),
+        )
+        cur.execute("DELETE FROM reposicion_sugerida")
+        cur.execute("DELETE FROM productos WHERE nombre_producto LIKE %s", (PREFIJO + " producto %",))
+    conn.commit()
+
+
+def comprobar(columnas, dias, plazo, revision, muestra=200):
+    """Recalcula `muestra` productos con su serie diaria completa y statistics."""
+    hasta = date.today()
+    desde = hasta - timedelta(days=dias)
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            # Solo los sembrados: existen desde antes de la ventana y tienen stock_minimo 5
+            cur.execute("SELECT id_producto FROM productos WHERE nombre_producto LIKE %s", (PREFIJO + " producto %",))
+            sembrados = {f[0] for f in cur.fetchall()}
+            candidatas = [i for i, id_producto in enumerate(columnas["id_producto"]) if id_producto in sembrados]
+            posiciones = random.sample(candidatas, min(muestra, len(candidatas)))
+            ids = [int(columnas["id_producto"][i]) for i in posiciones]
+
+            cur.execute(
+                """
+                SELECT id_producto, dia, unidades::float8
+                FROM ventas_diarias
+                WHERE id_producto = ANY(%s) AND dia >= %s AND dia < %s
+                """,
+                (ids, desde, hasta),
+            )
+            serie = {i: [0.0] * dias for i in ids}
+            for id_producto, dia, unidades in cur.fetchall():
+                serie[id_producto][(dia - desde).days] = unidades
+
+    errores = 0
+    for i, id_producto in zip(posiciones, ids):
+        media = statistics.fmean(serie[id_producto])
+        desviacion = statistics.stdev(serie[id_producto])
+        z = float(factores_z(niveles_servicio([columnas["nivel_servicio"][i]]))[0])
+        punto = max(media * plazo + z * desviacion * plazo ** 0.5, 5)
+        esperado = (media, desviacion, punto)
+        obtenido = (columnas["demanda_media"][i], columnas["desviacion"][i], columnas["punto_pedido"][i])
+        if not np.allclose(esperado, obtenido, rtol=1e-9, atol=1e-9):
+            errores += 1
+    return len(ids), errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--productos", type=int, default=100_000)
+    parser.add_argument("--dias", type=int, default=730)
+    parser.add_argument("--densidad", type=float, default=0.3)
+    parser.add_argument("--plazo", type=int, default=7)
+    parser.add_argument("--revision", type=int, default=7)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--sembrar", action="store_true")
+    parser.add_argument("--limpiar", action="store_true")
+    args = parser.parse_args()
+
+    if args.sembrar:
+        with get_connection() as conn:
+            sembrar(conn, args.productos, args.dias, args.densidad)
+            with conn.cursor() as cur:
+                cur.execute("ANALYZE ventas_diarias; ANALYZE productos")
+
+    service = ReposicionService(ventana_dias=args.dias, plazo_dias=args.plazo, revision_dias=args.revision)
+    try:
+        print(f"{'ejecución':<12}{'consulta ms':>13}{'cálculo ms':>12}{'guardado ms':>13}{'productos':>11}{'a pedir':>9}")
+        for n in range(1, args.repeticiones + 1):
+            columnas, tiempos = service.calcular()
+            print(f"{n:<12}{tiempos['consulta']:>13.0f}{tiempos['calculo']:>12.1f}{tiempos['guardado']:>13.0f}"
+                  f"{len(columnas['id_producto']):>11,}{int(np.count_nonzero(columnas['cantidad_sugerida'])):>9,}")
+        revisados, errores = comprobar(columnas, args.dias, args.plazo, args.revision)
+        print(f"Comprobados {revisados} productos contra statistics: {errores} diferencias")
+    finally:
+        if args.limpiar:
+            with get_connection() as conn:
+                limpiar(conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/bench_resumen_mes.py
+"""
+Latencia de DashboardRepository.obtener_resumen_mes frente a la versión
+anterior de cuatro consultas, sobre una base sembrada con N movimientos.
+
+    python -m benchmarks.bench_resumen_mes --movimientos 1000000 --sembrar --limpiar
+"""
+import argparse
+from datetime import datetime
+
+from benchmarks.semilla import limpiar, medir, sembrar
+from database.connection import get_connection
+from repositories.dashboard_repository import DashboardRepository
+
+CONSULTAS_ANTERIORES = [
+    """
+    SELECT COUNT(*)
+    FROM mov_inventario m
+    JOIN transacciones t ON m.codigo_mov = t.codigo_mov
+    WHERE m.tipo_movimiento = 'venta'
+      AND EXTRACT(MONTH FROM t.fecha_mov) = %(mes)s
+      AND EXTRACT(YEAR FROM t.fecha_mov) = %(anio)s
+    """,
+    """
+    SELECT COALESCE(SUM(m.cantidad * p.precio_unitario), 0)
+    FROM mov_inventario m
+    JOIN productos p ON m.id_producto = p.id_producto
+    JOIN transacciones t ON m.codigo_mov = t.codigo_mov
+    WHERE m.tipo_movimiento = 'venta'
+      AND EXTRACT(MONTH FROM t.fecha_mov) = %(mes)s
+      AND EXTRACT(YEAR FROM t.fecha_mov) = %(anio)s
+    """,
+    """
+    SELECT COUNT(*)
+    FROM mov_inventario m
+    JOIN transacciones t ON m.codigo_mov = t.codigo_mov
+    WHERE m.tipo_movimiento = 'venta'
+      AND DATE(t.fecha_mov) = CURRENT_DATE
+    """,
+    """
+    SELECT COUNT(*)
+    FROM productos
+    WHERE stock_actual < stock_minimo
+      AND estado = 'activo'
+    """,
+]
+
+
+def resumen_cuatro_consultas():
+    ahora = datetime.now()
+    params = {"mes": ahora.month, "anio": ahora.year}
+    resultados = []
+    conn = get_connection()
+    with conn.cursor() as cur:
+        for sql in CONSULTAS_ANTERIORES:
+            cur.execute(sql, params)
+            resultados.append(cur.fetchone()[0])
+    conn.close()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--movimientos", type=int, default=1_000_000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--sembrar", action="store_true", help="Insertar datos BENCH antes de medir")
+    parser.add_argument("--limpiar", action="store_true", help="Borrar los datos BENCH al terminar")
+    args = parser.parse_args()
+
+    if args.sembrar:
+        with get_connection() as conn:
+            sembrar(conn, n_movimientos=args.movimientos)
+
+    repo = DashboardRepository()
+    try:
+        anterior = medir(resumen_cuatro_consultas, args.repeticiones)
+        actual = medir(repo.obtener_resumen_mes, args.repeticiones)
+
+        print(f"{'variante':<28}{'mediana ms':>12}{'p95 ms':>10}")
+        print(f"{'4 consultas (anterior)':<28}{anterior[0]:>12.1f}{anterior[1]:>10.1f}")
+        print(f"{'1 consulta (FILTER)':<28}{actual[0]:>12.1f}{actual[1]:>10.1f}")
+        print("Resumen:", repo.obtener_resumen_mes())
+    finally:
+        if args.limpiar:
+            with get_connection() as conn:
+                limpiar(conn)
+
+
+if __name__ == "__main__":
+    main()
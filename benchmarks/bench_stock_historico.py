@@ -0,0 +1,93 @@
+# benchmarks/bench_stock_historico.py
+"""
+Stock en fechas pasadas con fotos de stock (migración 009) frente a
+rehacerlo recorriendo mov_inventario entero.
+
+    python -m benchmarks.bench_stock_historico --movimientos 5000000 --sembrar --limpiar
+
+Siembra el histórico, toma las fotos del día 1 de cada mes, comprueba que
+InventarioRepository.stock_a_fecha da lo mismo que la reconstrucción
+completa en varias fechas y mide las dos.
+"""
+import argparse
+from datetime import date, datetime, timedelta
+
+from benchmarks.semilla import PREFIJO, limpiar, medir, sembrar
+from database.connection import get_connection
+from database.mantenimiento import tomar_snapshot_stock, tomar_snapshots_mensuales
+from repositories.inventario_repository import InventarioRepository
+
+# Stock en `fecha` = stock actual menos todo lo movido desde entonces
+SQL_REPLAY = """
+    SELECT p.id_producto,
+           COALESCE(p.stock_actual, 0) - COALESCE(SUM(
+               CASE WHEN m.tipo_movimiento = 'venta' THEN -m.cantidad ELSE m.cantidad END
+           ), 0) AS stock
+    FROM productos p
+    LEFT JOIN mov_inventario m ON m.id_producto = p.id_producto AND m.fecha >= %s
+    WHERE p.id_producto = ANY(%s)
+    GROUP BY p.id_producto
+    ORDER BY p.id_producto
+"""
+
+
+def replay(fecha, ids):
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(SQL_REPLAY, (fecha, ids))
+            return cur.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--movimientos", type=int, default=5_000_000)
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--sembrar", action="store_true")
+    parser.add_argument("--limpiar", action="store_true")
+    args = parser.parse_args()
+
+    if args.sembrar:
+        with get_connection() as conn:
+            sembrar(conn, n_movimientos=args.movimientos)
+            with conn.cursor() as cur:
+                cur.execute("ANALYZE mov_inventario")
+        tomadas = tomar_snapshots_mensuales(date.today() - timedelta(days=730))
+        tomar_snapshot_stock()
+        print(f"Fotos mensuales tomadas: {tomadas}")
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT array_agg(id_producto ORDER BY id_producto) FROM productos WHERE nombre_producto LIKE %s",
+                (PREFIJO + " producto %",),
+            )
+            ids = cur.fetchone()[0] or []
+
+    try:
+        hoy = datetime.now().replace(microsecond=0)
+        fechas = [
+            ("hace 3 días", hoy - timedelta(days=3)),
+            ("hace 45 días, 14:30", (hoy - timedelta(days=45)).replace(hour=14, minute=30)),
+            ("cierre de hace 200 días", (hoy - timedelta(days=200)).date()),
+            ("hace 600 días", hoy - timedelta(days=600)),
+        ]
+        print(f"{len(ids):,} productos")
+        print(f"{'fecha':<26}{'foto ms':>10}{'replay ms':>11}{'iguales':>9}")
+        for nombre, fecha in fechas:
+            limite = datetime.combine(fecha + timedelta(days=1), datetime.min.time()) \
+                if not isinstance(fecha, datetime) else fecha
+            esperado = {i: s for i, s in replay(limite, ids)}
+            obtenido = {f["id_producto"]: f["stock"] for f in InventarioRepository.stock_a_fecha(fecha, ids)}
+            iguales = obtenido == esperado
+
+            foto, _ = medir(lambda: InventarioRepository.stock_a_fecha(fecha, ids), args.repeticiones)
+            completo, _ = medir(lambda: replay(limite, ids), args.repeticiones)
+            print(f"{nombre:<26}{foto:>10.1f}{completo:>11.1f}{'sí' if iguales else 'NO':>9}")
+    finally:
+        if args.limpiar:
+            with get_connection() as conn:
+                limpiar(conn)
+
+
+if __name__ == "__main__":
+    main()
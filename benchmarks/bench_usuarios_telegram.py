@@ -0,0 +1,43 @@
+# benchmarks/bench_usuarios_telegram.py
+"""
+Coste de autenticar un mensaje de Telegram: consulta directa a usuarios
+por id_telegram frente al resolvedor, con chats vinculados y chats
+desconocidos (ambos cacheados, con distinto TTL).
+
+    python -m benchmarks.bench_usuarios_telegram --repeticiones 2000
+"""
+import argparse
+
+from benchmarks.semilla import medir
+from database.connection import get_connection
+from repositories.usuario_cache import ResolvedorTelegram
+from repositories.usuario_repository import UsuarioRepository
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeticiones", type=int, default=2000)
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id_telegram FROM usuarios WHERE id_telegram IS NOT NULL LIMIT 1")
+            fila = cur.fetchone()
+    vinculado = fila[0] if fila else None
+    desconocido = -1
+
+    repo = UsuarioRepository()
+    resolvedor = ResolvedorTelegram(repo)
+
+    print(f"{'variante':<30}{'mediana ms':>12}{'p95 ms':>10}")
+    casos = [("desconocido", desconocido)] + ([("vinculado", vinculado)] if vinculado else [])
+    for nombre, id_telegram in casos:
+        directo = medir(lambda: repo.obtener_por_telegram(id_telegram), args.repeticiones)
+        cacheado = medir(lambda: resolvedor.usuario(id_telegram), args.repeticiones)
+        print(f"{'consulta, ' + nombre:<30}{directo[0]:>12.3f}{directo[1]:>10.3f}")
+        print(f"{'resolvedor, ' + nombre:<30}{cacheado[0]:>12.4f}{cacheado[1]:>10.4f}")
+    print("Caché:", resolvedor.estadisticas())
+
+
+if __name__ == "__main__":
+    main()
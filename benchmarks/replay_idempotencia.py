@@ -0,0 +1,113 @@
+# benchmarks/replay_idempotencia.py
+"""
+Reenvía la misma factura desde muchos hilos a la vez (como un reintento de
+Telegram o un doble clic) y comprueba que solo se registra una vez:
+una transacción, sus líneas una sola vez, el stock descontado una vez y
+todas las respuestas con los mismos ids. Después reenvía cada factura
+con una cantidad cambiada y comprueba que se rechaza como conflicto sin
+tocar nada. La misma prueba, más pequeña, está en
+tests/test_integracion_reenvio.py.
+
+    python -m benchmarks.replay_idempotencia --hilos 16 --rondas 20
+"""
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench_ingesta import facturas
+from benchmarks.semilla import PREFIJO, limpiar, sembrar
+from database.connection import get_connection
+from services.ingesta_service import FacturaEnConflictoError, IngestaService
+
+
+def _stock_bench():
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT SUM(stock_actual) FROM productos WHERE nombre_producto LIKE %s", (PREFIJO + " producto %",))
+            return cur.fetchone()[0]
+
+
+def reenviar_a_la_vez(service, factura, hilos):
+    """
+    Ingiere `factura` desde `hilos` hilos a la vez. Devuelve
+    {"resultados", "transacciones", "lineas", "stock_descontado"} con lo
+    que quedó registrado en la BD con su código.
+    """
+    stock_antes = _stock_bench()
+    barrera = threading.Barrier(hilos)
+
+    def reenviar(_):
+        barrera.wait()
+        return service.ingerir(factura)
+
+    with ThreadPoolExecutor(hilos) as pool:
+        resultados = list(pool.map(reenviar, range(hilos)))
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM transacciones WHERE codigo_mov = %s", (factura["codigo_mov"],))
+            transacciones = cur.fetchone()[0]
+            cur.execute("SELECT COUNT(*) FROM mov_inventario WHERE codigo_mov = %s", (factura["codigo_mov"],))
+            lineas = cur.fetchone()[0]
+    return {
+        "resultados": resultados,
+        "transacciones": transacciones,
+        "lineas": lineas,
+        "stock_descontado": stock_antes - _stock_bench(),
+    }
+
+
+def con_otra_cantidad(factura):
+    """Misma factura (mismo código) con la cantidad del primer item cambiada."""
+    distinta = {**factura, "items": [dict(i) for i in factura["items"]]}
+    distinta["items"][0]["cantidad"] = str(int(distinta["items"][0]["cantidad"]) + 1)
+    return distinta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hilos", type=int, default=16)
+    parser.add_argument("--rondas", type=int, default=20)
+    parser.add_argument("--items", type=int, default=5)
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        sembrar(conn, n_movimientos=0, n_productos=50)
+        with conn.cursor() as cur:
+            cur.execute("SELECT MIN(id_usuario) FROM usuarios")
+            id_usuario = cur.fetchone()[0]
+            cur.execute(
+                "SELECT nombre_producto, marca FROM productos WHERE nombre_producto LIKE %s ORDER BY id_producto",
+                (PREFIJO + " producto %",),
+            )
+            productos = cur.fetchall()
+
+    service = IngestaService()
+    try:
+        for factura in facturas("REPLAY", args.rondas, args.items, id_usuario, productos):
+            r = reenviar_a_la_vez(service, factura, args.hilos)
+            resultados = r["resultados"]
+
+            nuevas = [x for x in resultados if not x["duplicada"]]
+            assert r["transacciones"] == 1, f"{factura['codigo_mov']}: {r['transacciones']} transacciones"
+            assert r["lineas"] == args.items, f"{factura['codigo_mov']}: {r['lineas']} líneas"
+            assert len(nuevas) == 1, f"{factura['codigo_mov']}: {len(nuevas)} respuestas no duplicadas"
+            assert len({x["id_transaccion"] for x in resultados}) == 1
+            assert len({tuple(x["ids_mov"]) for x in resultados}) == 1
+            assert r["stock_descontado"] == args.items, "El stock se descontó más de una vez"
+
+            # Mismo código, otra cantidad: no es un reenvío
+            try:
+                service.ingerir(con_otra_cantidad(factura))
+                raise AssertionError(f"{factura['codigo_mov']}: una factura distinta se tomó como reenvío")
+            except FacturaEnConflictoError:
+                pass
+
+        print(f"OK: {args.rondas} facturas reenviadas {args.hilos} veces a la vez, cada una registrada una sola vez; las distintas con el mismo código, rechazadas.")
+    finally:
+        with get_connection() as conn:
+            limpiar(conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/semilla.py
+"""
+Datos sintéticos para los benchmarks.
+
+Todo lo que se inserta lleva el prefijo BENCH para poder borrarlo después
+con limpiar(). Usar siempre contra una base de datos de pruebas: los
+triggers de la base (stock, agregados...) se disparan igual que en producción.
+"""
+import time
+
+PREFIJO = "BENCH"
+
+
+def sembrar(conn, n_movimientos=1_000_000, n_productos=2_000, lineas_por_transaccion=5, dias_historia=730):
+    """
+    Inserta productos, transacciones y movimientos repartidos en los últimos
+    `dias_historia` días (cada movimiento con la fecha de su transacción).
+    """
+    n_transacciones = max(1, n_movimientos // lineas_por_transaccion)
+    inicio = time.perf_counter()
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT MIN(id_usuario) FROM usuarios")
+        id_usuario = cur.fetchone()[0]
+        if id_usuario is None:
+            raise RuntimeError("La tabla usuarios está vacía: crea al menos un usuario antes de sembrar.")
+
+        cur.execute(
+            """
+            INSERT INTO productos (nombre_producto, categoria, marca, stock_actual,
+                                   stock_minimo, precio_unitario, estado)
+            SELECT %s || ' producto ' || g,
+                   'Categoría ' || (g %% 12),
+                   'Marca ' || (g %% 40),
+                   1000000, 10, round((1 + random() * 99)::numeric, 2), 'activo'
+            FROM generate_series(1, %s) g
+            """,
+            (PREFIJO, n_productos),
+        )
+
+        cur.execute(
+            """
+            INSERT INTO transacciones (codigo_mov, id_usuario, fecha_mov, metodo_registro)
+            SELECT %s || '-' || g, %s,
+                   now() - ((g * 7919) %% (%s * 1440)) * interval '1 minute',
+                   'benchmark'
+            FROM generate_series(1, %s) g
+            """,
+            (PREFIJO, id_usuario, dias_historia, n_transacciones),
+        )
+
+        cur.execute(
+            """
+            INSERT INTO mov_inventario (codigo_mov, id_producto, cantidad, tipo_movimiento, fecha)
+            SELECT %s || '-' || t.n,
+                   p.ids[1 + (g %% array_length(p.ids, 1))],
+                   1 + (g %% 5),
+                   CASE WHEN g %% 10 = 0 THEN 'compra' ELSE 'venta' END,
+                   -- misma fecha que su transacción (ver arriba)
+                   now() - ((t.n * 7919) %% (%s * 1440)) * interval '1 minute'
+            FROM generate_series(1, %s) g
+            CROSS JOIN LATERAL (SELECT 1 + (g - 1) / %s AS n) t,
+                 (SELECT array_agg(id_producto) AS ids
+                  FROM productos WHERE nombre_producto LIKE %s) p
+            """,
+            (PREFIJO, dias_historia, n_movimientos, lineas_por_transaccion, PREFIJO + " producto %"),
+        )
+
+    conn.commit()
+    print(f"Sembrados {n_movimientos:,} movimientos en {time.perf_counter() - inicio:.1f}s")
+
+
+def limpiar(conn):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM mov_inventario WHERE codigo_mov LIKE %s", (PREFIJO + "-%",))
+        cur.execute("DELETE FROM transacciones WHERE codigo_mov LIKE %s", (PREFIJO + "-%",))
+        cur.execute("DELETE FROM productos WHERE nombre_producto LIKE %s", (PREFIJO + " producto %",))
+    conn.commit()
+
+
+def medir(funcion, repeticiones=20, calentamiento=2):
+    """Ejecuta `funcion` varias veces y devuelve (mediana_ms, p95_ms)."""
+    for _ in range(calentamiento):
+        funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    mediana = tiempos[len(tiempos) // 2]
+    p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+    return mediana, p95
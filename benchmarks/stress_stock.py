@@ -0,0 +1,137 @@
+# benchmarks/stress_stock.py
+"""
+Prueba de estrés de ventas concurrentes sobre los mismos productos.
+
+Varios hilos registran ventas aleatorias de unos pocos SKUs con poco stock
+a través de InventarioService.registrar_movimiento. Al final se comprueba
+que ningún stock ha quedado negativo y que lo vendido cuadra con lo que
+descontó la base de datos, y se muestra el throughput. La misma prueba,
+más pequeña, está en tests/test_integracion_stock.py.
+
+    python -m benchmarks.stress_stock --hilos 16 --ventas 200 --skus 5 --stock 300
+"""
+import argparse
+import itertools
+import random
+import threading
+import time
+from datetime import datetime
+
+from benchmarks.semilla import PREFIJO, limpiar
+from database.connection import get_connection
+from services.inventario_service import InventarioService, StockInsuficienteError
+
+_contador = itertools.count(1)
+
+
+def estresar(hilos=16, ventas=200, skus=5, stock=300):
+    """
+    Lanza las ventas concurrentes y borra lo insertado al terminar.
+    Devuelve {"stock": stock inicial, "stock_final": {id: stock},
+    "vendido": {id: unidades}, "resultados": {"ok", "rechazadas", "errores"},
+    "intentos", "duracion"}.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT MIN(id_usuario) FROM usuarios")
+            id_usuario = cur.fetchone()[0]
+            cur.execute(
+                """
+                INSERT INTO productos (nombre_producto, categoria, marca, stock_actual,
+                                       stock_minimo, precio_unitario, estado)
+                SELECT %s || ' producto estres ' || g, 'Estrés', 'Bench', 0, 0, 1, 'activo'
+                FROM generate_series(1, %s) g
+                RETURNING id_producto
+                """,
+                (PREFIJO, skus),
+            )
+            ids = [r[0] for r in cur.fetchall()]
+
+    try:
+        service = InventarioService()
+        # El stock inicial entra como una compra, igual que en producción
+        service.registrar_movimiento(
+            {"codigo_mov": f"{PREFIJO}-ESTRES-INI", "id_usuario": id_usuario, "fecha_mov": datetime.now(),
+             "metodo_registro": "benchmark", "tipo_movimiento": "compra"},
+            [{"id_producto": i, "cantidad": stock} for i in ids],
+        )
+
+        vendido = {i: 0 for i in ids}
+        resultados = {"ok": 0, "rechazadas": 0, "errores": 0}
+        lock = threading.Lock()
+
+        def vendedor(semilla):
+            rnd = random.Random(semilla)
+            for _ in range(ventas):
+                lineas = [
+                    {"id_producto": i, "cantidad": rnd.randint(1, 3)}
+                    for i in rnd.sample(ids, rnd.randint(1, min(3, len(ids))))
+                ]
+                cabecera = {"codigo_mov": f"{PREFIJO}-ESTRES-{next(_contador)}", "id_usuario": id_usuario,
+                            "fecha_mov": datetime.now(), "metodo_registro": "benchmark", "tipo_movimiento": "venta"}
+                try:
+                    service.registrar_movimiento(cabecera, lineas)
+                    with lock:
+                        resultados["ok"] += 1
+                        for l in lineas:
+                            vendido[l["id_producto"]] += l["cantidad"]
+                except StockInsuficienteError:
+                    with lock:
+                        resultados["rechazadas"] += 1
+                except Exception as e:
+                    with lock:
+                        resultados["errores"] += 1
+                    print("Error:", e)
+
+        inicio = time.perf_counter()
+        vendedores = [threading.Thread(target=vendedor, args=(n,)) for n in range(hilos)]
+        for h in vendedores:
+            h.start()
+        for h in vendedores:
+            h.join()
+        duracion = time.perf_counter() - inicio
+
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT id_producto, stock_actual FROM productos WHERE id_producto = ANY(%s)", (ids,))
+                stock_final = dict(cur.fetchall())
+    finally:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM mov_inventario WHERE id_producto = ANY(%s)", (ids,))
+            limpiar(conn)
+
+    return {
+        "stock": stock,
+        "stock_final": stock_final,
+        "vendido": vendido,
+        "resultados": resultados,
+        "intentos": hilos * ventas,
+        "duracion": duracion,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hilos", type=int, default=16)
+    parser.add_argument("--ventas", type=int, default=200, help="ventas que intenta cada hilo")
+    parser.add_argument("--skus", type=int, default=5)
+    parser.add_argument("--stock", type=int, default=300)
+    args = parser.parse_args()
+
+    r = estresar(args.hilos, args.ventas, args.skus, args.stock)
+    resultados, stock_final, vendido = r["resultados"], r["stock_final"], r["vendido"]
+
+    print(f"{r['intentos']} ventas en {r['duracion']:.1f}s -> {r['intentos'] / r['duracion']:.0f} ventas/s")
+    print(f"confirmadas={resultados['ok']} rechazadas={resultados['rechazadas']} errores={resultados['errores']}")
+    for i in stock_final:
+        print(f"  producto {i}: stock final {stock_final[i]} (vendido {vendido[i]} de {args.stock})")
+
+    assert all(stock >= 0 for stock in stock_final.values()), "¡Stock negativo!"
+    assert all(stock_final[i] == args.stock - vendido[i] for i in stock_final), "El stock no cuadra con lo vendido"
+    assert resultados["errores"] == 0, "Hubo errores (¿deadlocks?)"
+    print("OK: ningún stock negativo y todo cuadra.")
+
+
+if __name__ == "__main__":
+    main()
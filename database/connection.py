@@ -1,7 +1,12 @@
 # database/connection.py
 
 import psycopg2
+from psycopg2 import extensions
+import atexit
 import os
+import threading
+import time
+from collections import deque
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -13,24 +18,389 @@ print("Cargando .env desde:", ENV_PATH)
 
 load_dotenv(dotenv_path=ENV_PATH)
 
-def get_connection():
-    try:
-        print("\n========== VARIABLES .ENV ==========")
-        print("HOST:", os.getenv("PGHOST"))
-        print("DB:", os.getenv("PGDATABASE"))
-        print("USER:", os.getenv("PGUSER"))
-        print("PORT:", os.getenv("PGPORT"))
-        print("====================================\n")
-
-        conn = psycopg2.connect(
-            host=os.getenv("PGHOST"),
-            dbname=os.getenv("PGDATABASE"),
-            user=os.getenv("PGUSER"),
-            password=os.getenv("PGPASSWORD"),
-            port=os.getenv("PGPORT")
+# Límites (en milisegundos) de los tramos del histograma de espera del pool
+TRAMOS_ESPERA_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class PoolAgotadoError(Exception):
+    """No se liberó ninguna conexión del pool antes de agotar el timeout."""
+
+
+class _ConexionFisica:
+    """Conexión real de psycopg2 junto con los datos que usa el pool para reciclarla."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.creada_en = time.monotonic()
+        self.ultimo_uso = self.creada_en
+        self.usos = 0
+
+
+class ConexionPrestada:
+    """
+    Envoltorio de una conexión prestada por el pool.
+
+    Se comporta como una conexión de psycopg2 (cursor, commit, rollback,
+    autocommit...), pero close() la devuelve al pool en lugar de cerrarla.
+    Usada como context manager hace commit (o rollback si hubo excepción)
+    y la devuelve al salir. Si se pierde sin devolverla, el recolector la
+    devuelve al pool (con rollback) al destruir el envoltorio.
+    """
+
+    def __init__(self, pool, fisica):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_fisica", fisica)
+
+    def _conn(self):
+        if self._fisica is None:
+            raise psycopg2.InterfaceError("La conexión ya fue devuelta al pool")
+        return self._fisica.conn
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn(), nombre)
+
+    def __setattr__(self, nombre, valor):
+        setattr(self._conn(), nombre, valor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self._fisica is not None and not self._fisica.conn.closed:
+                if exc_type is None:
+                    self._fisica.conn.commit()
+                else:
+                    self._fisica.conn.rollback()
+        finally:
+            self.close()
+        return False
+
+    @property
+    def devuelta(self):
+        return self._fisica is None
+
+    def rollback(self):
+        # Tras devolverla al pool el rollback ya se hizo: no hay nada que deshacer
+        if self._fisica is not None:
+            self._fisica.conn.rollback()
+
+    def close(self):
+        fisica = self._fisica
+        if fisica is None:
+            return
+        object.__setattr__(self, "_fisica", None)
+        self._pool._devolver(fisica)
+
+    def __del__(self):
+        # Red de seguridad: si alguien la pierde sin close() (p. ej. una
+        # excepción antes de llegar a él) el hueco vuelve al pool igualmente
+        if self.__dict__.get("_fisica") is not None:
+            try:
+                self.close()
+            except Exception:
+                pass
+
+
+class ConexionPool:
+    """
+    Pool de conexiones PostgreSQL acotado y seguro entre hilos.
+
+    - minimo / maximo: conexiones que se mantienen abiertas y límite total.
+    - timeout: segundos que se espera a que quede una conexión libre.
+    - max_usos / max_edad: una conexión se recicla tras N préstamos o X segundos.
+    - ping_inactiva: si una conexión lleva más de X segundos sin usarse se
+      comprueba con SELECT 1 antes de entregarla.
+    """
+
+    def __init__(self, minimo=1, maximo=10, timeout=10.0, max_usos=500,
+                 max_edad=1800.0, ping_inactiva=30.0, **parametros):
+        if maximo < 1 or minimo < 0 or minimo > maximo:
+            raise ValueError("Tamaño de pool inválido")
+
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.max_usos = max_usos
+        self.max_edad = max_edad
+        self.ping_inactiva = ping_inactiva
+        self._parametros = parametros
+
+        self._cond = threading.Condition()
+        self._inactivas = deque()
+        self._total = 0
+        self._en_uso = 0
+        self._esperando = 0
+        self._cerrado = False
+
+        self._prestamos = 0
+        self._timeouts = 0
+        self._creadas = 0
+        self._recicladas = 0
+        self._descartadas = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+        self._histograma = [0] * (len(TRAMOS_ESPERA_MS) + 1)
+
+        for _ in range(minimo):
+            try:
+                fisica = self._crear()
+            except psycopg2.Error:
+                break
+            with self._cond:
+                self._total += 1
+                self._inactivas.append(fisica)
+
+    # Gestión interna
+    def _crear(self):
+        conn = psycopg2.connect(**self._parametros)
+        with self._cond:
+            self._creadas += 1
+        return _ConexionFisica(conn)
+
+    def _cerrar_fisica(self, fisica):
+        try:
+            fisica.conn.close()
+        except Exception:
+            pass
+
+    def _caducada(self, fisica, ahora):
+        return (
+            (self.max_usos and fisica.usos >= self.max_usos)
+            or (self.max_edad and ahora - fisica.creada_en >= self.max_edad)
         )
-        return conn
+
+    def _sana(self, fisica, ahora):
+        if fisica.conn.closed:
+            return False
+        if self.ping_inactiva is not None and ahora - fisica.ultimo_uso >= self.ping_inactiva:
+            try:
+                with fisica.conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                fisica.conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def _registrar_espera(self, segundos):
+        ms = segundos * 1000
+        tramo = len(TRAMOS_ESPERA_MS)
+        for i, limite in enumerate(TRAMOS_ESPERA_MS):
+            if ms <= limite:
+                tramo = i
+                break
+        self._histograma[tramo] += 1
+        self._espera_total += segundos
+        self._espera_max = max(self._espera_max, segundos)
+
+    # API pública
+    def obtener(self, timeout=None):
+        """Presta una conexión del pool; espera como mucho `timeout` segundos."""
+        timeout = self.timeout if timeout is None else timeout
+        inicio = time.monotonic()
+        limite = inicio + timeout
+
+        while True:
+            fisica = None
+            crear = False
+
+            with self._cond:
+                self._esperando += 1
+                try:
+                    while not self._inactivas and self._total >= self.maximo:
+                        if self._cerrado:
+                            raise PoolAgotadoError("El pool está cerrado")
+                        restante = limite - time.monotonic()
+                        if restante <= 0:
+                            self._timeouts += 1
+                            raise PoolAgotadoError(
+                                f"Sin conexiones libres tras {timeout:.1f}s "
+                                f"({self._en_uso}/{self.maximo} en uso)"
+                            )
+                        self._cond.wait(restante)
+                finally:
+                    self._esperando -= 1
+
+                if self._cerrado:
+                    raise PoolAgotadoError("El pool está cerrado")
+
+                if self._inactivas:
+                    fisica = self._inactivas.pop()
+                else:
+                    # Reservamos el hueco y conectamos fuera del lock
+                    self._total += 1
+                    crear = True
+                self._en_uso += 1
+
+            if crear:
+                try:
+                    fisica = self._crear()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._en_uso -= 1
+                        self._cond.notify()
+                    raise
+            else:
+                ahora = time.monotonic()
+                caducada = self._caducada(fisica, ahora)
+                if caducada or not self._sana(fisica, ahora):
+                    self._cerrar_fisica(fisica)
+                    with self._cond:
+                        self._total -= 1
+                        self._en_uso -= 1
+                        if caducada:
+                            self._recicladas += 1
+                        else:
+                            self._descartadas += 1
+                        self._cond.notify()
+                    continue
+
+            fisica.usos += 1
+            with self._cond:
+                self._prestamos += 1
+                self._registrar_espera(time.monotonic() - inicio)
+            return ConexionPrestada(self, fisica)
+
+    def _devolver(self, fisica):
+        descartar = fisica.conn.closed
+        if not descartar:
+            try:
+                if fisica.conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    fisica.conn.rollback()
+                if fisica.conn.autocommit:
+                    fisica.conn.autocommit = False
+            except Exception:
+                descartar = True
+
+        fisica.ultimo_uso = time.monotonic()
+        if not descartar and self._caducada(fisica, fisica.ultimo_uso):
+            descartar = True
+            reciclada = True
+        else:
+            reciclada = False
+
+        with self._cond:
+            self._en_uso -= 1
+            if descartar or self._cerrado:
+                self._total -= 1
+                if reciclada:
+                    self._recicladas += 1
+                elif not self._cerrado:
+                    self._descartadas += 1
+            else:
+                self._inactivas.append(fisica)
+            self._cond.notify()
+
+        if descartar or self._cerrado:
+            self._cerrar_fisica(fisica)
+
+    def estadisticas(self):
+        """Foto del estado del pool: ocupación, contadores e histograma de espera."""
+        with self._cond:
+            etiquetas = [f"<={limite}ms" for limite in TRAMOS_ESPERA_MS]
+            etiquetas.append(f">{TRAMOS_ESPERA_MS[-1]}ms")
+            return {
+                "minimo": self.minimo,
+                "maximo": self.maximo,
+                "abiertas": self._total,
+                "en_uso": self._en_uso,
+                "inactivas": len(self._inactivas),
+                "esperando": self._esperando,
+                "prestamos": self._prestamos,
+                "timeouts": self._timeouts,
+                "creadas": self._creadas,
+                "recicladas": self._recicladas,
+                "descartadas": self._descartadas,
+                "espera_media_ms": (
+                    round(self._espera_total * 1000 / self._prestamos, 3) if self._prestamos else 0.0
+                ),
+                "espera_max_ms": round(self._espera_max * 1000, 3),
+                "histograma_espera": dict(zip(etiquetas, self._histograma)),
+            }
+
+    def cerrar(self):
+        with self._cond:
+            self._cerrado = True
+            inactivas = list(self._inactivas)
+            self._inactivas.clear()
+            self._total -= len(inactivas)
+            self._cond.notify_all()
+        for fisica in inactivas:
+            self._cerrar_fisica(fisica)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Devuelve el pool compartido por todo el proceso (se crea la primera vez)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                print("\n========== VARIABLES .ENV ==========")
+                print("HOST:", os.getenv("PGHOST"))
+                print("DB:", os.getenv("PGDATABASE"))
+                print("USER:", os.getenv("PGUSER"))
+                print("PORT:", os.getenv("PGPORT"))
+                print("====================================\n")
+
+                _pool = ConexionPool(
+                    minimo=int(os.getenv("PGPOOL_MIN", "1")),
+                    maximo=int(os.getenv("PGPOOL_MAX", "10")),
+                    timeout=float(os.getenv("PGPOOL_TIMEOUT", "10")),
+                    max_usos=int(os.getenv("PGPOOL_MAX_USOS", "500")),
+                    max_edad=float(os.getenv("PGPOOL_MAX_EDAD", "1800")),
+                    ping_inactiva=float(os.getenv("PGPOOL_PING_INACTIVA", "30")),
+                    host=os.getenv("PGHOST"),
+                    dbname=os.getenv("PGDATABASE"),
+                    user=os.getenv("PGUSER"),
+                    password=os.getenv("PGPASSWORD"),
+                    port=os.getenv("PGPORT"),
+                )
+    return _pool
+
+
+def estadisticas_pool():
+    return get_pool().estadisticas()
+
+
+def cerrar_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.cerrar()
+            _pool = None
+
+
+atexit.register(cerrar_pool)
+
+
+def get_connection(statement_timeout_ms=None):
+    """
+    Presta una conexión del pool compartido.
+
+    Usar con `with get_connection() as conn:` (commit/rollback y devolución
+    automática) o llamar a conn.close() en un finally para devolverla al pool.
+    Con statement_timeout_ms, Postgres cancela las consultas de su primera
+    transacción que pasen de ese tiempo (SET LOCAL: no queda en la conexión
+    al devolverla al pool).
+    """
+    try:
+        conn = get_pool().obtener()
 
     except Exception as e:
         print("❌ ERROR AL CONECTAR A LA BD:", e)
         return None
+
+    if statement_timeout_ms:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL statement_timeout = %s", (int(statement_timeout_ms),))
+        except Exception as e:
+            conn.close()
+            print("❌ ERROR AL CONECTAR A LA BD:", e)
+            return None
+    return conn
@@ -0,0 +1,120 @@
+# database/mantenimiento.py
+"""
+Tareas de mantenimiento de la base de datos.
+
+    python -m database.mantenimiento reconstruir-ventas-diarias [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD]
+    python -m database.mantenimiento crear-particiones [--meses 3]
+    python -m database.mantenimiento snapshot-stock [--momento AAAA-MM-DD[THH:MM]] [--mensuales-desde AAAA-MM-DD] [--conservar-dias N]
+"""
+import argparse
+from datetime import date, datetime, timedelta
+
+from database.connection import get_connection
+
+
+def reconstruir_ventas_diarias(desde: date = None, hasta: date = None) -> int:
+    """
+    Recalcula ventas_diarias para [desde, hasta) a partir de mov_inventario
+    y, en la misma transacción, los totales por producto del ranking
+    (ventas_producto_totales, migración 010), que salen de ventas_diarias.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT reconstruir_ventas_diarias(%s, %s)", (desde, hasta))
+            filas = cur.fetchone()[0]
+            cur.execute("SELECT reconstruir_ventas_producto_totales()")
+            return filas
+
+
+def crear_particiones(meses: int = 3) -> int:
+    """
+    Crea las particiones mensuales de mov_inventario que falten desde el mes
+    actual hasta `meses` meses vista (migración 008). Lanzarlo al menos una
+    vez al mes (cron) si la base no tiene pg_cron.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT crear_particiones_mov_inventario(%s)", (meses,))
+            return cur.fetchone()[0]
+
+
+def tomar_snapshot_stock(momento: datetime = None) -> int:
+    """
+    Guarda el stock de todos los productos en `momento` (por defecto, las
+    00:00 de hoy) en stock_snapshots (migración 009). Lanzarlo a diario
+    (cron) si la base no tiene pg_cron.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            if momento is None:
+                cur.execute("SELECT tomar_snapshot_stock()")
+            else:
+                cur.execute("SELECT tomar_snapshot_stock(%s)", (momento,))
+            return cur.fetchone()[0]
+
+
+def tomar_snapshots_mensuales(desde: date) -> int:
+    """
+    Rellena las fotos del día 1 de cada mes desde `desde` hasta hoy, para
+    que las consultas de stock histórico no tengan que recorrer los meses
+    anteriores a la migración. Devuelve cuántas fotos ha tomado.
+    """
+    mes = desde.replace(day=1)
+    if mes < desde:
+        mes = (mes.replace(day=28) + timedelta(days=4)).replace(day=1)
+    tomadas = 0
+    while mes <= date.today():
+        tomar_snapshot_stock(datetime.combine(mes, datetime.min.time()))
+        tomadas += 1
+        mes = (mes.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return tomadas
+
+
+def purgar_snapshots_stock(conservar_dias: int) -> int:
+    """Borra las fotos diarias de más de `conservar_dias` días (las del día 1 de cada mes se conservan)."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT purgar_snapshots_stock(%s)", (conservar_dias,))
+            return cur.fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de la base de datos")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_ventas = sub.add_parser("reconstruir-ventas-diarias", help="Rehacer el agregado diario de ventas")
+    p_ventas.add_argument("--desde", type=date.fromisoformat, default=None)
+    p_ventas.add_argument("--hasta", type=date.fromisoformat, default=None)
+
+    p_particiones = sub.add_parser("crear-particiones", help="Crear las particiones de los próximos meses")
+    p_particiones.add_argument("--meses", type=int, default=3)
+
+    p_snapshot = sub.add_parser("snapshot-stock", help="Guardar una foto del stock de todos los productos")
+    p_snapshot.add_argument("--momento", type=datetime.fromisoformat, default=None,
+                            help="instante de la foto (por defecto, las 00:00 de hoy)")
+    p_snapshot.add_argument("--mensuales-desde", type=date.fromisoformat, default=None,
+                            help="rellenar también las fotos del día 1 de cada mes desde esta fecha")
+    p_snapshot.add_argument("--conservar-dias", type=int, default=None,
+                            help="borrar las fotos diarias más antiguas que estos días")
+
+    args = parser.parse_args()
+
+    if args.comando == "reconstruir-ventas-diarias":
+        filas = reconstruir_ventas_diarias(args.desde, args.hasta)
+        print(f"ventas_diarias reconstruida: {filas} fila(s).")
+    elif args.comando == "crear-particiones":
+        creadas = crear_particiones(args.meses)
+        print(f"Particiones de mov_inventario creadas: {creadas}.")
+    elif args.comando == "snapshot-stock":
+        if args.mensuales_desde:
+            tomadas = tomar_snapshots_mensuales(args.mensuales_desde)
+            print(f"Fotos mensuales de stock tomadas: {tomadas}.")
+        filas = tomar_snapshot_stock(args.momento)
+        print(f"Foto de stock guardada: {filas} producto(s).")
+        if args.conservar_dias is not None:
+            borradas = purgar_snapshots_stock(args.conservar_dias)
+            print(f"Fotos antiguas borradas: {borradas} fila(s).")
+
+
+if __name__ == "__main__":
+    main()
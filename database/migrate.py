@@ -0,0 +1,95 @@
+# database/migrate.py
+"""
+Aplica en orden los scripts de database/migrations que aún no se han ejecutado.
+
+    python -m database.migrate            # aplica las pendientes
+    python -m database.migrate --listar   # muestra aplicadas y pendientes
+
+Cada script se ejecuta en su propia transacción y queda registrado en la
+tabla schema_migrations, así que volver a lanzar el comando es seguro.
+"""
+import argparse
+from pathlib import Path
+
+from database.connection import get_connection
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+
+def _asegurar_tabla(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version     TEXT PRIMARY KEY,
+                aplicada_en TIMESTAMP NOT NULL DEFAULT now()
+            )
+            """
+        )
+    conn.commit()
+
+
+def listar_migraciones():
+    return sorted(p for p in MIGRATIONS_DIR.glob("*.sql"))
+
+
+def aplicadas(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cur.fetchall()}
+
+
+def migrar():
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+
+    try:
+        _asegurar_tabla(conn)
+        hechas = aplicadas(conn)
+        nuevas = []
+
+        for script in listar_migraciones():
+            version = script.stem
+            if version in hechas:
+                continue
+            print(f"Aplicando {script.name}...")
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(script.read_text(encoding="utf-8"))
+                    cur.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (version,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                print(f"❌ Error en {script.name}; se deshizo la migración.")
+                raise
+            nuevas.append(version)
+
+        print(f"{len(nuevas)} migración(es) aplicada(s).")
+        return nuevas
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migraciones de la base de datos")
+    parser.add_argument("--listar", action="store_true", help="Solo mostrar el estado")
+    args = parser.parse_args()
+
+    if args.listar:
+        conn = get_connection()
+        try:
+            _asegurar_tabla(conn)
+            hechas = aplicadas(conn)
+        finally:
+            conn.close()
+        for script in listar_migraciones():
+            estado = "aplicada" if script.stem in hechas else "pendiente"
+            print(f"{script.stem:<40}{estado}")
+        return
+
+    migrar()
+
+
+if __name__ == "__main__":
+    main()
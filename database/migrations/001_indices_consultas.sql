@@ -0,0 +1,23 @@
+-- 001_indices_consultas.sql
+-- Índices que usan los filtros por rango de fechas del dashboard
+-- ([inicio, fin) sobre transacciones.fecha_mov) y los joins por codigo_mov.
+
+CREATE INDEX IF NOT EXISTS idx_transacciones_fecha_mov
+    ON transacciones (fecha_mov);
+
+CREATE INDEX IF NOT EXISTS idx_transacciones_codigo_mov
+    ON transacciones (codigo_mov);
+
+CREATE INDEX IF NOT EXISTS idx_mov_inventario_tipo_codigo
+    ON mov_inventario (tipo_movimiento, codigo_mov);
+
+CREATE INDEX IF NOT EXISTS idx_mov_inventario_id_producto
+    ON mov_inventario (id_producto);
+
+CREATE INDEX IF NOT EXISTS idx_mov_inventario_fecha
+    ON mov_inventario (fecha);
+
+-- Productos activos: el recuento de bajo stock se resuelve solo con el índice
+CREATE INDEX IF NOT EXISTS idx_productos_activos
+    ON productos (id_producto) INCLUDE (stock_actual, stock_minimo)
+    WHERE estado = 'activo';
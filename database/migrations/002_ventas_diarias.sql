@@ -0,0 +1,179 @@
+-- 002_ventas_diarias.sql
+-- Agregado diario de ventas (día × producto) que leen las métricas del
+-- dashboard. Se mantiene con triggers sobre mov_inventario y transacciones,
+-- así que se actualiza igual desde la app que desde n8n (Regista_movimientos).
+--
+-- El día de una venta es DATE(transacciones.fecha_mov), como en las
+-- consultas del dashboard. Si el movimiento llega antes que su transacción
+-- (n8n inserta ambas en ramas paralelas) se usa DATE(mov_inventario.fecha)
+-- y se corrige al insertar la transacción.
+-- El importe se congela con el precio_unitario vigente al registrar la venta.
+
+CREATE TABLE IF NOT EXISTS ventas_diarias (
+    dia          DATE    NOT NULL,
+    id_producto  INTEGER NOT NULL,
+    categoria    TEXT,
+    unidades     NUMERIC NOT NULL DEFAULT 0,
+    importe      NUMERIC NOT NULL DEFAULT 0,
+    num_ventas   INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, id_producto)
+);
+
+CREATE INDEX IF NOT EXISTS idx_ventas_diarias_producto
+    ON ventas_diarias (id_producto, dia);
+
+
+-- Suma (p_signo = 1) o resta (p_signo = -1) una línea de venta al agregado
+CREATE OR REPLACE FUNCTION ventas_diarias_acumular(
+    p_dia DATE, p_id_producto INTEGER, p_cantidad NUMERIC, p_signo INTEGER
+) RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO ventas_diarias AS v (dia, id_producto, categoria, unidades, importe, num_ventas)
+    SELECT p_dia,
+           p_id_producto,
+           p.categoria,
+           p_signo * p_cantidad,
+           p_signo * p_cantidad * COALESCE(p.precio_unitario, 0),
+           p_signo
+    FROM (SELECT 1) AS uno
+    LEFT JOIN productos p ON p.id_producto = p_id_producto
+    ON CONFLICT (dia, id_producto) DO UPDATE
+        SET unidades   = v.unidades + EXCLUDED.unidades,
+            importe    = v.importe + EXCLUDED.importe,
+            num_ventas = v.num_ventas + EXCLUDED.num_ventas;
+
+    IF p_signo < 0 THEN
+        DELETE FROM ventas_diarias
+        WHERE dia = p_dia AND id_producto = p_id_producto AND num_ventas <= 0;
+    END IF;
+END;
+$$;
+
+
+-- Día al que se imputa un movimiento
+CREATE OR REPLACE FUNCTION ventas_diarias_dia(p_codigo_mov TEXT, p_fecha TIMESTAMP)
+RETURNS DATE LANGUAGE sql STABLE AS $$
+    SELECT COALESCE(
+        (SELECT t.fecha_mov::date
+         FROM transacciones t
+         WHERE t.codigo_mov = p_codigo_mov
+         ORDER BY t.id_transaccion
+         LIMIT 1),
+        p_fecha::date,
+        CURRENT_DATE
+    );
+$$;
+
+
+CREATE OR REPLACE FUNCTION trg_ventas_diarias_mov() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.tipo_movimiento = 'venta' THEN
+        PERFORM ventas_diarias_acumular(
+            ventas_diarias_dia(OLD.codigo_mov, OLD.fecha), OLD.id_producto, OLD.cantidad, -1
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.tipo_movimiento = 'venta' THEN
+        PERFORM ventas_diarias_acumular(
+            ventas_diarias_dia(NEW.codigo_mov, NEW.fecha), NEW.id_producto, NEW.cantidad, 1
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS ventas_diarias_mov ON mov_inventario;
+CREATE TRIGGER ventas_diarias_mov
+    AFTER INSERT OR UPDATE OR DELETE ON mov_inventario
+    FOR EACH ROW EXECUTE FUNCTION trg_ventas_diarias_mov();
+
+
+-- Reimputa las ventas de un código cuando cambia el día de su transacción
+CREATE OR REPLACE FUNCTION trg_ventas_diarias_transaccion() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    mov RECORD;
+    origen DATE;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        -- Solo la primera transacción de un código fija el día
+        IF EXISTS (
+            SELECT 1 FROM transacciones
+            WHERE codigo_mov = NEW.codigo_mov AND id_transaccion < NEW.id_transaccion
+        ) THEN
+            RETURN NULL;
+        END IF;
+    ELSIF OLD.fecha_mov::date = NEW.fecha_mov::date THEN
+        RETURN NULL;
+    END IF;
+
+    FOR mov IN
+        SELECT id_producto, cantidad, fecha
+        FROM mov_inventario
+        WHERE codigo_mov = NEW.codigo_mov
+          AND tipo_movimiento = 'venta'
+    LOOP
+        IF TG_OP = 'INSERT' THEN
+            origen := COALESCE(mov.fecha::date, CURRENT_DATE);
+        ELSE
+            origen := OLD.fecha_mov::date;
+        END IF;
+
+        IF origen <> NEW.fecha_mov::date THEN
+            PERFORM ventas_diarias_acumular(origen, mov.id_producto, mov.cantidad, -1);
+            PERFORM ventas_diarias_acumular(NEW.fecha_mov::date, mov.id_producto, mov.cantidad, 1);
+        END IF;
+    END LOOP;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS ventas_diarias_transaccion ON transacciones;
+CREATE TRIGGER ventas_diarias_transaccion
+    AFTER INSERT OR UPDATE OF fecha_mov ON transacciones
+    FOR EACH ROW EXECUTE FUNCTION trg_ventas_diarias_transaccion();
+
+
+-- Recalcula el agregado desde mov_inventario para [p_desde, p_hasta)
+-- (NULL = sin límite). Devuelve el número de filas generadas.
+CREATE OR REPLACE FUNCTION reconstruir_ventas_diarias(
+    p_desde DATE DEFAULT NULL, p_hasta DATE DEFAULT NULL
+) RETURNS INTEGER LANGUAGE plpgsql AS $$
+DECLARE
+    filas INTEGER;
+BEGIN
+    -- Bloquea a los triggers mientras se recalcula el rango
+    LOCK TABLE ventas_diarias IN SHARE ROW EXCLUSIVE MODE;
+
+    DELETE FROM ventas_diarias
+    WHERE (p_desde IS NULL OR dia >= p_desde)
+      AND (p_hasta IS NULL OR dia < p_hasta);
+
+    INSERT INTO ventas_diarias (dia, id_producto, categoria, unidades, importe, num_ventas)
+    SELECT v.dia,
+           v.id_producto,
+           MAX(p.categoria),
+           SUM(v.cantidad),
+           SUM(v.cantidad * COALESCE(p.precio_unitario, 0)),
+           COUNT(*)
+    FROM (
+        SELECT COALESCE(t.fecha_mov::date, m.fecha::date, CURRENT_DATE) AS dia,
+               m.id_producto,
+               m.cantidad
+        FROM mov_inventario m
+        LEFT JOIN (
+            SELECT DISTINCT ON (codigo_mov) codigo_mov, fecha_mov
+            FROM transacciones
+            ORDER BY codigo_mov, id_transaccion
+        ) t ON t.codigo_mov = m.codigo_mov
+        WHERE m.tipo_movimiento = 'venta'
+    ) v
+    LEFT JOIN productos p ON p.id_producto = v.id_producto
+    WHERE (p_desde IS NULL OR v.dia >= p_desde)
+      AND (p_hasta IS NULL OR v.dia < p_hasta)
+    GROUP BY v.dia, v.id_producto;
+
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    RETURN filas;
+END;
+$$;
+
+SELECT reconstruir_ventas_diarias();
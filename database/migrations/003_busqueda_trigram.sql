@@ -0,0 +1,25 @@
+-- 003_busqueda_trigram.sql
+-- Búsqueda aproximada de productos (ProductoRepository.buscar): índices GIN
+-- de trigramas sobre nombre, marca y categoría, sin tildes y en minúsculas,
+-- para tolerar erratas y acentos y ordenar por similitud.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() no es IMMUTABLE y no se puede indexar directamente
+CREATE OR REPLACE FUNCTION f_unaccent(TEXT)
+RETURNS TEXT LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS $$
+    SELECT public.unaccent('public.unaccent'::regdictionary, $1);
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_productos_nombre_trgm
+    ON productos USING gin (lower(f_unaccent(nombre_producto)) gin_trgm_ops)
+    WHERE estado = 'activo';
+
+CREATE INDEX IF NOT EXISTS idx_productos_marca_trgm
+    ON productos USING gin (lower(f_unaccent(marca)) gin_trgm_ops)
+    WHERE estado = 'activo';
+
+CREATE INDEX IF NOT EXISTS idx_productos_categoria_trgm
+    ON productos USING gin (lower(f_unaccent(categoria)) gin_trgm_ops)
+    WHERE estado = 'activo';
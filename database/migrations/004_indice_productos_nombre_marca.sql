@@ -0,0 +1,6 @@
+-- 004_indice_productos_nombre_marca.sql
+-- La ingesta de facturas (services/ingesta_service.py) y la caché de
+-- catálogo resuelven los productos por nombre + marca exactos.
+
+CREATE INDEX IF NOT EXISTS idx_productos_nombre_marca
+    ON productos (nombre_producto, marca);
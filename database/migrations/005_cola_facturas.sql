@@ -0,0 +1,30 @@
+-- 005_cola_facturas.sql
+-- Cola de facturas pendientes de registrar (services/cola_service.py).
+-- Los trabajadores toman lotes con FOR UPDATE SKIP LOCKED y los marcan
+-- 'procesando' con un plazo (disponible_en); si un trabajador muere, la
+-- factura vuelve a estar disponible al vencer el plazo.
+
+CREATE TABLE IF NOT EXISTS cola_facturas (
+    id             BIGSERIAL   PRIMARY KEY,
+    payload        JSONB       NOT NULL,
+    codigo_mov     TEXT,
+    estado         TEXT        NOT NULL DEFAULT 'pendiente'
+                   CHECK (estado IN ('pendiente', 'procesando', 'hecha', 'fallida')),
+    intentos       INTEGER     NOT NULL DEFAULT 0,
+    max_intentos   INTEGER     NOT NULL DEFAULT 5,
+    encolada_en    TIMESTAMPTZ NOT NULL DEFAULT now(),
+    disponible_en  TIMESTAMPTZ NOT NULL DEFAULT now(),
+    iniciada_en    TIMESTAMPTZ,
+    terminada_en   TIMESTAMPTZ,
+    ultimo_error   TEXT,
+    resultado      JSONB
+);
+
+-- Solo se indexa lo que está por procesar: la cola no crece con el histórico
+CREATE INDEX IF NOT EXISTS idx_cola_facturas_disponibles
+    ON cola_facturas (disponible_en, id)
+    WHERE estado IN ('pendiente', 'procesando');
+
+CREATE INDEX IF NOT EXISTS idx_cola_facturas_terminadas
+    ON cola_facturas (terminada_en)
+    WHERE estado IN ('hecha', 'fallida');
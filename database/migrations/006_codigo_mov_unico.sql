@@ -0,0 +1,43 @@
+-- 006_codigo_mov_unico.sql
+-- Un código de movimiento identifica una única transacción: con la
+-- restricción, InventarioRepository.insertar_transaccion usa
+-- INSERT ... ON CONFLICT y un reenvío de Telegram o un doble clic en
+-- "Guardar Transacción" ya no crean duplicados ni necesitan un SELECT previo.
+
+DO $$
+DECLARE
+    repetidos TEXT;
+BEGIN
+    SELECT string_agg(codigo_mov, ', ' ORDER BY codigo_mov)
+    INTO repetidos
+    FROM (
+        SELECT codigo_mov
+        FROM transacciones
+        GROUP BY codigo_mov
+        HAVING COUNT(*) > 1
+        LIMIT 50
+    ) r;
+
+    IF repetidos IS NOT NULL THEN
+        RAISE EXCEPTION 'Hay códigos de movimiento repetidos en transacciones: %', repetidos
+            USING HINT = 'Fusiona o renombra esas transacciones y vuelve a lanzar la migración.';
+    END IF;
+END;
+$$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_transacciones_codigo_mov
+    ON transacciones (codigo_mov);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'uq_transacciones_codigo_mov'
+    ) THEN
+        ALTER TABLE transacciones
+            ADD CONSTRAINT uq_transacciones_codigo_mov UNIQUE USING INDEX uq_transacciones_codigo_mov;
+    END IF;
+END;
+$$;
+
+-- El índice único sustituye al de la migración 001
+DROP INDEX IF EXISTS idx_transacciones_codigo_mov;
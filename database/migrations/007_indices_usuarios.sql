@@ -0,0 +1,11 @@
+-- 007_indices_usuarios.sql
+-- Cada mensaje de Telegram identifica al usuario por su chat id
+-- (UsuarioRepository.obtener_por_telegram, nodo "Consulta id chat") y la
+-- vinculación y el login lo buscan por email.
+
+CREATE INDEX IF NOT EXISTS idx_usuarios_id_telegram
+    ON usuarios (id_telegram)
+    WHERE id_telegram IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_usuarios_email
+    ON usuarios (email);
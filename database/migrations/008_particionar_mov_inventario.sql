@@ -0,0 +1,240 @@
+-- 008_particionar_mov_inventario.sql
+-- Convierte mov_inventario en una tabla particionada por meses de `fecha`
+-- (mov_inventario_pAAAAMM) más una partición por defecto, para que las
+-- consultas acotadas por fecha solo lean los meses que tocan.
+--
+-- transacciones no se particiona: PostgreSQL exige que las claves únicas
+-- de una tabla particionada incluyan la columna de partición, y la
+-- restricción única de codigo_mov (migración 006) dejaría de ser global.
+--
+-- Se conservan los valores por defecto, las restricciones CHECK, las
+-- claves foráneas, los índices y los triggers de la tabla original
+-- (incluido el que actualiza el stock). Los triggers se recrean después de
+-- copiar los datos, así que la copia no vuelve a mover stock ni agregados.
+-- La clave primaria pasa a ser (id_mov, fecha): fecha tiene que ser NOT NULL.
+--
+-- Los índices y restricciones UNIQUE se conservan si ya incluyen fecha. Si
+-- alguno no la incluye (o hay restricciones EXCLUDE), la migración falla
+-- antes de tocar nada y los lista: en una tabla particionada dejarían de
+-- ser únicos en toda la tabla, y eso hay que decidirlo a mano.
+--
+-- Las particiones de los meses siguientes se crean con
+-- crear_particiones_mov_inventario() (python -m database.mantenimiento
+-- crear-particiones, o pg_cron si está instalado); mientras tanto las filas
+-- caen en mov_inventario_default y nunca falla un INSERT.
+
+
+-- Crea la partición del mes de p_mes si no existe. Si la partición por
+-- defecto ya tiene filas de ese mes, las mueve a la nueva partición (sin
+-- disparar los triggers: las filas no cambian, solo de sitio).
+CREATE OR REPLACE FUNCTION crear_particion_mov_inventario(p_mes DATE)
+RETURNS BOOLEAN LANGUAGE plpgsql AS $$
+DECLARE
+    desde  DATE := date_trunc('month', p_mes)::date;
+    hasta  DATE := (date_trunc('month', p_mes) + interval '1 month')::date;
+    nombre TEXT := format('mov_inventario_p%s', to_char(p_mes, 'YYYYMM'));
+BEGIN
+    IF to_regclass(nombre) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+
+    IF to_regclass('mov_inventario_default') IS NOT NULL
+       AND EXISTS (SELECT 1 FROM mov_inventario_default WHERE fecha >= desde AND fecha < hasta) THEN
+        EXECUTE format(
+            'CREATE TABLE %I (LIKE mov_inventario INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', nombre
+        );
+        ALTER TABLE mov_inventario_default DISABLE TRIGGER USER;
+        EXECUTE format(
+            'WITH movidas AS (
+                 DELETE FROM mov_inventario_default WHERE fecha >= %L AND fecha < %L RETURNING *
+             )
+             INSERT INTO %I SELECT * FROM movidas',
+            desde, hasta, nombre
+        );
+        ALTER TABLE mov_inventario_default ENABLE TRIGGER USER;
+        EXECUTE format(
+            'ALTER TABLE mov_inventario ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+            nombre, desde, hasta
+        );
+    ELSE
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF mov_inventario FOR VALUES FROM (%L) TO (%L)',
+            nombre, desde, hasta
+        );
+    END IF;
+    RETURN TRUE;
+END;
+$$;
+
+
+-- Asegura las particiones desde el mes actual hasta p_meses_adelante
+-- meses después. Devuelve cuántas se han creado.
+CREATE OR REPLACE FUNCTION crear_particiones_mov_inventario(p_meses_adelante INTEGER DEFAULT 3)
+RETURNS INTEGER LANGUAGE plpgsql AS $$
+DECLARE
+    creadas INTEGER := 0;
+BEGIN
+    FOR i IN 0..p_meses_adelante LOOP
+        IF crear_particion_mov_inventario(
+            (date_trunc('month', CURRENT_DATE) + make_interval(months => i))::date
+        ) THEN
+            creadas := creadas + 1;
+        END IF;
+    END LOOP;
+    RETURN creadas;
+END;
+$$;
+
+
+DO $$
+DECLARE
+    def      RECORD;
+    indices  TEXT[] := '{}';
+    triggers TEXT[] := '{}';
+    restricciones TEXT[] := '{}';
+    sentencia TEXT;
+    secuencia TEXT;
+    no_conservables TEXT;
+    es_identidad BOOLEAN;
+    mes DATE;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'mov_inventario'::regclass) = 'p' THEN
+        RAISE NOTICE 'mov_inventario ya está particionada';
+        RETURN;
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM pg_constraint WHERE confrelid = 'mov_inventario'::regclass) THEN
+        RAISE EXCEPTION 'Hay claves foráneas que apuntan a mov_inventario'
+            USING HINT = 'Una tabla particionada por fecha no puede ser destino de una FK sobre id_mov: elimínalas antes.';
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM mov_inventario WHERE fecha IS NULL) THEN
+        RAISE EXCEPTION 'Hay movimientos sin fecha'
+            USING HINT = 'Rellena mov_inventario.fecha (p. ej. con transacciones.fecha_mov) y vuelve a lanzar la migración.';
+    END IF;
+
+    LOCK TABLE mov_inventario IN ACCESS EXCLUSIVE MODE;
+
+    -- Únicos (salvo la clave primaria) que no incluyen la columna de partición
+    SELECT string_agg(pg_get_indexdef(i.indexrelid), E'\n' ORDER BY c.relname) INTO no_conservables
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE i.indrelid = 'mov_inventario'::regclass
+      AND NOT i.indisprimary
+      AND (
+          i.indisexclusion
+          OR (i.indisunique AND NOT (
+              SELECT a.attnum FROM pg_attribute a
+              WHERE a.attrelid = 'mov_inventario'::regclass AND a.attname = 'fecha'
+          ) = ANY (i.indkey::int2[]))
+      );
+    IF no_conservables IS NOT NULL THEN
+        RAISE EXCEPTION E'Índices únicos de mov_inventario que no se pueden conservar al particionar por fecha:\n%', no_conservables
+            USING HINT = 'Añade fecha a esos índices o elimínalos (y asume que dejan de ser únicos) y vuelve a lanzar la migración.';
+    END IF;
+
+    ALTER TABLE mov_inventario RENAME TO mov_inventario_sin_particionar;
+
+    -- Definiciones a recrear sobre la tabla nueva: los índices (también los
+    -- únicos que incluyen fecha) salvo los de restricciones, que se
+    -- recrean con ellas
+    FOR def IN
+        SELECT pg_get_indexdef(i.indexrelid) AS sql
+        FROM pg_index i
+        WHERE i.indrelid = 'mov_inventario_sin_particionar'::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid AND c.conrelid = i.indrelid)
+    LOOP
+        indices := indices || def.sql;
+    END LOOP;
+
+    FOR def IN
+        SELECT pg_get_triggerdef(t.oid) AS sql
+        FROM pg_trigger t
+        WHERE t.tgrelid = 'mov_inventario_sin_particionar'::regclass
+          AND NOT t.tgisinternal
+    LOOP
+        triggers := triggers || def.sql;
+    END LOOP;
+
+    FOR def IN
+        SELECT format('ALTER TABLE mov_inventario ADD CONSTRAINT %I %s', c.conname, pg_get_constraintdef(c.oid)) AS sql
+        FROM pg_constraint c
+        WHERE c.conrelid = 'mov_inventario_sin_particionar'::regclass
+          AND c.contype IN ('f', 'u')
+    LOOP
+        restricciones := restricciones || def.sql;
+    END LOOP;
+
+    SELECT a.attidentity <> '' INTO es_identidad
+    FROM pg_attribute a
+    WHERE a.attrelid = 'mov_inventario_sin_particionar'::regclass AND a.attname = 'id_mov';
+    secuencia := pg_get_serial_sequence('mov_inventario_sin_particionar', 'id_mov');
+
+    CREATE TABLE mov_inventario (
+        LIKE mov_inventario_sin_particionar
+        INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY
+        INCLUDING GENERATED INCLUDING STORAGE INCLUDING COMMENTS
+    ) PARTITION BY RANGE (fecha);
+
+    ALTER TABLE mov_inventario ALTER COLUMN fecha SET NOT NULL;
+
+    CREATE TABLE mov_inventario_default PARTITION OF mov_inventario DEFAULT;
+
+    -- Un mes por partición desde el movimiento más antiguo hasta 3 meses vista
+    mes := COALESCE(
+        (SELECT date_trunc('month', MIN(fecha))::date FROM mov_inventario_sin_particionar),
+        date_trunc('month', CURRENT_DATE)::date
+    );
+    WHILE mes <= (date_trunc('month', CURRENT_DATE) + interval '3 months')::date LOOP
+        PERFORM crear_particion_mov_inventario(mes);
+        mes := (mes + interval '1 month')::date;
+    END LOOP;
+
+    INSERT INTO mov_inventario OVERRIDING SYSTEM VALUE
+    SELECT * FROM mov_inventario_sin_particionar;
+
+    IF es_identidad THEN
+        PERFORM setval(
+            pg_get_serial_sequence('mov_inventario', 'id_mov'),
+            COALESCE((SELECT MAX(id_mov) FROM mov_inventario), 0) + 1,
+            false
+        );
+    ELSIF secuencia IS NOT NULL THEN
+        -- La secuencia del serial es de la tabla vieja: se borraría con ella
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY mov_inventario.id_mov', secuencia);
+    END IF;
+
+    DROP TABLE mov_inventario_sin_particionar;
+
+    ALTER TABLE mov_inventario ADD CONSTRAINT mov_inventario_pkey PRIMARY KEY (id_mov, fecha);
+
+    FOREACH sentencia IN ARRAY indices LOOP
+        EXECUTE regexp_replace(sentencia, ' ON (ONLY )?(\S+\.)?mov_inventario_sin_particionar ', ' ON mov_inventario ');
+    END LOOP;
+    FOREACH sentencia IN ARRAY restricciones LOOP
+        EXECUTE sentencia;
+    END LOOP;
+    FOREACH sentencia IN ARRAY triggers LOOP
+        EXECUTE regexp_replace(sentencia, ' ON (\S+\.)?mov_inventario_sin_particionar ', ' ON mov_inventario ');
+    END LOOP;
+
+    -- Búsquedas por codigo_mov sin filtrar por tipo (ids_movimientos, reenvíos)
+    CREATE INDEX IF NOT EXISTS idx_mov_inventario_codigo_mov ON mov_inventario (codigo_mov);
+END;
+$$;
+
+ANALYZE mov_inventario;
+
+
+-- Con pg_cron, las particiones del mes siguiente se crean solas el día 20
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule(
+            'crear_particiones_mov_inventario',
+            '0 3 20 * *',
+            'SELECT crear_particiones_mov_inventario(3)'
+        );
+    END IF;
+END;
+$$;
@@ -0,0 +1,90 @@
+-- 009_stock_snapshots.sql
+-- Fotos periódicas del stock de cada producto, para saber el stock en una
+-- fecha pasada sin recorrer todo mov_inventario
+-- (InventarioRepository.stock_a_fecha).
+--
+-- Una foto con tomado_en = T guarda el stock que había justo en T: incluye
+-- los movimientos con fecha < T. Se calcula hacia atrás desde el stock
+-- actual (stock_actual menos lo movido desde T), así que se puede tomar en
+-- cualquier momento posterior a T; el trabajo diario la toma para las
+-- 00:00 del día un rato después, cuando ya han terminado las transacciones
+-- que empezaron antes de medianoche.
+--
+-- El signo de cada movimiento es el del trigger actualizar_stock: las
+-- ventas restan y el resto (compras, ajustes) suma.
+
+CREATE TABLE IF NOT EXISTS stock_snapshots (
+    tomado_en    TIMESTAMP NOT NULL,
+    id_producto  INTEGER   NOT NULL REFERENCES productos (id_producto) ON DELETE CASCADE,
+    stock        NUMERIC   NOT NULL,
+    PRIMARY KEY (tomado_en, id_producto)
+);
+
+
+-- Toma la foto del stock en p_momento para todos los productos. Si ya
+-- existe, la recalcula. Devuelve el número de productos guardados.
+CREATE OR REPLACE FUNCTION tomar_snapshot_stock(
+    p_momento TIMESTAMP DEFAULT date_trunc('day', LOCALTIMESTAMP)
+) RETURNS INTEGER LANGUAGE plpgsql AS $$
+DECLARE
+    filas INTEGER;
+BEGIN
+    IF p_momento > LOCALTIMESTAMP THEN
+        RAISE EXCEPTION 'No se puede tomar una foto del stock en el futuro (%)', p_momento;
+    END IF;
+
+    -- stock_actual y los movimientos se leen en la misma instantánea: los
+    -- triggers actualizan ambos en la misma transacción
+    INSERT INTO stock_snapshots AS s (tomado_en, id_producto, stock)
+    SELECT p_momento,
+           p.id_producto,
+           COALESCE(p.stock_actual, 0) - COALESCE(d.delta, 0)
+    FROM productos p
+    LEFT JOIN (
+        SELECT m.id_producto,
+               SUM(CASE WHEN m.tipo_movimiento = 'venta' THEN -m.cantidad ELSE m.cantidad END) AS delta
+        FROM mov_inventario m
+        WHERE m.fecha >= p_momento
+        GROUP BY m.id_producto
+    ) d ON d.id_producto = p.id_producto
+    ON CONFLICT (tomado_en, id_producto) DO UPDATE
+        SET stock = EXCLUDED.stock;
+
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    RETURN filas;
+END;
+$$;
+
+
+-- Borra las fotos con más de p_conservar_dias días salvo las del día 1 de
+-- cada mes, que se guardan siempre. Devuelve cuántas filas borra.
+CREATE OR REPLACE FUNCTION purgar_snapshots_stock(p_conservar_dias INTEGER)
+RETURNS INTEGER LANGUAGE plpgsql AS $$
+DECLARE
+    filas INTEGER;
+BEGIN
+    DELETE FROM stock_snapshots
+    WHERE tomado_en < date_trunc('day', LOCALTIMESTAMP) - make_interval(days => p_conservar_dias)
+      AND tomado_en <> date_trunc('month', tomado_en);
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    RETURN filas;
+END;
+$$;
+
+
+-- Primera foto: el inicio de hoy
+SELECT tomar_snapshot_stock();
+
+
+-- Con pg_cron, la foto de cada día se toma sola a las 00:30
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule(
+            'tomar_snapshot_stock',
+            '30 0 * * *',
+            'SELECT tomar_snapshot_stock(date_trunc(''day'', LOCALTIMESTAMP))'
+        );
+    END IF;
+END;
+$$;
@@ -0,0 +1,80 @@
+-- 010_ventas_producto_totales.sql
+-- Totales de ventas por producto (todo el histórico) para el ranking de
+-- más vendidos: el top N se lee por el índice de unidades en lugar de
+-- agrupar mov_inventario entero en cada carga del dashboard.
+--
+-- Se mantiene en ventas_diarias_acumular, la misma función que actualiza
+-- ventas_diarias, así que el total de cada producto es siempre la suma de
+-- sus filas de ventas_diarias. Cuando una transacción cambia de día se resta
+-- y se suma lo mismo y el total no cambia. Una fila por producto: se
+-- actualiza en la misma transacción que su stock_actual (trigger
+-- actualizar_stock), así que no añade esperas nuevas.
+
+CREATE TABLE IF NOT EXISTS ventas_producto_totales (
+    id_producto     INTEGER   PRIMARY KEY,
+    unidades        NUMERIC   NOT NULL DEFAULT 0,
+    importe         NUMERIC   NOT NULL DEFAULT 0,
+    num_ventas      INTEGER   NOT NULL DEFAULT 0,
+    actualizado_en  TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_ventas_producto_totales_unidades
+    ON ventas_producto_totales (unidades DESC, id_producto);
+
+
+CREATE OR REPLACE FUNCTION ventas_diarias_acumular(
+    p_dia DATE, p_id_producto INTEGER, p_cantidad NUMERIC, p_signo INTEGER
+) RETURNS VOID LANGUAGE plpgsql AS $$
+DECLARE
+    v_categoria TEXT;
+    v_importe   NUMERIC;
+BEGIN
+    SELECT p.categoria, p_signo * p_cantidad * COALESCE(p.precio_unitario, 0)
+    INTO v_categoria, v_importe
+    FROM productos p
+    WHERE p.id_producto = p_id_producto;
+
+    INSERT INTO ventas_diarias AS v (dia, id_producto, categoria, unidades, importe, num_ventas)
+    VALUES (p_dia, p_id_producto, v_categoria, p_signo * p_cantidad, COALESCE(v_importe, 0), p_signo)
+    ON CONFLICT (dia, id_producto) DO UPDATE
+        SET unidades   = v.unidades + EXCLUDED.unidades,
+            importe    = v.importe + EXCLUDED.importe,
+            num_ventas = v.num_ventas + EXCLUDED.num_ventas;
+
+    IF p_signo < 0 THEN
+        DELETE FROM ventas_diarias
+        WHERE dia = p_dia AND id_producto = p_id_producto AND num_ventas <= 0;
+    END IF;
+
+    INSERT INTO ventas_producto_totales AS t (id_producto, unidades, importe, num_ventas, actualizado_en)
+    VALUES (p_id_producto, p_signo * p_cantidad, COALESCE(v_importe, 0), p_signo, now())
+    ON CONFLICT (id_producto) DO UPDATE
+        SET unidades       = t.unidades + EXCLUDED.unidades,
+            importe        = t.importe + EXCLUDED.importe,
+            num_ventas     = t.num_ventas + EXCLUDED.num_ventas,
+            actualizado_en = EXCLUDED.actualizado_en;
+END;
+$$;
+
+
+-- Recalcula los totales desde ventas_diarias (después de
+-- reconstruir_ventas_diarias o para corregir una deriva). Devuelve las filas.
+CREATE OR REPLACE FUNCTION reconstruir_ventas_producto_totales()
+RETURNS INTEGER LANGUAGE plpgsql AS $$
+DECLARE
+    filas INTEGER;
+BEGIN
+    LOCK TABLE ventas_producto_totales IN SHARE ROW EXCLUSIVE MODE;
+    DELETE FROM ventas_producto_totales;
+
+    INSERT INTO ventas_producto_totales (id_producto, unidades, importe, num_ventas, actualizado_en)
+    SELECT id_producto, SUM(unidades), SUM(importe), SUM(num_ventas), now()
+    FROM ventas_diarias
+    GROUP BY id_producto;
+
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    RETURN filas;
+END;
+$$;
+
+SELECT reconstruir_ventas_producto_totales();
@@ -0,0 +1,24 @@
+-- 011_reposicion_sugerida.sql
+-- Resultado del cálculo de reposición (services/reposicion_service.py):
+-- una fila por producto con su demanda, cobertura, stock de seguridad,
+-- punto de pedido y cantidad sugerida. El cálculo reescribe la tabla
+-- entera en cada ejecución y el dashboard solo la lee.
+
+CREATE TABLE IF NOT EXISTS reposicion_sugerida (
+    id_producto        INTEGER   PRIMARY KEY,
+    calculado_en       TIMESTAMP NOT NULL,
+    ventana_dias       INTEGER   NOT NULL,
+    demanda_media      NUMERIC   NOT NULL,   -- unidades/día en la ventana
+    desviacion         NUMERIC   NOT NULL,   -- desviación típica diaria
+    nivel_servicio     NUMERIC   NOT NULL,   -- de stock_seguridad_categoria
+    stock_actual       NUMERIC   NOT NULL,
+    dias_cobertura     NUMERIC,              -- NULL si no hay demanda
+    stock_seguridad    NUMERIC   NOT NULL,
+    punto_pedido       NUMERIC   NOT NULL,
+    cantidad_sugerida  NUMERIC   NOT NULL
+);
+
+-- El panel lista lo que hay que pedir, lo más urgente primero
+CREATE INDEX IF NOT EXISTS idx_reposicion_sugerida_pedir
+    ON reposicion_sugerida (dias_cobertura NULLS LAST, id_producto)
+    WHERE cantidad_sugerida > 0;
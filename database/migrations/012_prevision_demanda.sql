@@ -0,0 +1,30 @@
+-- 012_prevision_demanda.sql
+-- Previsión de demanda por producto (services/prevision_service.py):
+-- parámetros ajustados del suavizado exponencial con estacionalidad
+-- semanal, su estado (nivel y los 7 factores por día de la semana) y la
+-- previsión resultante con la fecha estimada de rotura de stock.
+--
+-- Los parámetros solo se reajustan si el producto tiene ventas nuevas
+-- desde ajustado_en (ventas_producto_totales.actualizado_en, migración 010)
+-- o si el ajuste es antiguo; al resto se le avanza el estado con los días
+-- sin ventas transcurridos. Cada ejecución reescribe la tabla entera.
+
+CREATE TABLE IF NOT EXISTS prevision_demanda (
+    id_producto     INTEGER   PRIMARY KEY,
+    alpha           FLOAT8    NOT NULL,
+    gamma           FLOAT8    NOT NULL,
+    nivel           FLOAT8    NOT NULL,
+    estacionalidad  FLOAT8[]  NOT NULL,   -- 7 valores, lunes = 0
+    error_medio     FLOAT8,               -- RMSE de la previsión a un día
+    ajustado_en     TIMESTAMP NOT NULL,
+    estado_hasta    DATE      NOT NULL,   -- el estado incluye las ventas de los días < estado_hasta
+    stock_actual    NUMERIC   NOT NULL,
+    demanda_7d      FLOAT8    NOT NULL,
+    demanda_30d     FLOAT8    NOT NULL,
+    fecha_rotura    DATE,                 -- NULL si no se agota en el horizonte
+    calculado_en    TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_prevision_demanda_rotura
+    ON prevision_demanda (fecha_rotura, id_producto)
+    WHERE fecha_rotura IS NOT NULL;
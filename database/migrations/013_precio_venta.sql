@@ -0,0 +1,196 @@
+-- 013_precio_venta.sql
+-- Precio de venta congelado en cada línea de mov_inventario.
+--
+-- Hasta ahora ventas_diarias (002) y ventas_producto_totales (010) tomaban
+-- el precio_unitario actual del producto tanto al sumar una venta como al
+-- restarla (UPDATE/DELETE de la línea o cambio de día de la transacción),
+-- y la reconstrucción revaloraba todo el histórico: tras un cambio de
+-- precio los importes derivaban e incluso podían quedar en negativo.
+--
+-- Ahora cada línea guarda el precio vigente al insertarla (trigger BEFORE,
+-- así vale también para los INSERT de n8n) y el agregado suma y resta con
+-- el precio guardado en la propia línea (NEW/OLD).
+--
+-- Las líneas anteriores no tienen precio histórico: se rellenan con el
+-- precio actual, que es el que ya tenía el agregado, y después se
+-- reconstruyen ventas_diarias y ventas_producto_totales desde las líneas.
+-- En tablas grandes el relleno reescribe todas las filas de mov_inventario.
+
+-- El relleno no debe pasar por el agregado (se reconstruye al final)
+DROP TRIGGER IF EXISTS ventas_diarias_mov ON mov_inventario;
+
+ALTER TABLE mov_inventario ADD COLUMN IF NOT EXISTS precio_unitario NUMERIC(10,2);
+
+UPDATE mov_inventario m
+SET precio_unitario = p.precio_unitario
+FROM productos p
+WHERE p.id_producto = m.id_producto
+  AND m.precio_unitario IS NULL;
+
+
+-- Precio de la línea: el vigente del producto al insertarla, o al cambiarle
+-- el producto si no se indica otro precio
+CREATE OR REPLACE FUNCTION trg_mov_inventario_precio() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW.precio_unitario IS NULL
+       OR (TG_OP = 'UPDATE'
+           AND NEW.id_producto IS DISTINCT FROM OLD.id_producto
+           AND NEW.precio_unitario IS NOT DISTINCT FROM OLD.precio_unitario) THEN
+        SELECT p.precio_unitario INTO NEW.precio_unitario
+        FROM productos p
+        WHERE p.id_producto = NEW.id_producto;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS mov_inventario_precio ON mov_inventario;
+CREATE TRIGGER mov_inventario_precio
+    BEFORE INSERT OR UPDATE OF id_producto, precio_unitario ON mov_inventario
+    FOR EACH ROW EXECUTE FUNCTION trg_mov_inventario_precio();
+
+
+-- Suma (p_signo = 1) o resta (p_signo = -1) una línea de venta con su
+-- precio guardado a ventas_diarias y ventas_producto_totales
+DROP FUNCTION IF EXISTS ventas_diarias_acumular(DATE, INTEGER, NUMERIC, INTEGER);
+
+CREATE OR REPLACE FUNCTION ventas_diarias_acumular(
+    p_dia DATE, p_id_producto INTEGER, p_cantidad NUMERIC, p_signo INTEGER, p_precio NUMERIC
+) RETURNS VOID LANGUAGE plpgsql AS $$
+DECLARE
+    v_categoria TEXT;
+    v_importe   NUMERIC := p_signo * p_cantidad * COALESCE(p_precio, 0);
+BEGIN
+    SELECT p.categoria INTO v_categoria
+    FROM productos p
+    WHERE p.id_producto = p_id_producto;
+
+    INSERT INTO ventas_diarias AS v (dia, id_producto, categoria, unidades, importe, num_ventas)
+    VALUES (p_dia, p_id_producto, v_categoria, p_signo * p_cantidad, v_importe, p_signo)
+    ON CONFLICT (dia, id_producto) DO UPDATE
+        SET unidades   = v.unidades + EXCLUDED.unidades,
+            importe    = v.importe + EXCLUDED.importe,
+            num_ventas = v.num_ventas + EXCLUDED.num_ventas;
+
+    IF p_signo < 0 THEN
+        DELETE FROM ventas_diarias
+        WHERE dia = p_dia AND id_producto = p_id_producto AND num_ventas <= 0;
+    END IF;
+
+    INSERT INTO ventas_producto_totales AS t (id_producto, unidades, importe, num_ventas, actualizado_en)
+    VALUES (p_id_producto, p_signo * p_cantidad, v_importe, p_signo, now())
+    ON CONFLICT (id_producto) DO UPDATE
+        SET unidades       = t.unidades + EXCLUDED.unidades,
+            importe        = t.importe + EXCLUDED.importe,
+            num_ventas     = t.num_ventas + EXCLUDED.num_ventas,
+            actualizado_en = EXCLUDED.actualizado_en;
+END;
+$$;
+
+
+CREATE OR REPLACE FUNCTION trg_ventas_diarias_mov() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.tipo_movimiento = 'venta' THEN
+        PERFORM ventas_diarias_acumular(
+            ventas_diarias_dia(OLD.codigo_mov, OLD.fecha), OLD.id_producto, OLD.cantidad, -1, OLD.precio_unitario
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.tipo_movimiento = 'venta' THEN
+        PERFORM ventas_diarias_acumular(
+            ventas_diarias_dia(NEW.codigo_mov, NEW.fecha), NEW.id_producto, NEW.cantidad, 1, NEW.precio_unitario
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER ventas_diarias_mov
+    AFTER INSERT OR UPDATE OR DELETE ON mov_inventario
+    FOR EACH ROW EXECUTE FUNCTION trg_ventas_diarias_mov();
+
+
+CREATE OR REPLACE FUNCTION trg_ventas_diarias_transaccion() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    mov RECORD;
+    origen DATE;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        -- Solo la primera transacción de un código fija el día
+        IF EXISTS (
+            SELECT 1 FROM transacciones
+            WHERE codigo_mov = NEW.codigo_mov AND id_transaccion < NEW.id_transaccion
+        ) THEN
+            RETURN NULL;
+        END IF;
+    ELSIF OLD.fecha_mov::date = NEW.fecha_mov::date THEN
+        RETURN NULL;
+    END IF;
+
+    FOR mov IN
+        SELECT id_producto, cantidad, fecha, precio_unitario
+        FROM mov_inventario
+        WHERE codigo_mov = NEW.codigo_mov
+          AND tipo_movimiento = 'venta'
+    LOOP
+        IF TG_OP = 'INSERT' THEN
+            origen := COALESCE(mov.fecha::date, CURRENT_DATE);
+        ELSE
+            origen := OLD.fecha_mov::date;
+        END IF;
+
+        IF origen <> NEW.fecha_mov::date THEN
+            PERFORM ventas_diarias_acumular(origen, mov.id_producto, mov.cantidad, -1, mov.precio_unitario);
+            PERFORM ventas_diarias_acumular(NEW.fecha_mov::date, mov.id_producto, mov.cantidad, 1, mov.precio_unitario);
+        END IF;
+    END LOOP;
+    RETURN NULL;
+END;
+$$;
+
+
+-- Igual que en 002, pero con el precio guardado en cada línea
+CREATE OR REPLACE FUNCTION reconstruir_ventas_diarias(
+    p_desde DATE DEFAULT NULL, p_hasta DATE DEFAULT NULL
+) RETURNS INTEGER LANGUAGE plpgsql AS $$
+DECLARE
+    filas INTEGER;
+BEGIN
+    -- Bloquea a los triggers mientras se recalcula el rango
+    LOCK TABLE ventas_diarias IN SHARE ROW EXCLUSIVE MODE;
+
+    DELETE FROM ventas_diarias
+    WHERE (p_desde IS NULL OR dia >= p_desde)
+      AND (p_hasta IS NULL OR dia < p_hasta);
+
+    INSERT INTO ventas_diarias (dia, id_producto, categoria, unidades, importe, num_ventas)
+    SELECT v.dia,
+           v.id_producto,
+           MAX(p.categoria),
+           SUM(v.cantidad),
+           SUM(v.cantidad * COALESCE(v.precio_unitario, 0)),
+           COUNT(*)
+    FROM (
+        SELECT COALESCE(t.fecha_mov::date, m.fecha::date, CURRENT_DATE) AS dia,
+               m.id_producto,
+               m.cantidad,
+               m.precio_unitario
+        FROM mov_inventario m
+        LEFT JOIN (
+            SELECT DISTINCT ON (codigo_mov) codigo_mov, fecha_mov
+            FROM transacciones
+            ORDER BY codigo_mov, id_transaccion
+        ) t ON t.codigo_mov = m.codigo_mov
+        WHERE m.tipo_movimiento = 'venta'
+    ) v
+    LEFT JOIN productos p ON p.id_producto = v.id_producto
+    WHERE (p_desde IS NULL OR v.dia >= p_desde)
+      AND (p_hasta IS NULL OR v.dia < p_hasta)
+    GROUP BY v.dia, v.id_producto;
+
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    RETURN filas;
+END;
+$$;
+
+SELECT reconstruir_ventas_diarias();
+SELECT reconstruir_ventas_producto_totales();
@@ -0,0 +1,65 @@
+# models/serie_ventas.py
+import numpy as np
+import pandas as pd
+
+
+class SerieVentas:
+    """
+    Serie temporal de ventas con un valor por periodo (sin huecos: los
+    periodos sin ventas valen 0). Cada columna es un array de NumPy de solo
+    lectura, así que la misma serie se puede compartir desde la caché.
+    """
+
+    def __init__(self, granularidad, periodo, importe, unidades, num_ventas):
+        self.granularidad = granularidad
+        self.periodo = np.asarray(periodo, dtype="datetime64[s]")
+        self.importe = np.asarray(importe, dtype=np.float64)
+        self.unidades = np.asarray(unidades, dtype=np.float64)
+        self.num_ventas = np.asarray(num_ventas, dtype=np.int64)
+        for columna in (self.periodo, self.importe, self.unidades, self.num_ventas):
+            columna.setflags(write=False)
+
+    @classmethod
+    def desde_filas(cls, granularidad, filas):
+        """filas: [(periodo, importe, unidades, num_ventas)] tal como salen del cursor."""
+        n = len(filas)
+        return cls(
+            granularidad,
+            np.array([f[0] for f in filas], dtype="datetime64[s]"),
+            np.fromiter((f[1] for f in filas), dtype=np.float64, count=n),
+            np.fromiter((f[2] for f in filas), dtype=np.float64, count=n),
+            np.fromiter((f[3] for f in filas), dtype=np.int64, count=n),
+        )
+
+    @classmethod
+    def vacia(cls, granularidad):
+        return cls(granularidad, [], [], [], [])
+
+    def __len__(self):
+        return len(self.periodo)
+
+    def __sizeof__(self):
+        # Lo que cuenta la caché (utils/cache.py) al acotar la memoria
+        return object.__sizeof__(self) + sum(
+            c.nbytes for c in (self.periodo, self.importe, self.unidades, self.num_ventas)
+        )
+
+    @property
+    def total(self):
+        return float(self.importe.sum())
+
+    def to_frame(self):
+        """DataFrame indexado por periodo, listo para st.line_chart / st.bar_chart."""
+        return pd.DataFrame(
+            {"importe": self.importe, "unidades": self.unidades, "num_ventas": self.num_ventas},
+            index=pd.DatetimeIndex(self.periodo, name="periodo"),
+        )
+
+    def to_dict(self):
+        return {
+            "granularidad": self.granularidad,
+            "periodo": [str(p) for p in self.periodo],
+            "importe": self.importe.tolist(),
+            "unidades": self.unidades.tolist(),
+            "num_ventas": self.num_ventas.tolist(),
+        }
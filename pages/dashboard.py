@@ -18,7 +18,15 @@ rol = st.session_state.get("rol", "")
 
 st.title("📊 Dashboard de Ventas")
 
-resumen = service.obtener_resumen_mes()
+# Periodo del ranking de más vendidos (lo elige el selector del panel)
+PERIODOS_RANKING = {"total": "Histórico", "mes": "Este mes", "30dias": "Últimos 30 días"}
+
+# Todas las consultas del dashboard en paralelo
+panel = service.cargar_panel(periodo_ranking=st.session_state.get("periodo_ranking", "total"))
+resumen = panel.resumen
+
+if panel.errores:
+    st.warning("⚠️ No se pudieron cargar algunos paneles: " + ", ".join(panel.errores))
 
 col1, col2, col3, col4 = st.columns(4)
 
@@ -65,7 +73,7 @@ ALTO_GRAFICOS = 380
 # Ventas por día
 with col_grafico:
     st.subheader("📈 Ventas por día del mes")
-    df_ventas_mes = service.obtener_ventas_mes_actual()
+    df_ventas_mes = panel.ventas_mes
 
     if df_ventas_mes.empty:
         st.info("No hay ventas registradas este mes.")
@@ -80,7 +88,7 @@ with col_grafico:
 # Ventas por categoría
 with col_torta:
     st.subheader("🍰 Ventas por categoría (mes actual)")
-    df_categorias = service.ventas_por_categoria_mes()
+    df_categorias = panel.ventas_categoria
     if df_categorias.empty:
         st.info("No hay ventas por categoría este mes.")
     else:
@@ -99,17 +107,33 @@ col_ranking, col_ultimas = st.columns([1, 1])
 
 with col_ranking:
     st.subheader("🥇 Productos más vendidos")
-    ranking = service.obtener_ranking_productos_vendidos()
+    st.radio(
+        "Periodo",
+        options=list(PERIODOS_RANKING),
+        format_func=PERIODOS_RANKING.get,
+        key="periodo_ranking",
+        horizontal=True,
+        label_visibility="collapsed",
+    )
+    ranking = panel.ranking
     if ranking.empty:
         st.info("No hay datos suficientes para mostrar.")
     else:
         ranking = ranking.reset_index(drop=True)
-        ranking = ranking.rename(columns={"nombre_producto": "Producto", "total_vendido": "Unidades vendidas"})
-        st.dataframe(ranking.style.hide(axis="index"), use_container_width=True)
+        ranking = ranking.rename(columns={
+            "nombre_producto": "Producto",
+            "marca": "Marca",
+            "total_vendido": "Unidades vendidas",
+            "importe": "Importe (€)",
+        })
+        st.dataframe(
+            ranking[["Producto", "Marca", "Unidades vendidas", "Importe (€)"]].style.hide(axis="index"),
+            use_container_width=True,
+        )
 
 with col_ultimas:
     st.subheader("🧾 Últimas ventas registradas")
-    ult = service.ultimas_ventas()
+    ult = panel.ultimas_ventas
     if ult.empty:
         st.info("Todavía no hay ventas registradas.")
     else:
@@ -134,7 +158,7 @@ with col_ultimas:
 st.markdown("---")
 st.subheader("📉 Productos con menor stock")
 
-df_stock = service.productos_bajo_stock() 
+df_stock = panel.bajo_stock
 
 if df_stock.empty:
     st.info("No hay productos con stock por debajo del mínimo.")
@@ -157,3 +181,66 @@ else:
         use_container_width=True,
         hide_index=True
     )
+
+
+# Reposición sugerida (cálculo diario de services/reposicion_service.py)
+st.markdown("---")
+st.subheader("🚚 Reposición sugerida")
+
+df_reposicion = panel.reposicion
+
+if df_reposicion.empty:
+    st.info("No hay productos que pedir según el último cálculo de reposición.")
+else:
+    st.caption(
+        "Calculado el " + pd.to_datetime(df_reposicion["calculado_en"].iloc[0]).strftime("%d-%m-%Y %H:%M")
+        + " con la demanda reciente y el nivel de servicio de cada categoría."
+    )
+    df_temp = df_reposicion.rename(columns={
+        "nombre_producto": "Producto",
+        "marca": "Marca",
+        "stock_actual": "Stock actual",
+        "demanda_media": "Demanda/día",
+        "dias_cobertura": "Días de cobertura",
+        "punto_pedido": "Punto de pedido",
+        "cantidad_sugerida": "Cantidad a pedir",
+    })
+    st.dataframe(
+        df_temp[["Producto", "Marca", "Stock actual", "Demanda/día", "Días de cobertura",
+                 "Punto de pedido", "Cantidad a pedir"]].style.format({
+            "Demanda/día": "{:.2f}",
+            "Días de cobertura": "{:.1f}",
+            "Punto de pedido": "{:.0f}",
+            "Cantidad a pedir": "{:.0f}",
+        }, na_rep="-").hide(axis="index"),
+        use_container_width=True,
+    )
+
+
+# Roturas de stock previstas (previsión diaria de services/prevision_service.py)
+st.markdown("---")
+st.subheader("⏳ Roturas de stock previstas")
+
+df_roturas = panel.roturas
+
+if df_roturas.empty:
+    st.info("Ningún producto se quedará sin stock en el horizonte de la previsión.")
+else:
+    df_temp = df_roturas.copy()
+    df_temp["fecha_rotura"] = pd.to_datetime(df_temp["fecha_rotura"]).dt.strftime("%d-%m-%Y")
+    df_temp = df_temp.rename(columns={
+        "nombre_producto": "Producto",
+        "marca": "Marca",
+        "stock_actual": "Stock actual",
+        "demanda_7d": "Previsto 7 días",
+        "demanda_30d": "Previsto 30 días",
+        "fecha_rotura": "Rotura prevista",
+    })
+    st.dataframe(
+        df_temp[["Producto", "Marca", "Stock actual", "Previsto 7 días", "Previsto 30 días",
+                 "Rotura prevista"]].style.format({
+            "Previsto 7 días": "{:.1f}",
+            "Previsto 30 días": "{:.1f}",
+        }).hide(axis="index"),
+        use_container_width=True,
+    )
@@ -1,6 +1,5 @@
 import streamlit as st
 from services.dashboard_service import DashboardService
-import pandas as pd
 service = DashboardService()  
 from datetime import datetime, timedelta
 from utils.formato import configurar_pagina, verificar_acceso, sidebar_personalizado
@@ -74,31 +73,19 @@ col_left, col_right = st.columns([2, 2])
 with col_left:
     st.subheader("📈 Ventas últimos 7 días")
 
-    df_ventas_mes = service.obtener_ventas_mes_actual()
+    # Los 7 días (incluyendo hoy) vienen ya completos de la consulta,
+    # también los del mes anterior a principios de mes
+    hoy = datetime.now().date()
+    serie = service.serie_ventas(hoy - timedelta(days=6), hoy + timedelta(days=1), "dia")
 
-    if df_ventas_mes.empty:
+    if len(serie) == 0:
         st.info("No hay datos de ventas para mostrar.")
     else:
-        df_temp = df_ventas_mes.copy()
-
-        # Aseguramos tipo fecha
-        df_temp["dia"] = pd.to_datetime(df_temp["dia"])
-
-        # Rango de los últimos 7 días (incluyendo hoy)
-        hoy = datetime.now().date()
-        inicio = hoy - timedelta(days=6)
-        rango_fechas = pd.date_range(inicio, hoy)
-
-        # Creamos un dataframe con todos los días del rango
-        df_rango = pd.DataFrame({"dia": rango_fechas})
-
-        # Unimos con los datos reales y rellenamos días sin ventas con 0
-        df_temp = df_rango.merge(df_temp, on="dia", how="left").fillna(0.0)
+        df_temp = serie.to_frame()[["importe"]]
 
         # Formateamos el eje X
-        df_temp["dia_str"] = df_temp["dia"].dt.strftime("%d-%m")
-        df_temp = df_temp.set_index("dia_str")[["total_dia"]]
-        df_temp.rename(columns={"total_dia": "Total (€)"}, inplace=True)
+        df_temp.index = df_temp.index.strftime("%d-%m")
+        df_temp.rename(columns={"importe": "Total (€)"}, inplace=True)
 
         # Gráfico más compacto
         st.line_chart(df_temp, height=280, use_container_width=True)
@@ -1,7 +1,10 @@
+import os
+from datetime import date, timedelta
+
 import streamlit as st
 import pandas as pd
-from database.connection import get_connection
-from services.inventario_service import InventarioService
+from services.exportacion_service import ExportacionService, fichero_temporal
+from services.inventario_service import InventarioService, MovimientoEnConflictoError, StockInsuficienteError
 from utils.formato import configurar_pagina, verificar_acceso, sidebar_personalizado
 
 service = InventarioService()
@@ -26,6 +29,27 @@ if "confirmar_productos" not in st.session_state:
     st.session_state.confirmar_productos = False
 if "tipo_movimiento_temp" not in st.session_state:
     st.session_state.tipo_movimiento_temp = "venta"
+# Cabecera de la transacción: se guarda junto con sus movimientos al confirmar
+if "cabecera_pendiente" not in st.session_state:
+    st.session_state.cabecera_pendiente = None
+if "validacion_temp" not in st.session_state:
+    st.session_state.validacion_temp = []
+
+VEREDICTOS = {
+    "ok": "✅ OK",
+    "no_existe": "❌ No existe",
+    "cantidad_invalida": "❌ Cantidad no válida",
+    "inactivo": "❌ Producto inactivo",
+    "stock_insuficiente": "❌ Stock insuficiente",
+}
+
+
+def codigo_valido(codigo):
+    """El código es el de la transacción pendiente o una transacción ya guardada."""
+    pendiente = st.session_state.cabecera_pendiente
+    if pendiente and pendiente["codigo_mov"] == codigo:
+        return True
+    return service.repo.existe_transaccion(codigo)
 
 #Caja de regirtro de inventarios
 tab1, tab2 = st.tabs(["📝 Registrar Transacción", "📦 Registrar Movimientos de Inventario"])
@@ -52,35 +76,25 @@ with tab1:
         if btn_guardar_trans:
             if not codigo_mov:
                 st.error("❌ El código de movimiento es obligatorio")
+            elif service.repo.existe_transaccion(codigo_mov):
+                st.error("❌ Ya existe una transacción con ese código")
             else:
-                conn = None
-                try:
-                    conn = get_connection()
-                    conn.autocommit = False
-
-                    trans = service.repo.insertar_transaccion(
-                        conn, codigo_mov, id_usuario, fecha_mov, referencia or None, "manual"
-                    )
-
-                    conn.commit()
-
-                    # Se guarda el código en el estado de sesión para usarlo en la siguiente pestaña
-                    st.session_state.ultimo_codigo_mov = codigo_mov
-
-                    st.success("✅ Transacción registrada correctamente.")
-                    st.info(f"📦 Código: **{codigo_mov}** | ID: **{trans[0]}**")
-                    st.info(
-                        "➡️ Ahora ve a la pestaña 'Registrar Movimientos de Inventario' para agregar productos."
-                    )
-                    st.balloons()
-
-                except Exception as e:
-                    if conn:
-                        conn.rollback()
-                    st.error(f"❌ Error: {str(e)}")
-                finally:
-                    if conn:
-                        conn.close()
+                # Se guarda en sesión y se escribe en la BD junto con sus movimientos
+                st.session_state.cabecera_pendiente = {
+                    "codigo_mov": codigo_mov,
+                    "id_usuario": id_usuario,
+                    "fecha_mov": fecha_mov,
+                    "referencia": referencia or None,
+                    "metodo_registro": "manual",
+                }
+                st.session_state.ultimo_codigo_mov = codigo_mov
+
+                st.success("✅ Transacción preparada correctamente.")
+                st.info(f"📦 Código: **{codigo_mov}**")
+                st.info(
+                    "➡️ Ahora ve a la pestaña 'Registrar Movimientos de Inventario' para agregar productos. "
+                    "La transacción se guardará junto con ellos."
+                )
 
 # Movimientos de inventario
 with tab2:
@@ -155,7 +169,7 @@ with tab2:
             if btn_agregar:
                 if not codigo_mov_inv:
                     st.error("❌ El código de movimiento es obligatorio")
-                elif not service.repo.existe_transaccion(codigo_mov_inv):
+                elif not codigo_valido(codigo_mov_inv):
                     st.error(
                         "❌ El código de movimiento no existe. "
                         "Primero registra la transacción en la pestaña anterior."
@@ -214,7 +228,7 @@ with tab2:
                     st.error("❌ Debes agregar al menos un producto")
                 elif not codigo_mov_inv:
                     st.error("❌ El código de movimiento es obligatorio")
-                elif not service.repo.existe_transaccion(codigo_mov_inv):
+                elif not codigo_valido(codigo_mov_inv):
                     st.error(
                         "❌ El código de movimiento no existe. "
                         "Primero registra la transacción en la pestaña anterior."
@@ -222,6 +236,10 @@ with tab2:
                 else:
                     st.session_state.ultimo_codigo_mov = codigo_mov_inv
                     st.session_state.tipo_movimiento_temp = tipo_movimiento
+                    # Todas las líneas se validan en una sola consulta
+                    st.session_state.validacion_temp = service.validar_lineas(
+                        st.session_state.productos_temp, tipo_movimiento
+                    )
                     st.session_state.confirmar_productos = True
                     st.rerun()
 
@@ -240,15 +258,20 @@ with tab2:
             f"| Tipo: **{st.session_state.tipo_movimiento_temp.upper()}**"
         )
 
+        validacion = st.session_state.get("validacion_temp") or []
         tabla_productos = [
             {
                 "ID": p["id_producto"],
                 "Producto": p["nombre_producto"],
                 "Marca": p["marca_producto"],
                 "Cantidad": p["cantidad"],
-                "Stock Actual": p["stock_actual"],
+                "Stock Actual": v["stock_actual"] if v else p["stock_actual"],
+                "Validación": VEREDICTOS.get(v["veredicto"], v["veredicto"]) if v else "",
             }
-            for p in st.session_state.productos_temp
+            for p, v in zip(
+                st.session_state.productos_temp,
+                validacion or [None] * len(st.session_state.productos_temp),
+            )
         ]
 
         df_productos = pd.DataFrame(tabla_productos)
@@ -256,69 +279,93 @@ with tab2:
 
         st.write(f"**Total de productos:** {len(st.session_state.productos_temp)}")
 
+        invalidas = [v for v in validacion if v["veredicto"] != "ok"]
+        if invalidas:
+            st.warning(
+                f"⚠️ {len(invalidas)} línea(s) no se pueden registrar. "
+                "Vuelve a editar para corregirlas."
+            )
+
         col1c, col2c = st.columns(2)
 
         # Confirmar y guardar movimientos
         with col1c:
             if st.button("✅ Confirmar y Guardar Todo", type="primary", use_container_width=True):
-                conn = None
+                codigo = st.session_state.ultimo_codigo_mov
+                pendiente = st.session_state.cabecera_pendiente
+                cabecera = pendiente if pendiente and pendiente["codigo_mov"] == codigo else None
+
                 try:
-                    # Validación extra: la transacción debe existir
-                    if not service.repo.existe_transaccion(
-                        st.session_state.ultimo_codigo_mov
-                    ):
+                    # Validación extra: la transacción debe existir o estar pendiente
+                    if cabecera is None and not service.repo.existe_transaccion(codigo):
                         st.error(
                             "❌ La transacción asociada no existe. "
                             "Vuelve a registrar la transacción."
                         )
                         st.stop()
 
-                    conn = get_connection()
-                    conn.autocommit = False
-
-                    movimientos_guardados = []
+                    # Cabecera y todas las líneas en una sola transacción de BD
+                    resultado = service.registrar_movimiento(
+                        cabecera,
+                        [
+                            {
+                                "id_producto": prod["id_producto"],
+                                "cantidad": prod["cantidad"],
+                                "tipo_movimiento": st.session_state.tipo_movimiento_temp,
+                            }
+                            for prod in st.session_state.productos_temp
+                        ],
+                        codigo_mov=codigo,
+                    )
 
-                    for prod in st.session_state.productos_temp:
-                        mov = service.repo.insertar_mov_inventario(
-                            conn,
-                            st.session_state.ultimo_codigo_mov,
-                            prod["id_producto"],
-                            prod["cantidad"],
-                            st.session_state.tipo_movimiento_temp,
+                    if resultado["duplicada"]:
+                        # Doble clic o código ya usado: no se ha escrito nada
+                        st.warning(
+                            f"⚠️ La transacción {codigo} ya estaba registrada "
+                            f"(ID: {resultado['id_transaccion']}, {len(resultado['ids_mov'])} movimiento(s)); "
+                            "no se ha guardado nada de nuevo."
                         )
-                        movimientos_guardados.append(
+                    else:
+                        movimientos_guardados = [
                             {
-                                "id_mov": mov[0],
+                                "id_mov": id_mov,
                                 "producto": prod["nombre_producto"],
                                 "cantidad": prod["cantidad"],
                             }
-                        )
+                            for id_mov, prod in zip(resultado["ids_mov"], st.session_state.productos_temp)
+                        ]
 
-                    conn.commit()
-
-                    st.success(
-                        f"✅ {len(movimientos_guardados)} movimiento(s) registrado(s) correctamente."
-                    )
+                        if resultado["id_transaccion"]:
+                            st.success(f"✅ Transacción {codigo} registrada (ID: {resultado['id_transaccion']}).")
+                        st.success(
+                            f"✅ {len(movimientos_guardados)} movimiento(s) registrado(s) correctamente."
+                        )
 
-                    with st.expander("Ver detalles", expanded=True):
-                        for mov in movimientos_guardados:
-                            st.info(
-                                f"✓ {mov['producto']} - Cantidad: {mov['cantidad']} "
-                                f"(ID movimiento: {mov['id_mov']})"
-                            )
+                        with st.expander("Ver detalles", expanded=True):
+                            for mov in movimientos_guardados:
+                                st.info(
+                                    f"✓ {mov['producto']} - Cantidad: {mov['cantidad']} "
+                                    f"(ID movimiento: {mov['id_mov']})"
+                                )
+                        st.balloons()
 
                     # Limpiar estados
                     st.session_state.productos_temp = []
                     st.session_state.confirmar_productos = False
-                    st.balloons()
+                    st.session_state.cabecera_pendiente = None
 
+                except MovimientoEnConflictoError as e:
+                    st.error(f"❌ {str(e)}. Usa otro código de movimiento.")
+                except StockInsuficienteError as e:
+                    # Se vuelve a validar al guardar: otra venta pudo llevarse las unidades
+                    for fallo in e.fallos:
+                        st.error(
+                            f"❌ {fallo['nombre_producto'] or fallo['id_producto']}: "
+                            f"{VEREDICTOS.get(fallo['veredicto'], fallo['veredicto'])} "
+                            f"(pedido {fallo['cantidad']}, disponible {fallo['stock_actual'] or 0})"
+                        )
                 except Exception as e:
-                    if conn:
-                        conn.rollback()
                     st.error(f"❌ Error: {str(e)}")
-                finally:
-                    if conn:
-                        conn.close()
 
         # Volver a editar
         with col2c:
@@ -340,3 +387,70 @@ if rows:
     st.dataframe(df, use_container_width=True, hide_index=True)
 else:
     st.info("No hay movimientos registrados aún.")
+
+# Exportación del histórico y del catálogo
+st.markdown("---")
+st.subheader("📤 Exportar Datos")
+st.caption(
+    "Para históricos muy grandes usa la línea de comandos "
+    "(python -m services.exportacion_service): la descarga desde el navegador "
+    "pasa el fichero completo por la memoria del servidor."
+)
+
+col_e1, col_e2, col_e3 = st.columns(3)
+with col_e1:
+    datos_export = st.selectbox("Datos", ["movimientos", "productos"], key="datos_export")
+with col_e2:
+    formato_export = st.selectbox("Formato", ["csv", "parquet"], key="formato_export")
+with col_e3:
+    rango_export = st.date_input(
+        "Rango de fechas (movimientos)",
+        value=(date.today().replace(day=1), date.today()),
+        key="rango_export",
+        disabled=datos_export != "movimientos",
+    )
+
+if st.button("Preparar exportación", key="preparar_export"):
+    # En un directorio propio que se barre: el fichero de una sesión que se
+    # cierra sin volver a exportar se borra al caducar
+    fichero = fichero_temporal(formato_export)
+    try:
+        with st.spinner("Exportando..."):
+            exportacion = ExportacionService()
+            if datos_export == "movimientos":
+                # Con un solo día elegido el rango es ese día; el final es exclusivo
+                desde = rango_export[0] if rango_export else None
+                hasta = rango_export[-1] + timedelta(days=1) if rango_export else None
+                filas = exportacion.exportar_movimientos(fichero, formato_export, desde=desde, hasta=hasta)
+            else:
+                filas = exportacion.exportar_productos(fichero, formato_export)
+        fichero.close()
+        # Se guarda solo la ruta: el contenido se lee al pulsar la descarga
+        anterior = st.session_state.get("export_listo")
+        if anterior:
+            try:
+                os.remove(anterior["ruta"])
+            except OSError:
+                pass
+        st.session_state.export_listo = {
+            "ruta": fichero.name,
+            "nombre": f"{datos_export}_{date.today():%Y%m%d}.{formato_export}",
+            "formato": formato_export,
+            "filas": filas,
+        }
+    except Exception as e:
+        fichero.close()
+        os.remove(fichero.name)
+        st.error(f"❌ Error al exportar: {str(e)}")
+
+export_listo = st.session_state.get("export_listo")
+if export_listo and os.path.exists(export_listo["ruta"]):
+    st.success(f"✅ {export_listo['filas']:,} filas listas para descargar.")
+    with open(export_listo["ruta"], "rb") as f:
+        st.download_button(
+            "⬇️ Descargar",
+            data=f,
+            file_name=export_listo["nombre"],
+            mime="text/csv" if export_listo["formato"] == "csv" else "application/octet-stream",
+            key="descargar_export",
+        )
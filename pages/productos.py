@@ -6,6 +6,9 @@ from utils.formato import configurar_pagina, verificar_acceso, sidebar_personali
 
 service = ProductoService()
 
+# Resultados que se muestran como máximo en la búsqueda aproximada
+LIMITE_BUSQUEDA = 50
+
 # Configuración
 configurar_pagina("Productos - Sistema de Inventario")
 verificar_acceso()
@@ -97,42 +100,51 @@ def main():
 
     st.markdown("---")
 
-    # Obtener productos
-    productos = service.listar(0, 1000000)
-    df = pd.DataFrame([p.to_dict() for p in productos])
-
-    # Filtrar
-    if valor.strip():
-        df = df[df[campo].astype(str).str.contains(valor, case=False, na=False)]
-
-    # Ordenar
-    df = df.sort_values(by=campo_orden, ascending=asc)
-
-    # Paginar
-    total = len(df)
-    paginas = max(1, (total - 1) // cantidad + 1)
+    # Volver a la primera página si cambian filtro, orden o tamaño
+    consulta = (campo, valor.strip(), campo_orden, asc, cantidad)
+    if st.session_state.get("consulta_prod") != consulta:
+        st.session_state.consulta_prod = consulta
+        st.session_state.pagina_prod = 1
+        st.session_state.cursor_prod = (None, False)
 
     if "pagina_prod" not in st.session_state:
         st.session_state.pagina_prod = 1
+    if "cursor_prod" not in st.session_state:
+        st.session_state.cursor_prod = (None, False)
 
-    colA, colB, colC = st.columns([1, 2, 1])
-    with colA:
-        if st.button("⟵ Anterior", disabled=st.session_state.pagina_prod == 1):
-            st.session_state.pagina_prod -= 1
-            st.rerun()
-    with colC:
-        if st.button("Siguiente ⟶", disabled=st.session_state.pagina_prod == paginas):
-            st.session_state.pagina_prod += 1
-            st.rerun()
-    with colB:
-        st.markdown(
-            f"<h5 style='text-align:center;'>Página {st.session_state.pagina_prod} / {paginas}</h5>",
-            unsafe_allow_html=True,
+    if valor.strip():
+        # Búsqueda aproximada (trigramas): resultados por relevancia, sin paginar
+        resultados = service.buscar(valor, limite=LIMITE_BUSQUEDA, campos=[campo])
+        productos = [p for p, _ in resultados]
+        st.caption(f"{len(productos)} resultado(s) ordenados por relevancia (máx. {LIMITE_BUSQUEDA}).")
+    else:
+        # Filtrado, orden y paginación por cursor en SQL: solo se trae la página visible
+        cursor, hacia_atras = st.session_state.cursor_prod
+        productos, total, cursor_anterior, cursor_siguiente = service.listar_keyset(
+            cantidad, cursor, hacia_atras, campo, None, campo_orden, asc
         )
+        paginas = max(1, (total - 1) // cantidad + 1)
+        if cursor_anterior is None:
+            st.session_state.pagina_prod = 1
+
+        colA, colB, colC = st.columns([1, 2, 1])
+        with colA:
+            if st.button("⟵ Anterior", disabled=cursor_anterior is None):
+                st.session_state.cursor_prod = (cursor_anterior, True)
+                st.session_state.pagina_prod -= 1
+                st.rerun()
+        with colC:
+            if st.button("Siguiente ⟶", disabled=cursor_siguiente is None):
+                st.session_state.cursor_prod = (cursor_siguiente, False)
+                st.session_state.pagina_prod += 1
+                st.rerun()
+        with colB:
+            st.markdown(
+                f"<h5 style='text-align:center;'>Página {min(st.session_state.pagina_prod, paginas)} / {paginas}</h5>",
+                unsafe_allow_html=True,
+            )
 
-    ini = (st.session_state.pagina_prod - 1) * cantidad
-    fin = ini + cantidad
-    df_page = df.iloc[ini:fin].reset_index(drop=True)
+    df_page = pd.DataFrame([p.to_dict() for p in productos])
 
     # Mostrar tabla
     st.subheader("Productos")
@@ -50,13 +50,6 @@ def usuario_to_row(u):
     }
 
 
-def obtener_todos_usuarios():
-    try:
-        return service.obtener_usuarios(0, 1000000, "nombre_usuario", None, "ASC")
-    except Exception as e:
-        st.error(f"Error obteniendo usuarios: {e}")
-        return []
-
 def crear_usuario_ui(nombre, email, rol_u, telefono, telegram, password):
     return service.crear_usuario(nombre, email, rol_u, telefono, password, telegram)
 
@@ -166,46 +159,53 @@ def main():
 
     st.markdown("---")
 
-    # Obtener usuarios
-    usuarios = obtener_todos_usuarios()
-    rows = [usuario_to_row(u) for u in usuarios]
-    df = pd.DataFrame(rows)
+    # Volver a la primera página si cambian filtro, orden o tamaño
+    consulta = (campo, (valor or "").strip(), campo_orden, asc, mostrar)
+    if st.session_state.get("consulta_usr") != consulta:
+        st.session_state.consulta_usr = consulta
+        st.session_state.pagina_usr = 1
+        st.session_state.cursor_usr = (None, False)
 
-    # Filtro por campo/valor
-    if valor and valor.strip():
-        df = df[df[campo].astype(str).str.contains(valor, case=False, na=False)]
+    if "pagina_usr" not in st.session_state:
+        st.session_state.pagina_usr = 1
+    if "cursor_usr" not in st.session_state:
+        st.session_state.cursor_usr = (None, False)
 
-    # Orden
-    df = df.sort_values(by=campo_orden, ascending=asc)
+    # Obtener usuarios (filtro, orden y paginación por cursor en SQL)
+    cursor, hacia_atras = st.session_state.cursor_usr
+    try:
+        usuarios, total, cursor_anterior, cursor_siguiente = service.obtener_usuarios_keyset(
+            mostrar, cursor, hacia_atras, campo, (valor or "").strip() or None, campo_orden, asc
+        )
+    except Exception as e:
+        st.error(f"Error obteniendo usuarios: {e}")
+        usuarios, total, cursor_anterior, cursor_siguiente = [], 0, None, None
 
-    # Paginación
-    total = len(df)
     paginas = (total - 1) // mostrar + 1 if total > 0 else 1
-
-    if "pagina_usr" not in st.session_state:
+    if cursor_anterior is None:
         st.session_state.pagina_usr = 1
 
     colA, colB, colC = st.columns([1, 2, 1])
 
     with colA:
-        if st.button("⟵ Anterior", disabled=st.session_state.pagina_usr == 1):
+        if st.button("⟵ Anterior", disabled=cursor_anterior is None):
+            st.session_state.cursor_usr = (cursor_anterior, True)
             st.session_state.pagina_usr -= 1
             st.rerun()
 
     with colC:
-        if st.button("Siguiente ⟶", disabled=st.session_state.pagina_usr == paginas):
+        if st.button("Siguiente ⟶", disabled=cursor_siguiente is None):
+            st.session_state.cursor_usr = (cursor_siguiente, False)
             st.session_state.pagina_usr += 1
             st.rerun()
 
     with colB:
         st.markdown(
-            f"<h5 style='text-align:center;'>Página {st.session_state.pagina_usr} / {paginas}</h5>",
+            f"<h5 style='text-align:center;'>Página {min(st.session_state.pagina_usr, paginas)} / {paginas}</h5>",
             unsafe_allow_html=True,
         )
 
-    ini = (st.session_state.pagina_usr - 1) * mostrar
-    fin = ini + mostrar
-    df_page = df.iloc[ini:fin].reset_index(drop=True)
+    df_page = pd.DataFrame([usuario_to_row(u) for u in usuarios])
 
     # Dataframe para mostrar (ocultamos password)
     df_display = df_page.drop(columns=["password"], errors="ignore")
@@ -0,0 +1,123 @@
+# repositories/catalogo_cache.py
+"""
+Caché de catálogo para el registro de movimientos.
+
+Guarda en memoria, compartido por todas las sesiones del proceso:
+  - id_producto -> datos del producto (incluida una foto de stock_actual)
+  - (nombre_producto, marca) -> id_producto
+  - códigos de transacción que ya existen
+
+Se invalida con utils.cache.invalidar: "productos" (altas, cambios y bajas
+en ProductoRepository) vacía todo; "producto:<id>" (un movimiento cambia su
+stock) solo la ficha de ese producto; invalidar() sin etiquetas, todo. Cada invalidación sube la versión y
+lo leído de la BD antes de una invalidación no se guarda, así una lectura
+lenta no puede reintroducir datos viejos.
+
+El stock es solo orientativo: el commit del movimiento lo vuelve a validar.
+"""
+import threading
+
+from psycopg2.extras import RealDictCursor
+
+from database.connection import get_connection
+from utils.cache import CacheTTL, al_invalidar
+
+SQL_PRODUCTO = """
+    SELECT id_producto, nombre_producto, categoria, marca,
+           stock_actual, stock_minimo, precio_unitario, estado
+    FROM productos
+"""
+
+
+class CatalogoCache:
+
+    def __init__(self, max_productos=20000, ttl=300.0, ttl_stock=60.0):
+        self.ttl_stock = ttl_stock
+        self.productos = CacheTTL("catalogo_productos", max_entradas=max_productos, ttl=ttl)
+        self.nombres = CacheTTL("catalogo_nombres", max_entradas=max_productos, ttl=ttl)
+        self.transacciones = CacheTTL("catalogo_transacciones", max_entradas=50000, ttl=3600.0)
+        self.version = 0
+        self._lock = threading.Lock()
+        al_invalidar(self._al_invalidar)
+
+    def _al_invalidar(self, etiquetas):
+        # invalidar() sin etiquetas lo invalida todo, también el catálogo
+        if not etiquetas or any(e == "productos" or e.startswith("producto:") for e in etiquetas):
+            with self._lock:
+                self.version += 1
+
+    def _guardar_producto(self, producto, version):
+        with self._lock:
+            if version != self.version:
+                return
+            id_producto = producto["id_producto"]
+            self.productos.guardar(
+                id_producto, producto, ttl=self.ttl_stock,
+                etiquetas=("productos", f"producto:{id_producto}"),
+            )
+            self.nombres.guardar(
+                (producto["nombre_producto"], producto["marca"]), id_producto, etiquetas=("productos",)
+            )
+
+    def producto(self, id_producto):
+        """Datos del producto (dict) o None si no existe."""
+        producto = self.productos.obtener(id_producto)
+        if producto is not None:
+            return producto
+
+        version = self.version
+        with get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(SQL_PRODUCTO + " WHERE id_producto = %s", (id_producto,))
+                fila = cur.fetchone()
+        if fila is None:
+            return None
+        producto = dict(fila)
+        self._guardar_producto(producto, version)
+        return producto
+
+    def id_por_nombre_marca(self, nombre_producto, marca):
+        """id_producto con ese nombre y marca exactos, o None."""
+        id_producto = self.nombres.obtener((nombre_producto, marca))
+        if id_producto is not None:
+            return id_producto
+
+        version = self.version
+        with get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(
+                    SQL_PRODUCTO + " WHERE nombre_producto = %s AND marca = %s ORDER BY id_producto LIMIT 1",
+                    (nombre_producto, marca),
+                )
+                fila = cur.fetchone()
+        if fila is None:
+            return None
+        self._guardar_producto(dict(fila), version)
+        return fila["id_producto"]
+
+    def existe_transaccion(self, codigo_mov):
+        # Solo se cachean los códigos que existen: uno inexistente puede crearse en cualquier momento
+        if self.transacciones.obtener(codigo_mov):
+            return True
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1 FROM transacciones WHERE codigo_mov = %s LIMIT 1", (codigo_mov,))
+                existe = cur.fetchone() is not None
+        if existe:
+            self.transacciones.guardar(codigo_mov, True)
+        return existe
+
+    def marcar_transaccion(self, codigo_mov):
+        self.transacciones.guardar(codigo_mov, True)
+
+    def estadisticas(self):
+        return {
+            "version": self.version,
+            "productos": self.productos.estadisticas(),
+            "nombres": self.nombres.estadisticas(),
+            "transacciones": self.transacciones.estadisticas(),
+        }
+
+
+# Instancia compartida por todo el proceso
+catalogo = CatalogoCache()
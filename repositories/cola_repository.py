@@ -0,0 +1,219 @@
+# repositories/cola_repository.py
+"""
+Acceso a la tabla cola_facturas (migración 005).
+
+Estados: pendiente -> procesando -> hecha | fallida (dead letter).
+Una factura 'procesando' cuyo plazo (disponible_en) ha vencido se
+considera abandonada y se vuelve a tomar, salvo que ya haya agotado sus
+max_intentos: entonces pasa a fallida.
+
+Cada toma es una reserva identificada por (intentos, iniciada_en):
+completar, reintentar y descartar solo actúan si la factura sigue con esa
+reserva, para que un trabajador cuyo plazo venció no pise el resultado de
+quien la volvió a tomar.
+"""
+from psycopg2.extras import Json, RealDictCursor
+
+from database.connection import get_connection
+
+
+class ColaFacturasRepository:
+
+    @staticmethod
+    def encolar(payload, codigo_mov=None, max_intentos=5):
+        """Añade una factura a la cola. Devuelve su id."""
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO cola_facturas (payload, codigo_mov, max_intentos)
+                    VALUES (%s, %s, %s)
+                    RETURNING id;
+                    """,
+                    (Json(payload), codigo_mov, max_intentos),
+                )
+                return cur.fetchone()[0]
+
+    @staticmethod
+    def pendientes():
+        """Facturas por procesar (pendientes o en proceso)."""
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT COUNT(*) FROM cola_facturas WHERE estado IN ('pendiente', 'procesando')")
+                return cur.fetchone()[0]
+
+    @staticmethod
+    def tomar(limite, plazo_segundos=300):
+        """
+        Reserva hasta `limite` facturas disponibles, las más antiguas primero.
+        SKIP LOCKED permite que varios trabajadores (o procesos) tomen lotes
+        distintos a la vez sin esperarse. Las abandonadas que ya agotaron
+        max_intentos pasan a fallidas en lugar de reservarse (y no se
+        devuelven). Devuelve [{"id", "payload", "intentos", "max_intentos",
+        "iniciada_en", "encolada_en"}]; intentos e iniciada_en son la reserva.
+        """
+        if limite <= 0:
+            return []
+        with get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(
+                    """
+                    WITH siguientes AS (
+                        SELECT id, intentos >= max_intentos AS agotada
+                        FROM cola_facturas
+                        WHERE estado IN ('pendiente', 'procesando')
+                          AND disponible_en <= now()
+                        ORDER BY disponible_en, id
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    ),
+                    agotadas AS (
+                        UPDATE cola_facturas c
+                        SET estado = 'fallida',
+                            terminada_en = now(),
+                            ultimo_error = 'Agotados ' || c.intentos || ' intentos (el último no terminó en plazo)'
+                                           || COALESCE(': ' || c.ultimo_error, '')
+                        FROM siguientes s
+                        WHERE c.id = s.id AND s.agotada
+                    )
+                    UPDATE cola_facturas c
+                    SET estado = 'procesando',
+                        intentos = c.intentos + 1,
+                        iniciada_en = now(),
+                        disponible_en = now() + make_interval(secs => %s)
+                    FROM siguientes s
+                    WHERE c.id = s.id AND NOT s.agotada
+                    RETURNING c.id, c.payload, c.intentos, c.max_intentos, c.iniciada_en, c.encolada_en;
+                    """,
+                    (limite, plazo_segundos),
+                )
+                return [dict(f) for f in cur.fetchall()]
+
+    @staticmethod
+    def _terminar_reserva(reserva, asignaciones, valores):
+        """
+        UPDATE de la factura de `reserva` (lo que devolvió tomar) solo si
+        sigue en proceso con esa misma reserva. Devuelve False si la reserva
+        ya no es suya (plazo vencido y tomada por otro, descartada...).
+        """
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    UPDATE cola_facturas
+                    SET {asignaciones}
+                    WHERE id = %s
+                      AND estado = 'procesando'
+                      AND intentos = %s
+                      AND iniciada_en = %s;
+                    """,
+                    (*valores, reserva["id"], reserva["intentos"], reserva["iniciada_en"]),
+                )
+                return cur.rowcount == 1
+
+    @staticmethod
+    def completar(reserva, resultado):
+        """Marca como hecha la factura reservada. Devuelve False si ya no tenía la reserva."""
+        return ColaFacturasRepository._terminar_reserva(
+            reserva,
+            "estado = 'hecha', terminada_en = now(), resultado = %s, ultimo_error = NULL",
+            (Json(resultado),),
+        )
+
+    @staticmethod
+    def reintentar(reserva, error, retraso_segundos):
+        """
+        Devuelve la factura reservada a la cola para dentro de
+        `retraso_segundos`. Devuelve False si ya no tenía la reserva.
+        """
+        return ColaFacturasRepository._terminar_reserva(
+            reserva,
+            "estado = 'pendiente', ultimo_error = %s, disponible_en = now() + make_interval(secs => %s)",
+            (error, retraso_segundos),
+        )
+
+    @staticmethod
+    def descartar(reserva, error, resultado=None):
+        """
+        Manda la factura reservada a fallidas (dead letter): ya no se
+        reintenta sola. Devuelve False si ya no tenía la reserva.
+        """
+        return ColaFacturasRepository._terminar_reserva(
+            reserva,
+            "estado = 'fallida', terminada_en = now(), ultimo_error = %s, resultado = %s",
+            (error, Json(resultado) if resultado is not None else None),
+        )
+
+    @staticmethod
+    def reencolar_fallidas(ids=None):
+        """Vuelve a poner en la cola las fallidas (todas o las de `ids`). Devuelve cuántas."""
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE cola_facturas
+                    SET estado = 'pendiente', intentos = 0, disponible_en = now(),
+                        terminada_en = NULL
+                    WHERE estado = 'fallida'
+                      AND (%(ids)s::bigint[] IS NULL OR id = ANY(%(ids)s::bigint[]));
+                    """,
+                    {"ids": list(ids) if ids else None},
+                )
+                return cur.rowcount
+
+    @staticmethod
+    def fallidas(limite=50):
+        with get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(
+                    """
+                    SELECT id, codigo_mov, intentos, encolada_en, terminada_en, ultimo_error
+                    FROM cola_facturas
+                    WHERE estado = 'fallida'
+                    ORDER BY terminada_en DESC
+                    LIMIT %s;
+                    """,
+                    (limite,),
+                )
+                return [dict(f) for f in cur.fetchall()]
+
+    @staticmethod
+    def estadisticas(ventana_minutos=60):
+        """
+        Profundidad de la cola por estado, antigüedad de la pendiente más
+        vieja y latencia (encolada -> terminada) de lo procesado en la ventana.
+        """
+        with get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(
+                    """
+                    SELECT
+                        COUNT(*) FILTER (WHERE estado = 'pendiente')  AS pendientes,
+                        COUNT(*) FILTER (WHERE estado = 'procesando') AS procesando,
+                        COUNT(*) FILTER (WHERE estado = 'fallida')    AS fallidas,
+                        EXTRACT(EPOCH FROM now() - MIN(encolada_en)
+                            FILTER (WHERE estado IN ('pendiente', 'procesando'))) AS antiguedad_s
+                    FROM cola_facturas
+                    WHERE estado <> 'hecha';
+                    """
+                )
+                profundidad = dict(cur.fetchone())
+                cur.execute(
+                    """
+                    SELECT
+                        COUNT(*) AS terminadas,
+                        AVG(EXTRACT(EPOCH FROM terminada_en - encolada_en)) AS latencia_media_s,
+                        percentile_cont(0.95) WITHIN GROUP (
+                            ORDER BY EXTRACT(EPOCH FROM terminada_en - encolada_en)
+                        ) AS latencia_p95_s
+                    FROM cola_facturas
+                    WHERE estado IN ('hecha', 'fallida')
+                      AND terminada_en >= now() - make_interval(mins => %s);
+                    """,
+                    (ventana_minutos,),
+                )
+                latencia = dict(cur.fetchone())
+        return {
+            k: float(v) if v is not None and k not in ("pendientes", "procesando", "fallidas", "terminadas") else v
+            for k, v in {**profundidad, **latencia}.items()
+        }
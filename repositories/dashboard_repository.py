@@ -1,97 +1,105 @@
 # repositories/dashboard_repository.py
 from database.connection import get_connection
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from models.serie_ventas import SerieVentas
+from utils.cache import no_cachear
 import pandas as pd
 import logging
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Periodos de ranking_productos
+PERIODOS_RANKING = ("total", "mes", "30dias")
+
+# Granularidad de serie_ventas -> campo de date_trunc
+GRANULARIDADES = {"hora": "hour", "dia": "day", "semana": "week", "mes": "month"}
+
 
 class DashboardRepository:
     """
     Repositorio para métricas del dashboard usando las tablas:
-      - mov_inventario (id_mov, codigo_mov, id_producto, cantidad, fecha, tipo_movimiento)
+      - mov_inventario (id_mov, codigo_mov, id_producto, cantidad, fecha, tipo_movimiento,
+        precio_unitario: precio de venta congelado, migración 013)
       - transacciones (id_transaccion, codigo_mov, id_usuario, fecha_mov, referencia, metodo_registro)
       - productos (id_producto, nombre_producto, categoria, marca, stock_actual, stock_minimo, precio_unitario, estado, fecha_creacion)
       - stock_seguridad_categoria (categoria, stock_seguridad, fecha)
+      - ventas_diarias (dia, id_producto, categoria, unidades, importe, num_ventas):
+        agregado de ventas por día y producto mantenido por triggers
+        (database/migrations/002_ventas_diarias.sql)
     """
 
+    def __init__(self, statement_timeout_ms: Optional[int] = None):
+        # Tiempo máximo de cada consulta (ver get_connection); None = sin límite
+        self.statement_timeout_ms = statement_timeout_ms
+
     def _get_conn(self):
-        conn = get_connection()
+        conn = get_connection(self.statement_timeout_ms)
         if not conn:
             raise ConnectionError("No se pudo obtener conexión a la base de datos.")
         return conn
 
+    @staticmethod
+    def _rango_mes(ahora: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+        """
+        Intervalo semiabierto [inicio, fin) del mes de `ahora`.
+        Comparar t.fecha_mov contra un rango permite usar el índice sobre
+        fecha_mov (EXTRACT/DATE sobre la columna obligan a recorrer la tabla).
+        """
+        ahora = ahora or datetime.now()
+        inicio = datetime(ahora.year, ahora.month, 1)
+        if ahora.month == 12:
+            fin = datetime(ahora.year + 1, 1, 1)
+        else:
+            fin = datetime(ahora.year, ahora.month + 1, 1)
+        return inicio, fin
+
+    @staticmethod
+    def _rango_dia(ahora: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+        """Intervalo semiabierto [inicio, fin) del día de `ahora`."""
+        ahora = ahora or datetime.now()
+        inicio = datetime(ahora.year, ahora.month, ahora.day)
+        return inicio, inicio + timedelta(days=1)
+
     def obtener_resumen_mes(self) -> Dict[str, float]:
+        """
+        KPIs del mes en una sola consulta sobre ventas_diarias (una fila por
+        día y producto), más el contador de productos bajo stock como subconsulta.
+        """
         ahora = datetime.now()
-        mes = ahora.month
-        anio = ahora.year
+        inicio_mes, fin_mes = self._rango_mes(ahora)
         try:
-            conn = self._get_conn()
-            with conn.cursor() as cursor:
-                # Ventas del mes (contador de movimientos de tipo 'venta')
-                cursor.execute(
-                    """
-                    SELECT COUNT(*) 
-                    FROM mov_inventario m
-                    JOIN transacciones t ON m.codigo_mov = t.codigo_mov
-                    WHERE m.tipo_movimiento = 'venta'
-                      AND EXTRACT(MONTH FROM t.fecha_mov) = %s
-                      AND EXTRACT(YEAR FROM t.fecha_mov) = %s
-                    """,
-                    (mes, anio),
-                )
-                ventas_mes = int(cursor.fetchone()[0] or 0)
-
-                # Ingresos del mes (cantidad * precio_unitario)
-                cursor.execute(
-                    """
-                    SELECT COALESCE(SUM(m.cantidad * p.precio_unitario), 0)
-                    FROM mov_inventario m
-                    JOIN productos p ON m.id_producto = p.id_producto
-                    JOIN transacciones t ON m.codigo_mov = t.codigo_mov
-                    WHERE m.tipo_movimiento = 'venta'
-                      AND EXTRACT(MONTH FROM t.fecha_mov) = %s
-                      AND EXTRACT(YEAR FROM t.fecha_mov) = %s
-                    """,
-                    (mes, anio),
-                )
-                ingresos_mes = float(cursor.fetchone()[0] or 0.0)
-
-                # Ventas hoy
-                cursor.execute(
-                    """
-                    SELECT COUNT(*)
-                    FROM mov_inventario m
-                    JOIN transacciones t ON m.codigo_mov = t.codigo_mov
-                    WHERE m.tipo_movimiento = 'venta'
-                      AND DATE(t.fecha_mov) = CURRENT_DATE
-                    """
-                )
-                ventas_hoy = int(cursor.fetchone()[0] or 0)
-
-                # Productos bajo stock (solo activos)
-                cursor.execute(
-                    """
-                    SELECT COUNT(*) 
-                    FROM productos
-                    WHERE stock_actual < stock_minimo
-                      AND estado = 'activo'
-                    """
-                )
-                productos_bajo_stock = int(cursor.fetchone()[0] or 0)
-
-            conn.close()
+            with self._get_conn() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        SELECT
+                            COALESCE(SUM(v.num_ventas), 0) AS ventas_mes,
+                            COALESCE(SUM(v.importe), 0) AS ingresos_mes,
+                            COALESCE(SUM(v.num_ventas) FILTER (WHERE v.dia = %s), 0) AS ventas_hoy,
+                            (
+                                SELECT COUNT(*)
+                                FROM productos
+                                WHERE stock_actual < stock_minimo
+                                  AND estado = 'activo'
+                            ) AS productos_bajo_stock
+                        FROM ventas_diarias v
+                        WHERE v.dia >= %s
+                          AND v.dia < %s
+                        """,
+                        (ahora.date(), inicio_mes.date(), fin_mes.date()),
+                    )
+                    ventas_mes, ingresos_mes, ventas_hoy, productos_bajo_stock = cursor.fetchone()
             return {
-                "ventas_mes": ventas_mes,
-                "ingresos_mes": round(ingresos_mes, 2),
-                "ventas_hoy": ventas_hoy,
-                "productos_bajo_stock": productos_bajo_stock,
+                "ventas_mes": int(ventas_mes or 0),
+                "ingresos_mes": round(float(ingresos_mes or 0.0), 2),
+                "ventas_hoy": int(ventas_hoy or 0),
+                "productos_bajo_stock": int(productos_bajo_stock or 0),
             }
         except Exception:
             logger.exception("[DashboardRepository][obtener_resumen_mes] Error")
+            no_cachear()
             return {
                 "ventas_mes": 0,
                 "ingresos_mes": 0.0,
@@ -102,87 +110,237 @@ class DashboardRepository:
     def obtener_ventas_mes_actual(self) -> pd.DataFrame:
         """
         Devuelve DataFrame con columnas: 'dia' (date) y 'total_dia' (float).
-        Usa mov_inventario + transacciones + productos y filtra por tipo_movimiento = 'venta'.
+        Lee el agregado ventas_diarias, así que el coste depende de los días del mes.
         """
-        ahora = datetime.now()
-        mes = ahora.month
-        anio = ahora.year
+        inicio_mes, fin_mes = self._rango_mes()
 
         query = """
             SELECT
-                DATE(t.fecha_mov) AS dia,
-                SUM(m.cantidad * p.precio_unitario) AS total_dia
-            FROM mov_inventario m
-            JOIN transacciones t ON m.codigo_mov = t.codigo_mov
-            JOIN productos p ON m.id_producto = p.id_producto
-            WHERE m.tipo_movimiento = 'venta'
-              AND EXTRACT(MONTH FROM t.fecha_mov) = %s
-              AND EXTRACT(YEAR FROM t.fecha_mov) = %s
+                dia,
+                SUM(importe) AS total_dia
+            FROM ventas_diarias
+            WHERE dia >= %s
+              AND dia < %s
             GROUP BY dia
             ORDER BY dia ASC
         """
         try:
-            conn = self._get_conn()
-            df = pd.read_sql_query(query, conn, params=[mes, anio])
-            conn.close()
+            with self._get_conn() as conn:
+                df = pd.read_sql_query(query, conn, params=[inicio_mes.date(), fin_mes.date()])
             if not df.empty:
                 df["dia"] = pd.to_datetime(df["dia"]).dt.date
                 df["total_dia"] = df["total_dia"].astype(float)
             return df
         except Exception:
             logger.exception("[DashboardRepository][obtener_ventas_mes_actual] Error")
+            no_cachear()
             return pd.DataFrame(columns=["dia", "total_dia"])
 
+    def serie_ventas(
+        self,
+        desde,
+        hasta,
+        granularidad: str = "dia",
+        categoria: Optional[str] = None,
+        id_producto: Optional[int] = None,
+    ) -> SerieVentas:
+        """
+        Ventas de [desde, hasta) agrupadas por hora, día, semana o mes, con un
+        valor por periodo aunque no haya ventas (generate_series en la propia
+        consulta), opcionalmente de una categoría o un producto.
+
+        Por día, semana y mes lee ventas_diarias (desde/hasta se toman como
+        días; las semanas empiezan en lunes y el primer y el último periodo
+        pueden estar incompletos). Por hora no hay agregado: suma las líneas
+        de venta por la hora en que se registraron (mov_inventario.fecha, la
+        clave de partición, así que solo se leen los meses del rango) con el
+        precio guardado en cada línea. No se usa transacciones.fecha_mov
+        porque suele traer solo el día (00:00): por hora las ventas de un día
+        con fecha de factura anterior cuentan en la hora en que se registraron.
+        """
+        if granularidad not in GRANULARIDADES:
+            raise ValueError(f"Granularidad no válida: '{granularidad}' (usa {', '.join(GRANULARIDADES)})")
+        if isinstance(desde, datetime) and granularidad != "hora":
+            desde = desde.date()
+        if isinstance(hasta, datetime) and granularidad != "hora":
+            hasta = hasta.date() + timedelta(days=1) if hasta.time() != datetime.min.time() else hasta.date()
+
+        if granularidad == "hora":
+            ventas = """
+                SELECT date_trunc('hour', m.fecha) AS periodo,
+                       SUM(m.cantidad * COALESCE(m.precio_unitario, 0)) AS importe,
+                       SUM(m.cantidad) AS unidades,
+                       COUNT(*) AS num_ventas
+                FROM mov_inventario m
+                LEFT JOIN productos p ON p.id_producto = m.id_producto
+                WHERE m.tipo_movimiento = 'venta'
+                  AND m.fecha >= %(desde)s
+                  AND m.fecha < %(hasta)s
+                  AND (%(categoria)s::text IS NULL OR p.categoria = %(categoria)s)
+                  AND (%(id_producto)s::integer IS NULL OR m.id_producto = %(id_producto)s)
+                GROUP BY 1
+            """
+        else:
+            ventas = """
+                SELECT date_trunc(%(campo)s, v.dia::timestamp) AS periodo,
+                       SUM(v.importe) AS importe,
+                       SUM(v.unidades) AS unidades,
+                       SUM(v.num_ventas) AS num_ventas
+                FROM ventas_diarias v
+                WHERE v.dia >= %(desde)s
+                  AND v.dia < %(hasta)s
+                  AND (%(categoria)s::text IS NULL OR v.categoria = %(categoria)s)
+                  AND (%(id_producto)s::integer IS NULL OR v.id_producto = %(id_producto)s)
+                GROUP BY 1
+            """
+        query = f"""
+            WITH ventas AS ({ventas}),
+            periodos AS (
+                SELECT generate_series(
+                    date_trunc(%(campo)s, %(desde)s::timestamp),
+                    %(hasta)s::timestamp - interval '1 microsecond',
+                    ('1 ' || %(campo)s)::interval
+                ) AS periodo
+            )
+            SELECT g.periodo,
+                   COALESCE(v.importe, 0)::float8,
+                   COALESCE(v.unidades, 0)::float8,
+                   COALESCE(v.num_ventas, 0)::bigint
+            FROM periodos g
+            LEFT JOIN ventas v ON v.periodo = g.periodo
+            ORDER BY g.periodo
+        """
+        params = {
+            "campo": GRANULARIDADES[granularidad],
+            "desde": desde,
+            "hasta": hasta,
+            "categoria": categoria,
+            "id_producto": id_producto,
+        }
+        try:
+            with self._get_conn() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(query, params)
+                    filas = cursor.fetchall()
+            return SerieVentas.desde_filas(granularidad, filas)
+        except Exception:
+            logger.exception("[DashboardRepository][serie_ventas] Error")
+            no_cachear()
+            return SerieVentas.vacia(granularidad)
+
     def obtener_ranking_productos_vendidos(self, limit: int = 10) -> pd.DataFrame:
         """
-        Top N productos por cantidad vendida (histórico).
-        Si quieres top del mes actual, lo adaptamos filtrando por t.fecha_mov.
+        Top N productos por cantidad vendida (histórico), leído de los
+        totales por producto. Ver ranking_productos.
         """
-        query = """
-            SELECT
-                p.nombre_producto,
-                SUM(m.cantidad) AS total_vendido
-            FROM mov_inventario m
-            JOIN productos p ON m.id_producto = p.id_producto
-            WHERE m.tipo_movimiento = 'venta'
-            GROUP BY p.nombre_producto
-            ORDER BY total_vendido DESC
-            LIMIT %s
+        return self.ranking_productos("total", limit)
+
+    def ranking_productos(self, periodo: str = "total", limite: int = 10) -> pd.DataFrame:
+        """
+        Top N productos por unidades vendidas en el periodo:
+          - "total": todo el histórico, de ventas_producto_totales; el top N
+            se lee por el índice de unidades sin ordenar todos los productos
+          - "mes": el mes actual, de ventas_diarias
+          - "30dias": los últimos 30 días (incluido hoy), de ventas_diarias
+        Cada producto sale por separado aunque otro tenga el mismo nombre.
+        Devuelve DataFrame con columnas: id_producto, nombre_producto, marca,
+        total_vendido (int) e importe (float).
         """
+        if periodo not in PERIODOS_RANKING:
+            raise ValueError(f"Periodo no válido: '{periodo}' (usa {', '.join(PERIODOS_RANKING)})")
+
+        if periodo == "total":
+            query = """
+                SELECT
+                    t.id_producto,
+                    p.nombre_producto,
+                    p.marca,
+                    t.unidades AS total_vendido,
+                    t.importe
+                FROM (
+                    SELECT id_producto, unidades, importe
+                    FROM ventas_producto_totales
+                    WHERE unidades > 0
+                    ORDER BY unidades DESC, id_producto
+                    LIMIT %s
+                ) t
+                JOIN productos p ON p.id_producto = t.id_producto
+                ORDER BY t.unidades DESC, t.id_producto
+            """
+            params = [limite]
+        else:
+            if periodo == "mes":
+                inicio, fin = self._rango_mes()
+            else:
+                fin = self._rango_dia()[1]
+                inicio = fin - timedelta(days=30)
+            query = """
+                SELECT
+                    v.id_producto,
+                    p.nombre_producto,
+                    p.marca,
+                    v.unidades AS total_vendido,
+                    v.importe
+                FROM (
+                    SELECT id_producto, SUM(unidades) AS unidades, SUM(importe) AS importe
+                    FROM ventas_diarias
+                    WHERE dia >= %s
+                      AND dia < %s
+                    GROUP BY id_producto
+                    HAVING SUM(unidades) > 0
+                    ORDER BY unidades DESC, id_producto
+                    LIMIT %s
+                ) v
+                JOIN productos p ON p.id_producto = v.id_producto
+                ORDER BY v.unidades DESC, v.id_producto
+            """
+            params = [inicio.date(), fin.date(), limite]
+
         try:
-            conn = self._get_conn()
-            df = pd.read_sql_query(query, conn, params=[limit])
-            conn.close()
+            with self._get_conn() as conn:
+                df = pd.read_sql_query(query, conn, params=params)
             if not df.empty:
                 df["total_vendido"] = df["total_vendido"].astype(int)
+                df["importe"] = df["importe"].astype(float)
             return df
         except Exception:
-            logger.exception("[DashboardRepository][obtener_ranking_productos_vendidos] Error")
-            return pd.DataFrame(columns=["nombre_producto", "total_vendido"])
+            logger.exception("[DashboardRepository][ranking_productos] Error")
+            no_cachear()
+            return pd.DataFrame(columns=["id_producto", "nombre_producto", "marca", "total_vendido", "importe"])
 
     def ultimas_ventas(self, limite: int = 10) -> pd.DataFrame:
         """
-        Últimas N líneas de mov_inventario tipo 'venta' con datos de producto y fecha.
+        Últimas N líneas de mov_inventario tipo 'venta' registradas (por
+        mov_inventario.fecha, la clave de partición) con datos de producto y
+        la fecha de la factura. Como InventarioRepository.ultimos_movimientos,
+        primero busca solo desde el mes anterior y solo si no hay bastantes
+        recorre todo el histórico; al ordenar por la misma columna que acota,
+        el resultado es el mismo que sin ventana.
         """
         query = """
             SELECT 
                 m.codigo_mov,
                 p.nombre_producto,
                 m.cantidad,
-                p.precio_unitario,
-                (p.precio_unitario * m.cantidad) AS precio_total,
+                m.precio_unitario,
+                (m.precio_unitario * m.cantidad) AS precio_total,
                 t.fecha_mov
             FROM mov_inventario m
             JOIN transacciones t ON m.codigo_mov = t.codigo_mov
             JOIN productos p ON m.id_producto = p.id_producto
             WHERE m.tipo_movimiento = 'venta'
-            ORDER BY t.fecha_mov DESC
+              AND m.fecha >= %s
+            ORDER BY m.fecha DESC, m.id_mov DESC
             LIMIT %s
         """
+        hoy = date.today()
+        inicio_mes_anterior = (hoy.replace(day=1) - timedelta(days=1)).replace(day=1)
+        desde = datetime.combine(inicio_mes_anterior, datetime.min.time())
         try:
-            conn = self._get_conn()
-            df = pd.read_sql_query(query, conn, params=[limite])
-            conn.close()
+            with self._get_conn() as conn:
+                df = pd.read_sql_query(query, conn, params=[desde, limite])
+                if len(df) < limite:
+                    df = pd.read_sql_query(query, conn, params=["-infinity", limite])
             if not df.empty:
                 df["fecha_mov"] = pd.to_datetime(df["fecha_mov"])
                 df["cantidad"] = df["cantidad"].astype(int)
@@ -191,6 +349,7 @@ class DashboardRepository:
             return df
         except Exception:
             logger.exception("[DashboardRepository][ultimas_ventas] Error")
+            no_cachear()
             return pd.DataFrame(
                 columns=[
                     "codigo_mov",
@@ -218,42 +377,38 @@ class DashboardRepository:
             ORDER BY stock_actual ASC
         """
         try:
-            conn = self._get_conn()
-            df = pd.read_sql_query(query, conn)
-            conn.close()
+            with self._get_conn() as conn:
+                df = pd.read_sql_query(query, conn)
             return df
         except Exception:
             logger.exception("[DashboardRepository][productos_bajo_stock] Error")
+            no_cachear()
             return pd.DataFrame(columns=["id_producto", "nombre_producto", "stock_actual", "stock_minimo"])
 
     def ventas_por_categoria_mes(self) -> pd.DataFrame:
         """
-        Total ventas por categoria en el mes actual (suma de cantidad * precio_unitario).
+        Total ventas por categoria en el mes actual (suma de cantidad * precio_unitario),
+        leído de ventas_diarias.
         """
-        ahora = datetime.now()
-        mes = ahora.month
-        anio = ahora.year
+        inicio_mes, fin_mes = self._rango_mes()
 
         query = """
             SELECT
-                p.categoria,
-                SUM(m.cantidad * p.precio_unitario) AS total_categoria
-            FROM mov_inventario m
-            JOIN productos p ON m.id_producto = p.id_producto
-            JOIN transacciones t ON m.codigo_mov = t.codigo_mov
-            WHERE m.tipo_movimiento = 'venta'
-              AND EXTRACT(MONTH FROM t.fecha_mov) = %s
-              AND EXTRACT(YEAR FROM t.fecha_mov) = %s
-            GROUP BY p.categoria
+                categoria,
+                SUM(importe) AS total_categoria
+            FROM ventas_diarias
+            WHERE dia >= %s
+              AND dia < %s
+            GROUP BY categoria
             ORDER BY total_categoria DESC
         """
         try:
-            conn = self._get_conn()
-            df = pd.read_sql_query(query, conn, params=[mes, anio])
-            conn.close()
+            with self._get_conn() as conn:
+                df = pd.read_sql_query(query, conn, params=[inicio_mes.date(), fin_mes.date()])
             if not df.empty:
                 df["total_categoria"] = df["total_categoria"].astype(float)
             return df
         except Exception:
             logger.exception("[DashboardRepository][ventas_por_categoria_mes] Error")
+            no_cachear()
             return pd.DataFrame(columns=["categoria", "total_categoria"])
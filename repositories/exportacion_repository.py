@@ -0,0 +1,44 @@
+# repositories/exportacion_repository.py
+import itertools
+
+from database.connection import get_connection
+
+_contador_cursores = itertools.count(1)
+
+
+class ExportacionRepository:
+    """
+    Lecturas en streaming para exportar tablas grandes sin cargarlas en
+    memoria: COPY TO STDOUT para CSV y cursor con nombre (del lado del
+    servidor) para leer por bloques de tamaño fijo.
+    """
+
+    @staticmethod
+    def copiar_csv(sql, params, destino):
+        """
+        Escribe el resultado de `sql` como CSV con cabecera en `destino`
+        (fichero binario abierto) con COPY TO STDOUT: Postgres genera el CSV
+        y psycopg2 lo va escribiendo por trozos. Devuelve las filas copiadas.
+        """
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                consulta = cur.mogrify(sql, params).decode()
+                cur.copy_expert(f"COPY ({consulta}) TO STDOUT WITH (FORMAT csv, HEADER)", destino)
+                return cur.rowcount
+
+    @staticmethod
+    def leer_por_bloques(sql, params, tam_bloque=10_000):
+        """
+        Genera listas de como mucho `tam_bloque` tuplas con un cursor con
+        nombre: el servidor guarda el resultado y el cliente solo tiene un
+        bloque a la vez. La conexión queda ocupada hasta agotar el generador.
+        """
+        with get_connection() as conn:
+            with conn.cursor(name=f"exportacion_{next(_contador_cursores)}") as cur:
+                cur.itersize = tam_bloque
+                cur.execute(sql, params)
+                while True:
+                    filas = cur.fetchmany(tam_bloque)
+                    if not filas:
+                        break
+                    yield filas
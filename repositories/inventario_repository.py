@@ -1,5 +1,8 @@
-from psycopg2.extras import RealDictCursor
+from datetime import date, datetime, timedelta
+
+from psycopg2.extras import RealDictCursor, execute_values
 from database.connection import get_connection
+from repositories.catalogo_cache import catalogo
 
 
 class InventarioRepository:
@@ -19,31 +22,57 @@ class InventarioRepository:
 
     @staticmethod
     def get_producto_by_id(id_producto):
-        sql = """
-            SELECT id_producto, nombre_producto, categoria, marca,
-                   stock_actual, stock_minimo, precio_unitario, estado
-            FROM productos
-            WHERE id_producto = %s;
         """
-        with get_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(sql, (id_producto,))
-                return cur.fetchone()
+        Datos del producto leídos a través de la caché de catálogo
+        (repositories/catalogo_cache.py): solo va a la BD si no está en memoria.
+        """
+        return catalogo.producto(id_producto)
+
+    @staticmethod
+    def get_id_por_nombre_marca(nombre_producto, marca):
+        return catalogo.id_por_nombre_marca(nombre_producto, marca)
 
     @staticmethod
     def insertar_transaccion(conn, codigo_mov, id_usuario, fecha_mov, referencia, metodo_registro="manual"):
         """
         Inserta una transacción usando una conexión existente.
-        Devuelve (id_transaccion, fecha_mov).
+        Si ya existe una con ese codigo_mov (restricción única, migración 006)
+        no inserta nada y devuelve la existente; el llamador decide si es un
+        reenvío comparándola con movimiento_registrado.
+        Devuelve (id_transaccion, fecha_mov, creada).
         """
         sql = """
             INSERT INTO transacciones
             (codigo_mov, id_usuario, fecha_mov, referencia, metodo_registro)
             VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (codigo_mov) DO NOTHING
             RETURNING id_transaccion, fecha_mov;
         """
         with conn.cursor() as cur:
             cur.execute(sql, (codigo_mov, id_usuario, fecha_mov, referencia, metodo_registro))
+            fila = cur.fetchone()
+            if fila is None:
+                # Otra sesión la insertó antes: el INSERT esperó a su commit, así que ya es visible
+                cur.execute(
+                    "SELECT id_transaccion, fecha_mov FROM transacciones WHERE codigo_mov = %s",
+                    (codigo_mov,),
+                )
+                id_transaccion, fecha = cur.fetchone()
+                return id_transaccion, fecha, False
+        return fila[0], fila[1], True
+
+    @staticmethod
+    def bloquear_transaccion(conn, codigo_mov):
+        """
+        Bloquea (FOR UPDATE, hasta el commit de `conn`) la transacción con
+        ese código, para añadirle líneas. Devuelve (id_transaccion, fecha_mov)
+        o None si no existe.
+        """
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id_transaccion, fecha_mov FROM transacciones WHERE codigo_mov = %s FOR UPDATE",
+                (codigo_mov,),
+            )
             return cur.fetchone()
 
     @staticmethod
@@ -60,29 +89,237 @@ class InventarioRepository:
         """
         with conn.cursor() as cur:
             cur.execute(sql, (codigo_mov, id_producto, cantidad, tipo_movimiento))
-            return cur.fetchone()
+            fila = cur.fetchone()
+        return fila
+
+    @staticmethod
+    def validar_lineas(lineas, conn=None, bloquear=False):
+        """
+        Valida todas las líneas de un movimiento en una sola consulta.
+        lineas: [{"id_producto", "cantidad", "tipo_movimiento"}].
+
+        Devuelve, en el mismo orden, un dict por línea con los datos del
+        producto (existe, nombre_producto, marca, estado, stock_actual), lo
+        vendido hasta esa línea de ese producto (solicitado), si el producto
+        ya salía en una línea anterior (duplicado) y el veredicto:
+        "ok", "no_existe", "cantidad_invalida", "inactivo" o "stock_insuficiente".
+
+        Con bloquear=True (requiere `conn`) las filas de productos quedan
+        bloqueadas (FOR UPDATE, en orden de id_producto para no provocar
+        deadlocks) hasta el commit/rollback de `conn`, así que el stock no
+        puede cambiar entre esta validación y la inserción de las líneas,
+        que es la que lo descuenta.
+        """
+        if not lineas:
+            return []
+        if bloquear and conn is None:
+            raise ValueError("Para bloquear los productos hace falta la conexión de la transacción")
+
+        sql = f"""
+            WITH pedido (indice, id_producto, cantidad, tipo_movimiento) AS (
+                VALUES %s
+            ),
+            linea AS (
+                SELECT indice::integer AS indice,
+                       id_producto::integer AS id_producto,
+                       cantidad::numeric AS cantidad,
+                       tipo_movimiento::text AS tipo_movimiento,
+                       SUM(CASE WHEN tipo_movimiento = 'venta' THEN cantidad::numeric ELSE 0 END)
+                           OVER (PARTITION BY id_producto ORDER BY indice::integer) AS solicitado,
+                       ROW_NUMBER() OVER (PARTITION BY id_producto ORDER BY indice::integer) > 1 AS duplicado
+                FROM pedido
+            ),
+            producto AS (
+                SELECT p.id_producto, p.nombre_producto, p.marca, p.estado, p.stock_actual
+                FROM productos p
+                WHERE p.id_producto IN (SELECT id_producto FROM linea)
+                ORDER BY p.id_producto
+                {"FOR UPDATE" if bloquear else ""}
+            )
+            SELECT l.indice, l.id_producto, l.cantidad, l.tipo_movimiento,
+                   p.id_producto IS NOT NULL AS existe,
+                   p.nombre_producto, p.marca, p.estado, p.stock_actual,
+                   l.solicitado, l.duplicado,
+                   CASE
+                       WHEN p.id_producto IS NULL THEN 'no_existe'
+                       WHEN l.cantidad IS NULL OR l.cantidad <= 0 THEN 'cantidad_invalida'
+                       WHEN p.estado IS DISTINCT FROM 'activo' THEN 'inactivo'
+                       WHEN l.tipo_movimiento = 'venta'
+                            AND COALESCE(p.stock_actual, 0) < l.solicitado THEN 'stock_insuficiente'
+                       ELSE 'ok'
+                   END AS veredicto
+            FROM linea l
+            LEFT JOIN producto p ON p.id_producto = l.id_producto
+            ORDER BY l.indice;
+        """
+        valores = [
+            (indice, l["id_producto"], l["cantidad"], l["tipo_movimiento"])
+            for indice, l in enumerate(lineas)
+        ]
+
+        propia = conn is None
+        if propia:
+            conn = get_connection()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                filas = execute_values(cur, sql, valores, page_size=len(valores), fetch=True)
+        finally:
+            if propia:
+                conn.close()
+        return [dict(f) for f in filas]
+
+    @staticmethod
+    def validar_factura(id_usuario, id_telegram, items, conn=None):
+        """
+        Valida una factura entera en una sola consulta (lo que el flujo de
+        n8n hacía con tres subconsultas por item en realiza_validaciones):
+          - el usuario, por id_usuario o, si no viene, por id_telegram
+          - cada producto, por nombre + marca exactos (join contra VALUES)
+        Los códigos repetidos no se comprueban aquí: insertar_transaccion
+        los resuelve con ON CONFLICT.
+        items: [{"nombre_producto", "marca", "cantidad"}].
+
+        Devuelve un dict por item, en el mismo orden, con
+        {"indice", "nombre_producto", "marca", "cantidad", "id_producto",
+         "estado", "id_usuario"}; id_producto / id_usuario son None si no
+        se encontraron.
+        """
+        if not items:
+            return []
+
+        propia = conn is None
+        if propia:
+            conn = get_connection()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # execute_values solo admite el %s de VALUES: la cabecera va ya escapada
+                cabecera = cur.mogrify(
+                    "SELECT %s::integer AS id_usuario, %s::bigint AS id_telegram",
+                    (id_usuario, id_telegram),
+                ).decode().replace("%", "%%")
+                sql = f"""
+                    WITH item (indice, nombre_producto, marca, cantidad) AS (
+                        VALUES %s
+                    ),
+                    cabecera AS (
+                        {cabecera}
+                    ),
+                    validacion AS (
+                        -- Dos subconsultas y no un OR: así cada una usa su
+                        -- índice (clave primaria / id_telegram, migración 007)
+                        SELECT COALESCE(
+                            (SELECT u.id_usuario
+                             FROM usuarios u
+                             WHERE u.id_usuario = c.id_usuario),
+                            (SELECT u.id_usuario
+                             FROM usuarios u
+                             WHERE c.id_usuario IS NULL
+                               AND u.id_telegram = c.id_telegram
+                             ORDER BY u.id_usuario
+                             LIMIT 1)
+                        ) AS id_usuario
+                        FROM cabecera c
+                    )
+                    SELECT i.indice::integer AS indice,
+                           i.nombre_producto::text AS nombre_producto,
+                           i.marca::text AS marca,
+                           i.cantidad::numeric AS cantidad,
+                           p.id_producto,
+                           p.estado,
+                           v.id_usuario
+                    FROM item i
+                    CROSS JOIN validacion v
+                    LEFT JOIN LATERAL (
+                        SELECT id_producto, estado
+                        FROM productos
+                        WHERE nombre_producto = i.nombre_producto::text
+                          AND marca = i.marca::text
+                        ORDER BY id_producto
+                        LIMIT 1
+                    ) p ON true
+                    ORDER BY i.indice::integer;
+                """
+                valores = [
+                    (indice, item["nombre_producto"], item["marca"], item["cantidad"])
+                    for indice, item in enumerate(items)
+                ]
+                filas = execute_values(cur, sql, valores, page_size=len(valores), fetch=True)
+        finally:
+            if propia:
+                conn.close()
+        return [dict(f) for f in filas]
+
+    @staticmethod
+    def insertar_movimientos(conn, codigo_mov, lineas):
+        """
+        Inserta todas las líneas de un movimiento con un único INSERT multifila
+        usando una conexión existente.
+        lineas: [{"id_producto", "cantidad", "tipo_movimiento"}].
+        Devuelve la lista de id_mov en el mismo orden que las líneas.
+        """
+        if not lineas:
+            return []
+        sql = """
+            INSERT INTO mov_inventario
+            (codigo_mov, id_producto, cantidad, tipo_movimiento)
+            VALUES %s
+            RETURNING id_mov;
+        """
+        valores = [
+            (codigo_mov, l["id_producto"], l["cantidad"], l["tipo_movimiento"])
+            for l in lineas
+        ]
+        with conn.cursor() as cur:
+            filas = execute_values(cur, sql, valores, page_size=max(len(valores), 100), fetch=True)
+        return [f[0] for f in filas]
+
+    @staticmethod
+    def movimiento_registrado(conn, codigo_mov):
+        """
+        Cabecera y líneas ya guardadas con ese código, para comparar un
+        reenvío con lo registrado. Devuelve ({"id_usuario", "referencia"},
+        [{"id_mov", "id_producto", "cantidad", "tipo_movimiento"}]) con las
+        líneas en orden de inserción, o (None, []) si el código no existe.
+        """
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(
+                """
+                SELECT t.id_usuario, t.referencia,
+                       m.id_mov, m.id_producto, m.cantidad, m.tipo_movimiento
+                FROM transacciones t
+                LEFT JOIN mov_inventario m ON m.codigo_mov = t.codigo_mov
+                WHERE t.codigo_mov = %s
+                ORDER BY m.id_mov
+                """,
+                (codigo_mov,),
+            )
+            filas = cur.fetchall()
+        if not filas:
+            return None, []
+        cabecera = {"id_usuario": filas[0]["id_usuario"], "referencia": filas[0]["referencia"]}
+        lineas = [
+            {c: f[c] for c in ("id_mov", "id_producto", "cantidad", "tipo_movimiento")}
+            for f in filas
+            if f["id_mov"] is not None
+        ]
+        return cabecera, lineas
 
     @staticmethod
     def existe_transaccion(codigo_mov: str) -> bool:
         """
         Verifica si existe una transacción con ese código.
         Esto garantiza que no se creen movimientos huérfanos.
+        Los códigos existentes quedan en la caché de catálogo.
         """
-        sql = """
-            SELECT 1
-            FROM transacciones
-            WHERE codigo_mov = %s
-            LIMIT 1;
-        """
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(sql, (codigo_mov,))
-                return cur.fetchone() is not None
+        return catalogo.existe_transaccion(codigo_mov)
 
     @staticmethod
     def ultimos_movimientos(limit: int = 20):
         """
         Devuelve los últimos movimientos de inventario ya unidos a productos.
+        Primero busca solo en el mes actual y el anterior (con mov_inventario
+        particionada por meses el planificador descarta el resto de
+        particiones) y solo si no hay bastantes recorre todo el histórico.
         """
         sql = """
             SELECT m.codigo_mov,
@@ -92,11 +329,114 @@ class InventarioRepository:
                    m.tipo_movimiento
             FROM mov_inventario m
             LEFT JOIN productos p ON p.id_producto = m.id_producto
+            WHERE m.fecha >= %s
             ORDER BY m.fecha DESC
             LIMIT %s;
         """
+        hoy = date.today()
+        inicio_mes_anterior = (hoy.replace(day=1) - timedelta(days=1)).replace(day=1)
         with get_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute(sql, (limit,))
+                cur.execute(sql, (inicio_mes_anterior, limit))
                 rows = cur.fetchall()
+                if len(rows) < limit:
+                    cur.execute(sql, ("-infinity", limit))
+                    rows = cur.fetchall()
         return rows
+
+    @staticmethod
+    def stock_a_fecha(fecha, productos=None, conn=None):
+        """
+        Stock de cada producto en `fecha` a partir de la foto de
+        stock_snapshots más cercana (migración 009) más o menos los
+        movimientos entre la foto y `fecha`, así que solo se leen los
+        movimientos (y las particiones) de ese intervalo y no toda la tabla.
+        El stock actual cuenta como una foto de ahora mismo.
+
+        fecha: datetime (stock justo en ese instante) o date (stock al
+               cierre de ese día).
+        productos: ids a consultar o None para todos.
+
+        Devuelve un dict por producto con {"id_producto", "nombre_producto",
+        "marca", "stock_actual", "stock", "referencia"}; referencia es el
+        instante de la foto usada.
+        """
+        if isinstance(fecha, date) and not isinstance(fecha, datetime):
+            fecha = datetime.combine(fecha + timedelta(days=1), datetime.min.time())
+        ids = None if productos is None else [int(p) for p in productos]
+        if ids is not None and not ids:
+            return []
+
+        propia = conn is None
+        if propia:
+            conn = get_connection()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(
+                    """
+                    SELECT (SELECT MAX(tomado_en) FROM stock_snapshots WHERE tomado_en <= %(fecha)s) AS anterior,
+                           (SELECT MIN(tomado_en) FROM stock_snapshots WHERE tomado_en > %(fecha)s) AS posterior,
+                           LOCALTIMESTAMP::timestamp AS ahora
+                    """,
+                    {"fecha": fecha},
+                )
+                fotos = cur.fetchone()
+                ahora = fotos["ahora"]
+
+                # La foto más cercana; el stock actual es la foto de `ahora`
+                candidatas = [f for f in (fotos["anterior"], fotos["posterior"]) if f is not None]
+                referencia = min(candidatas + [ahora], key=lambda f: abs(f - min(fecha, ahora)))
+                desde, hasta = sorted((referencia, min(fecha, ahora)))
+                signo = 1 if referencia <= fecha else -1
+
+                # Los productos que no salen en la foto (dados de alta
+                # después) se reconstruyen desde el stock actual
+                cur.execute(
+                    f"""
+                    WITH producto AS (
+                        SELECT p.id_producto, p.nombre_producto, p.marca,
+                               COALESCE(p.stock_actual, 0) AS stock_actual,
+                               {"s.stock" if referencia != ahora else "COALESCE(p.stock_actual, 0)"} AS stock_base
+                        FROM productos p
+                        {"LEFT JOIN stock_snapshots s ON s.tomado_en = %(referencia)s AND s.id_producto = p.id_producto"
+                         if referencia != ahora else ""}
+                        WHERE %(todos)s OR p.id_producto = ANY(%(ids)s)
+                    ),
+                    delta AS (
+                        SELECT m.id_producto,
+                               SUM(CASE WHEN m.tipo_movimiento = 'venta' THEN -m.cantidad ELSE m.cantidad END) AS delta
+                        FROM mov_inventario m
+                        WHERE m.fecha >= %(desde)s
+                          AND m.fecha < %(hasta)s
+                          AND (%(todos)s OR m.id_producto = ANY(%(ids)s))
+                        GROUP BY m.id_producto
+                    ),
+                    delta_sin_foto AS (
+                        SELECT m.id_producto,
+                               SUM(CASE WHEN m.tipo_movimiento = 'venta' THEN -m.cantidad ELSE m.cantidad END) AS delta
+                        FROM mov_inventario m
+                        WHERE m.fecha >= %(fecha)s
+                          AND m.id_producto IN (SELECT id_producto FROM producto WHERE stock_base IS NULL)
+                        GROUP BY m.id_producto
+                    )
+                    SELECT p.id_producto, p.nombre_producto, p.marca, p.stock_actual,
+                           CASE
+                               WHEN p.stock_base IS NOT NULL THEN p.stock_base + %(signo)s * COALESCE(d.delta, 0)
+                               ELSE p.stock_actual - COALESCE(f.delta, 0)
+                           END AS stock,
+                           CASE WHEN p.stock_base IS NOT NULL THEN %(referencia)s ELSE %(ahora)s END AS referencia
+                    FROM producto p
+                    LEFT JOIN delta d ON d.id_producto = p.id_producto
+                    LEFT JOIN delta_sin_foto f ON f.id_producto = p.id_producto
+                    ORDER BY p.id_producto;
+                    """,
+                    {
+                        "fecha": fecha, "referencia": referencia, "ahora": ahora,
+                        "desde": desde, "hasta": hasta, "signo": signo,
+                        "todos": ids is None, "ids": ids or [],
+                    },
+                )
+                return [dict(f) for f in cur.fetchall()]
+        finally:
+            if propia:
+                conn.close()
@@ -0,0 +1,169 @@
+# repositories/prevision_repository.py
+import csv
+import io
+import logging
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from database.connection import get_connection
+from utils.cache import invalidar, no_cachear
+
+logger = logging.getLogger(__name__)
+
+# Columnas de prevision_demanda en el orden en que se copian
+COLUMNAS_PREVISION = (
+    "id_producto", "alpha", "gamma", "nivel", "estacionalidad", "error_medio", "ajustado_en",
+    "estado_hasta", "stock_actual", "demanda_7d", "demanda_30d", "fecha_rotura", "calculado_en",
+)
+
+
+class PrevisionRepository:
+    """
+    Lecturas y escrituras de la previsión de demanda:
+      - ventas_diarias: serie diaria de unidades vendidas por producto
+      - ventas_producto_totales.actualizado_en: última venta de cada producto
+      - prevision_demanda: parámetros, estado y previsión
+        (database/migrations/012_prevision_demanda.sql)
+    """
+
+    @staticmethod
+    def productos(reajuste_dias: int = 28):
+        """
+        Productos activos con su stock y la previsión anterior, si la hay.
+        reajustar es True si no hay previsión, si el ajuste tiene más de
+        `reajuste_dias` días o si alguna venta del producto se registró a
+        partir de estado_hasta: el estado solo cubre los días anteriores, así
+        que una venta del mismo día de la previsión (aunque fuera antes de
+        calcularla) o con fecha_mov atrasada obliga a reajustar en lugar de
+        avanzar esos días como si no hubiera ventas. Los productos con ventas
+        hoy se reajustan en cada cálculo del día.
+
+        Devuelve tuplas (id_producto, stock_actual, reajustar, alpha, gamma,
+        nivel, estacionalidad, error_medio, ajustado_en, estado_hasta)
+        ordenadas por id_producto.
+        """
+        sql = """
+            SELECT p.id_producto,
+                   COALESCE(p.stock_actual, 0)::float8,
+                   f.id_producto IS NULL
+                       OR t.actualizado_en >= f.estado_hasta
+                       OR f.ajustado_en < LOCALTIMESTAMP - make_interval(days => %s) AS reajustar,
+                   f.alpha, f.gamma, f.nivel, f.estacionalidad, f.error_medio,
+                   f.ajustado_en, f.estado_hasta
+            FROM productos p
+            LEFT JOIN prevision_demanda f ON f.id_producto = p.id_producto
+            LEFT JOIN ventas_producto_totales t ON t.id_producto = p.id_producto
+            WHERE p.estado = 'activo'
+            ORDER BY p.id_producto
+        """
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, (reajuste_dias,))
+                return cur.fetchall()
+
+    @staticmethod
+    def series_ventas(ids, desde, hasta):
+        """
+        Matriz (len(ids), días) con las unidades vendidas de cada producto y
+        día de [desde, hasta), 0 los días sin ventas. Las filas se leen con
+        COPY y se cargan con el lector CSV de pandas, sin pasar por una
+        tupla de Python por fila.
+        """
+        dias = (hasta - desde).days
+        matriz = np.zeros((len(ids), dias), dtype=np.float64)
+        if not len(ids) or dias <= 0:
+            return matriz
+
+        buffer = io.StringIO()
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                consulta = cur.mogrify(
+                    """
+                    SELECT id_producto, dia - %s::date, unidades::float8
+                    FROM ventas_diarias
+                    WHERE dia >= %s
+                      AND dia < %s
+                      AND id_producto = ANY(%s)
+                    """,
+                    (desde, desde, hasta, list(map(int, ids))),
+                ).decode()
+                cur.copy_expert(f"COPY ({consulta}) TO STDOUT WITH (FORMAT csv)", buffer)
+        buffer.seek(0)
+
+        filas = pd.read_csv(buffer, header=None, names=["id_producto", "dia", "unidades"])
+        if not filas.empty:
+            ids = np.asarray(ids)
+            orden = np.argsort(ids)
+            posicion = orden[np.searchsorted(ids, filas["id_producto"].to_numpy(), sorter=orden)]
+            np.add.at(matriz, (posicion, filas["dia"].to_numpy()), filas["unidades"].to_numpy())
+        return matriz
+
+    @staticmethod
+    def guardar(columnas):
+        """
+        Sustituye el contenido de prevision_demanda por `columnas` (dict
+        columna -> secuencia, ver COLUMNAS_PREVISION; NaN/None se guardan
+        como NULL) con un COPY en una sola transacción.
+        Devuelve el número de filas guardadas.
+        """
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        for fila in zip(*(columnas[c] for c in COLUMNAS_PREVISION)):
+            escritor.writerow([
+                "{" + ",".join(repr(float(x)) for x in v) + "}" if isinstance(v, np.ndarray)
+                else "" if v is None or v != v
+                else v
+                for v in fila
+            ])
+        buffer.seek(0)
+
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM prevision_demanda")
+                cur.copy_expert(
+                    f"COPY prevision_demanda ({', '.join(COLUMNAS_PREVISION)}) FROM STDIN WITH (FORMAT csv)",
+                    buffer,
+                )
+                filas = cur.rowcount
+        invalidar("prevision")
+        return filas
+
+    @staticmethod
+    def proximas_roturas(limite: int = 20, statement_timeout_ms: Optional[int] = None) -> pd.DataFrame:
+        """
+        Productos con rotura de stock prevista, la más próxima primero.
+        statement_timeout_ms: ver get_connection.
+        """
+        query = """
+            SELECT
+                f.id_producto,
+                p.nombre_producto,
+                p.marca,
+                f.stock_actual,
+                f.demanda_7d,
+                f.demanda_30d,
+                f.fecha_rotura,
+                f.calculado_en
+            FROM prevision_demanda f
+            JOIN productos p ON p.id_producto = f.id_producto
+            WHERE f.fecha_rotura IS NOT NULL
+            ORDER BY f.fecha_rotura, f.id_producto
+            LIMIT %s
+        """
+        columnas = [
+            "id_producto", "nombre_producto", "marca", "stock_actual",
+            "demanda_7d", "demanda_30d", "fecha_rotura", "calculado_en",
+        ]
+        try:
+            with get_connection(statement_timeout_ms) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query, (limite,))
+                    df = pd.DataFrame(cur.fetchall(), columns=columnas)
+            df["stock_actual"] = df["stock_actual"].astype(float)
+            return df
+        except Exception:
+            logger.exception("[PrevisionRepository][proximas_roturas] Error")
+            no_cachear()
+            return pd.DataFrame(columns=columnas)
@@ -1,66 +1,209 @@
 # repositories/producto_repository.py
 from database.connection import get_connection
 from models.producto import Producto
+from utils.cache import invalidar
+from utils.paginacion import codificar_cursor, condicion_keyset, decodificar_cursor
+
+
+# Columnas por las que se puede filtrar y ordenar (se interpolan en el SQL)
+CAMPOS_FILTRO = ("nombre_producto", "marca", "categoria")
+CAMPOS_ORDEN = ("id_producto", "nombre_producto", "categoria", "marca", "precio_unitario", "stock_actual")
+
+COLUMNAS = """
+    id_producto, nombre_producto, categoria, marca,
+    stock_actual, stock_minimo, precio_unitario, estado, fecha_creacion
+"""
 
 
 class ProductoRepository:
 
+    @staticmethod
+    def _filtro(filtro_campo, filtro_valor):
+        """Condición WHERE (solo activos + búsqueda opcional) y sus parámetros."""
+        where = "WHERE estado = 'activo'"
+        params = []
+        if filtro_campo in CAMPOS_FILTRO and filtro_valor:
+            where += f" AND {filtro_campo} ILIKE %s"
+            params.append(f"%{filtro_valor}%")
+        return where, params
+
+    @staticmethod
+    def _orden(orden_field, asc):
+        if orden_field not in CAMPOS_ORDEN:
+            orden_field = "id_producto"
+        order_dir = "ASC" if asc else "DESC"
+        # id_producto como desempate para que la paginación sea estable; los
+        # NULL al final, como en obtener_keyset
+        return f" ORDER BY {orden_field} {order_dir} NULLS LAST, id_producto {order_dir}"
+
     def obtener(self, offset, limit, filtro_campo=None, filtro_valor=None, orden_field="id_producto", asc=True):
+        productos, _ = self.obtener_pagina(offset, limit, filtro_campo, filtro_valor, orden_field, asc)
+        return productos
+
+    def obtener_pagina(self, offset, limit, filtro_campo=None, filtro_valor=None, orden_field="id_producto", asc=True):
+        """
+        Una página de productos activos ya filtrada y ordenada en SQL, junto
+        con el total de coincidencias (COUNT(*) OVER() en la misma consulta).
+        Devuelve (productos, total).
+        """
         try:
-            conn = get_connection()
-            if not conn:
-                return []
+            with get_connection() as conn:
+                where, params = self._filtro(filtro_campo, filtro_valor)
+                query = f"SELECT {COLUMNAS}, COUNT(*) OVER() AS total FROM productos {where}"
+                query += self._orden(orden_field, asc)
+                query += " LIMIT %s OFFSET %s"
+
+                with conn.cursor() as cur:
+                    cur.execute(query, params + [limit, offset])
+                    rows = cur.fetchall()
+
+                    if rows:
+                        total = rows[0][-1]
+                    elif offset > 0:
+                        # Página fuera de rango: el total hay que pedirlo aparte
+                        cur.execute(f"SELECT COUNT(*) FROM productos {where}", params)
+                        total = cur.fetchone()[0]
+                    else:
+                        total = 0
+
+                productos = [Producto(*row[:-1]) for row in rows]
+            return productos, total
 
-            order_dir = "ASC" if asc else "DESC"
-
-            query = """
-                SELECT id_producto, nombre_producto, categoria, marca,
-                       stock_actual, stock_minimo, precio_unitario, estado, fecha_creacion
-                FROM productos
-                WHERE estado = 'activo'
-            """
-
-            params = []
+        except Exception as e:
+            print(f"[ProductoRepository.obtener_pagina] Error: {e}")
+            return [], 0
+
+    def obtener_keyset(self, limit, cursor=None, hacia_atras=False, filtro_campo=None,
+                       filtro_valor=None, orden_field="id_producto", asc=True):
+        """
+        Paginación por clave: devuelve la página posterior (o anterior, con
+        hacia_atras=True) al `cursor`, sin OFFSET. El total de coincidencias
+        viaja en la misma consulta.
+        Devuelve (productos, total, cursor_anterior, cursor_siguiente); un
+        cursor None indica que no hay más páginas en ese sentido.
+        """
+        if orden_field not in CAMPOS_ORDEN:
+            orden_field = "id_producto"
+
+        clave = decodificar_cursor(cursor, orden_field, asc)
+        if clave is None:
+            hacia_atras = False
 
-            if filtro_campo and filtro_valor:
-                query += f" AND {filtro_campo} ILIKE %s"
-                params.append(f"%{filtro_valor}%")
+        try:
+            with get_connection() as conn:
+                where, params = self._filtro(filtro_campo, filtro_valor)
+                condicion, valores, orden = condicion_keyset(orden_field, "id_producto", asc, hacia_atras, clave)
+
+                filas_where = where
+                filas_params = list(params)
+                if condicion is not None:
+                    filas_where += f" AND {condicion}"
+                    filas_params.extend(valores)
+
+                query = f"""
+                    SELECT f.*, c.total
+                    FROM (SELECT COUNT(*) AS total FROM productos {where}) c
+                    LEFT JOIN LATERAL (
+                        SELECT {COLUMNAS}
+                        FROM productos
+                        {filas_where}
+                        {orden}
+                        LIMIT %s
+                    ) f ON TRUE
+                    {orden}
+                """
+
+                with conn.cursor() as cur:
+                    cur.execute(query, params + filas_params + [limit + 1])
+                    rows = cur.fetchall()
 
-            query += f" ORDER BY {orden_field} {order_dir}"
-            query += " LIMIT %s OFFSET %s"
-            params.extend([limit, offset])
+        except Exception as e:
+            print(f"[ProductoRepository.obtener_keyset] Error: {e}")
+            return [], 0, None, None
+
+        total = rows[0][-1] if rows else 0
+        rows = [row[:-1] for row in rows if row[0] is not None]
+
+        if hacia_atras and not rows:
+            # Lo anterior ya no existe (borrados): volvemos al principio
+            return self.obtener_keyset(limit, None, False, filtro_campo, filtro_valor, orden_field, asc)
+
+        hay_mas = len(rows) > limit
+        rows = rows[:limit]
+        if hacia_atras:
+            rows.reverse()
+
+        productos = [Producto(*row) for row in rows]
+
+        def cursor_de(producto):
+            return codificar_cursor(orden_field, asc, getattr(producto, orden_field), producto.id_producto)
+
+        if not productos:
+            return productos, total, None, None
+        if hacia_atras:
+            anterior = cursor_de(productos[0]) if hay_mas else None
+            siguiente = cursor_de(productos[-1])
+        else:
+            anterior = cursor_de(productos[0]) if clave is not None else None
+            siguiente = cursor_de(productos[-1]) if hay_mas else None
+        return productos, total, anterior, siguiente
+
+    def buscar(self, texto, limite=20, campos=None, umbral=0.3):
+        """
+        Búsqueda aproximada (pg_trgm) en nombre, marca y/o categoría de los
+        productos activos, sin distinguir tildes ni mayúsculas y tolerando
+        erratas. Usa los índices GIN de database/migrations/003_busqueda_trigram.sql.
+        Devuelve [(Producto, relevancia)] de mayor a menor relevancia (0..1).
+        """
+        texto = (texto or "").strip()
+        if not texto:
+            return []
 
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                rows = cur.fetchall()
+        campos = [c for c in (campos or CAMPOS_FILTRO) if c in CAMPOS_FILTRO] or list(CAMPOS_FILTRO)
+        consulta = "lower(f_unaccent(%(q)s))"
+        columnas = [f"lower(f_unaccent({c}))" for c in campos]
+        coincide = " OR ".join(f"{col} %%> {consulta}" for col in columnas)
+        relevancia = "GREATEST(" + ", ".join(f"word_similarity({consulta}, {col})" for col in columnas) + ")"
+
+        query = f"""
+            SELECT {COLUMNAS}, {relevancia} AS relevancia
+            FROM productos
+            WHERE estado = 'activo'
+              AND ({coincide})
+            ORDER BY relevancia DESC, id_producto
+            LIMIT %(limite)s
+        """
 
-            productos = [Producto(*row) for row in rows]
-            conn.close()
-            return productos
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    # Umbral del operador %> (solo para esta transacción)
+                    cur.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", (str(umbral),))
+                    cur.execute(query, {"q": texto, "limite": limite})
+                    rows = cur.fetchall()
+            return [(Producto(*row[:-1]), float(row[-1])) for row in rows]
 
         except Exception as e:
-            print(f"[ProductoRepository.obtener] Error: {e}")
+            print(f"[ProductoRepository.buscar] Error: {e}")
             return []
 
     def insertar(self, nombre, categoria, marca, precio_unitario):
         try:
-            conn = get_connection()
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO productos (
-                        nombre_producto, categoria, marca,
-                        stock_actual, precio_unitario, estado
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        INSERT INTO productos (
+                            nombre_producto, categoria, marca,
+                            stock_actual, precio_unitario, estado
+                        )
+                        VALUES (%s, %s, %s, 0, %s, 'activo')
+                        RETURNING id_producto
+                        """,
+                        (nombre, categoria, marca, precio_unitario),
                     )
-                    VALUES (%s, %s, %s, 0, %s, 'activo')
-                    RETURNING id_producto
-                    """,
-                    (nombre, categoria, marca, precio_unitario),
-                )
-                nuevo_id = cur.fetchone()[0]
-
-            conn.commit()
-            conn.close()
+                    nuevo_id = cur.fetchone()[0]
+            invalidar("productos")
             return nuevo_id
 
         except Exception as e:
@@ -69,23 +212,21 @@ class ProductoRepository:
 
     def actualizar(self, id_producto, nombre, categoria, marca, precio_unitario, estado):
         try:
-            conn = get_connection()
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    UPDATE productos
-                    SET nombre_producto = %s,
-                        categoria = %s,
-                        marca = %s,
-                        precio_unitario = %s,
-                        estado = %s
-                    WHERE id_producto = %s
-                    """,
-                    (nombre, categoria, marca, precio_unitario, estado, id_producto),
-                )
-
-            conn.commit()
-            conn.close()
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        UPDATE productos
+                        SET nombre_producto = %s,
+                            categoria = %s,
+                            marca = %s,
+                            precio_unitario = %s,
+                            estado = %s
+                        WHERE id_producto = %s
+                        """,
+                        (nombre, categoria, marca, precio_unitario, estado, id_producto),
+                    )
+            invalidar("productos")
             return True
 
         except Exception as e:
@@ -94,19 +235,17 @@ class ProductoRepository:
 
     def eliminar(self, id_producto):
         try:
-            conn = get_connection()
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    UPDATE productos
-                    SET estado = 'inactivo'
-                    WHERE id_producto = %s
-                    """,
-                    (id_producto,),
-                )
-
-            conn.commit()
-            conn.close()
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        UPDATE productos
+                        SET estado = 'inactivo'
+                        WHERE id_producto = %s
+                        """,
+                        (id_producto,),
+                    )
+            invalidar("productos")
             return True
 
         except Exception as e:
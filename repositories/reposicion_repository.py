@@ -0,0 +1,145 @@
+# repositories/reposicion_repository.py
+import csv
+import io
+import logging
+from typing import Optional
+
+import pandas as pd
+
+from database.connection import get_connection
+from utils.cache import invalidar, no_cachear
+
+logger = logging.getLogger(__name__)
+
+# Columnas de reposicion_sugerida en el orden en que se copian
+COLUMNAS_REPOSICION = (
+    "id_producto", "calculado_en", "ventana_dias", "demanda_media", "desviacion",
+    "nivel_servicio", "stock_actual", "dias_cobertura", "stock_seguridad",
+    "punto_pedido", "cantidad_sugerida",
+)
+
+
+class ReposicionRepository:
+    """
+    Lecturas y escrituras del cálculo de reposición:
+      - ventas_diarias: demanda diaria por producto
+      - stock_seguridad_categoria (categoria, stock_seguridad, fecha): nivel
+        de servicio de cada categoría (vale el de fecha más reciente)
+      - reposicion_sugerida: resultado (database/migrations/011_reposicion_sugerida.sql)
+    """
+
+    @staticmethod
+    def demanda_productos(desde, hasta):
+        """
+        Una fila por producto activo con lo necesario para el cálculo, en una
+        sola consulta. La demanda de [desde, hasta) se resume en la propia
+        consulta (suma y suma de cuadrados de las unidades diarias), así que
+        se transfieren tantas filas como productos y no productos × días.
+
+        Devuelve tuplas (id_producto, stock_actual, stock_minimo,
+        nivel_servicio, dias, suma, suma_cuadrados) ordenadas por id_producto;
+        nivel_servicio es None si la categoría no tiene valor y dias son los
+        días de la ventana en que el producto ya existía (como mínimo 1).
+        """
+        sql = """
+            WITH nivel AS (
+                SELECT DISTINCT ON (categoria) categoria, stock_seguridad
+                FROM stock_seguridad_categoria
+                WHERE stock_seguridad IS NOT NULL
+                ORDER BY categoria, fecha DESC NULLS LAST
+            ),
+            demanda AS (
+                SELECT id_producto,
+                       SUM(unidades) AS suma,
+                       SUM(unidades * unidades) AS suma_cuadrados
+                FROM ventas_diarias
+                WHERE dia >= %(desde)s
+                  AND dia < %(hasta)s
+                GROUP BY id_producto
+            )
+            SELECT p.id_producto,
+                   COALESCE(p.stock_actual, 0)::float8,
+                   COALESCE(p.stock_minimo, 0)::float8,
+                   n.stock_seguridad::float8,
+                   GREATEST(1, LEAST(
+                       %(hasta)s::date - %(desde)s::date,
+                       %(hasta)s::date - COALESCE(p.fecha_creacion::date, %(desde)s::date)
+                   )),
+                   COALESCE(d.suma, 0)::float8,
+                   COALESCE(d.suma_cuadrados, 0)::float8
+            FROM productos p
+            LEFT JOIN demanda d ON d.id_producto = p.id_producto
+            LEFT JOIN nivel n ON n.categoria = p.categoria
+            WHERE p.estado = 'activo'
+            ORDER BY p.id_producto
+        """
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, {"desde": desde, "hasta": hasta})
+                return cur.fetchall()
+
+    @staticmethod
+    def guardar(columnas):
+        """
+        Sustituye el contenido de reposicion_sugerida por `columnas`
+        (dict columna -> secuencia, ver COLUMNAS_REPOSICION; NaN se guarda
+        como NULL) con un COPY en una sola transacción: mientras tanto el
+        dashboard sigue leyendo el cálculo anterior.
+        Devuelve el número de filas guardadas.
+        """
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        for fila in zip(*(columnas[c] for c in COLUMNAS_REPOSICION)):
+            escritor.writerow(["" if v != v else v for v in fila])
+        buffer.seek(0)
+
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM reposicion_sugerida")
+                cur.copy_expert(
+                    f"COPY reposicion_sugerida ({', '.join(COLUMNAS_REPOSICION)}) FROM STDIN WITH (FORMAT csv)",
+                    buffer,
+                )
+                filas = cur.rowcount
+        invalidar("reposicion")
+        return filas
+
+    @staticmethod
+    def sugerencias(limite: int = 20, statement_timeout_ms: Optional[int] = None) -> pd.DataFrame:
+        """
+        Productos a pedir según el último cálculo, los de menos días de
+        cobertura primero. statement_timeout_ms: ver get_connection.
+        """
+        query = """
+            SELECT
+                r.id_producto,
+                p.nombre_producto,
+                p.marca,
+                r.stock_actual,
+                r.demanda_media,
+                r.dias_cobertura,
+                r.punto_pedido,
+                r.cantidad_sugerida,
+                r.calculado_en
+            FROM reposicion_sugerida r
+            JOIN productos p ON p.id_producto = r.id_producto
+            WHERE r.cantidad_sugerida > 0
+            ORDER BY r.dias_cobertura NULLS LAST, r.id_producto
+            LIMIT %s
+        """
+        columnas = [
+            "id_producto", "nombre_producto", "marca", "stock_actual", "demanda_media",
+            "dias_cobertura", "punto_pedido", "cantidad_sugerida", "calculado_en",
+        ]
+        try:
+            with get_connection(statement_timeout_ms) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query, (limite,))
+                    df = pd.DataFrame(cur.fetchall(), columns=columnas)
+            for columna in ("stock_actual", "demanda_media", "dias_cobertura", "punto_pedido", "cantidad_sugerida"):
+                df[columna] = df[columna].astype(float)
+            return df
+        except Exception:
+            logger.exception("[ReposicionRepository][sugerencias] Error")
+            no_cachear()
+            return pd.DataFrame(columns=columnas)
@@ -0,0 +1,81 @@
+# repositories/usuario_cache.py
+"""
+Resolución chat id de Telegram -> usuario con caché en memoria, para que
+cada mensaje del bot no cueste una consulta.
+
+Se cachean los chats vinculados (TTL corto, `ttl_positivo`) y los chats
+sin usuario (`ttl_negativo`, para que un chat desconocido que insiste no
+genere una consulta por mensaje). Todas las entradas llevan la etiqueta
+"usuarios": UsuarioRepository.insertar/actualizar/vincular_telegram
+invalidan "usuarios" tras el commit, así un cambio hecho en este proceso se
+ve en la siguiente consulta; lo leído antes de una invalidación no se
+guarda. Un cambio hecho desde otro proceso (la app Streamlit, n8n) no llega
+aquí y se ve al caducar la entrada: como mucho `ttl_positivo` segundos
+sigue resolviéndose el usuario anterior.
+
+Esto solo vale para GET /usuarios/telegram. Las facturas no se autorizan
+con esta caché: validar_factura resuelve el chat en su propia consulta.
+"""
+import threading
+
+from repositories.usuario_repository import UsuarioRepository
+from utils.cache import CacheTTL, al_invalidar
+
+_SIN_USUARIO = {"id_usuario": None}
+
+
+class ResolvedorTelegram:
+
+    def __init__(self, repo=None, max_entradas=50000, ttl_positivo=5.0, ttl_negativo=30.0):
+        self.repo = repo or UsuarioRepository()
+        self.ttl_positivo = ttl_positivo
+        self.ttl_negativo = ttl_negativo
+        self.cache = CacheTTL("usuarios_telegram", max_entradas=max_entradas, ttl=ttl_positivo)
+        self.version = 0
+        self._lock = threading.Lock()
+        al_invalidar(self._al_invalidar)
+
+    def _al_invalidar(self, etiquetas):
+        # invalidar() sin etiquetas lo invalida todo, también esta caché
+        if not etiquetas or any(
+            e == "usuarios" or e.startswith(("usuario:", "telegram:")) for e in etiquetas
+        ):
+            with self._lock:
+                self.version += 1
+
+    def _guardar(self, id_telegram, usuario, version):
+        with self._lock:
+            if version != self.version:
+                return
+            etiquetas = ["usuarios", f"telegram:{id_telegram}"]
+            if usuario is None:
+                usuario, ttl = _SIN_USUARIO, self.ttl_negativo
+            else:
+                etiquetas.append(f"usuario:{usuario['id_usuario']}")
+                ttl = self.ttl_positivo
+            self.cache.guardar(id_telegram, usuario, ttl=ttl, etiquetas=etiquetas)
+
+    def usuario(self, id_telegram):
+        """{"id_usuario", "nombre_usuario", "email", "rol"} del chat id, o None."""
+        if id_telegram is None:
+            return None
+        id_telegram = int(id_telegram)
+        cacheado = self.cache.obtener(id_telegram)
+        if cacheado is not None:
+            return cacheado if cacheado["id_usuario"] is not None else None
+
+        version = self.version
+        usuario = self.repo.obtener_por_telegram(id_telegram)
+        self._guardar(id_telegram, usuario, version)
+        return usuario
+
+    def id_usuario(self, id_telegram):
+        usuario = self.usuario(id_telegram)
+        return usuario["id_usuario"] if usuario else None
+
+    def estadisticas(self):
+        return {"version": self.version, **self.cache.estadisticas()}
+
+
+# Instancia compartida por todo el proceso
+resolvedor_telegram = ResolvedorTelegram()
@@ -2,23 +2,30 @@
 
 from database.connection import get_connection
 from models.usuario import Usuario
+from utils.cache import invalidar
+from utils.paginacion import codificar_cursor, condicion_keyset, decodificar_cursor
+
+CAMPOS_FILTRO = ["nombre_usuario", "email", "rol", "telefono"]
+CAMPOS_ORDEN = ["id_usuario", "nombre_usuario", "email", "rol", "fecha_registro"]
+COLUMNAS = [
+    "id_usuario", "nombre_usuario", "email", "rol",
+    "id_telegram", "telefono", "password", "fecha_registro",
+]
 
 
 class UsuarioRepository:
 
     #Login: obtener usuario por email
     def obtener_por_email(self, email):
-        conn = get_connection()
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT id_usuario, nombre_usuario, email, password, rol
-                FROM usuarios
-                WHERE email = %s
-                LIMIT 1;
-            """, (email,))
-            row = cur.fetchone()
-
-        conn.close()
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT id_usuario, nombre_usuario, email, password, rol
+                    FROM usuarios
+                    WHERE email = %s
+                    LIMIT 1;
+                """, (email,))
+                row = cur.fetchone()
 
         if row:
             return {
@@ -30,45 +37,155 @@ class UsuarioRepository:
             }
         return None
 
+    #Bot de Telegram: obtener usuario por chat id
+    def obtener_por_telegram(self, id_telegram):
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT id_usuario, nombre_usuario, email, rol
+                    FROM usuarios
+                    WHERE id_telegram = %s
+                    ORDER BY id_usuario
+                    LIMIT 1;
+                """, (id_telegram,))
+                row = cur.fetchone()
+
+        if row:
+            return {
+                "id_usuario": row[0],
+                "nombre_usuario": row[1],
+                "email": row[2],
+                "rol": row[3],
+            }
+        return None
+
+    #Bot de Telegram: vincular el chat id al usuario con ese email
+    def vincular_telegram(self, email, id_telegram):
+        conn = get_connection()
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE usuarios
+                    SET id_telegram = %s
+                    WHERE email = %s
+                    RETURNING id_usuario;
+                """, (id_telegram, email))
+                row = cur.fetchone()
+        except Exception:
+            conn.rollback()
+            return None
+
+        if row:
+            invalidar("usuarios", f"usuario:{row[0]}", f"telegram:{id_telegram}")
+            return row[0]
+        return None
+
     #Lista de usuarios
     def obtener(self, offset, limit, filtro_campo, filtro_valor, orden):
-        if filtro_campo not in ["nombre_usuario", "email", "rol", "telefono"]:
+        if filtro_campo not in CAMPOS_FILTRO:
             filtro_campo = "nombre_usuario"
 
-        conn = get_connection()
-        with conn.cursor() as cur:
-
-            query = """
-                SELECT id_usuario, nombre_usuario, email, rol,
-                       id_telegram, telefono, password, fecha_registro
-                FROM usuarios
-            """
+        with get_connection() as conn:
+            with conn.cursor() as cur:
 
-            params = []
+                query = """
+                    SELECT id_usuario, nombre_usuario, email, rol,
+                           id_telegram, telefono, password, fecha_registro
+                    FROM usuarios
+                """
 
-            if filtro_valor:
-                query += f" WHERE {filtro_campo} ILIKE %s"
-                params.append(f"%{filtro_valor}%")
+                params = []
 
-            query += f" ORDER BY {filtro_campo} {orden}"
-            query += " LIMIT %s OFFSET %s"
-            params.extend([limit, offset])
+                if filtro_valor:
+                    query += f" WHERE {filtro_campo} ILIKE %s"
+                    params.append(f"%{filtro_valor}%")
 
-            cur.execute(query, params)
-            rows = cur.fetchall()
+                query += f" ORDER BY {filtro_campo} {orden}"
+                query += " LIMIT %s OFFSET %s"
+                params.extend([limit, offset])
 
-        conn.close()
+                cur.execute(query, params)
+                rows = cur.fetchall()
         return [Usuario(*row) for row in rows]
 
+    #Lista de usuarios paginada por clave (sin OFFSET)
+    def obtener_keyset(self, limit, cursor=None, hacia_atras=False, filtro_campo=None,
+                       filtro_valor=None, orden_field="nombre_usuario", asc=True):
+        """
+        Igual que ProductoRepository.obtener_keyset.
+        Devuelve (usuarios, total, cursor_anterior, cursor_siguiente).
+        """
+        if orden_field not in CAMPOS_ORDEN:
+            orden_field = "nombre_usuario"
+
+        clave = decodificar_cursor(cursor, orden_field, asc)
+        if clave is None:
+            hacia_atras = False
+
+        where = ""
+        params = []
+        if filtro_campo in CAMPOS_FILTRO and filtro_valor:
+            where = f"WHERE {filtro_campo} ILIKE %s"
+            params.append(f"%{filtro_valor}%")
+
+        condicion, valores, orden = condicion_keyset(orden_field, "id_usuario", asc, hacia_atras, clave)
+        filas_where = where
+        filas_params = list(params)
+        if condicion is not None:
+            filas_where += (" AND " if where else "WHERE ") + condicion
+            filas_params.extend(valores)
+
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT f.*, c.total
+                    FROM (SELECT COUNT(*) AS total FROM usuarios {where}) c
+                    LEFT JOIN LATERAL (
+                        SELECT {", ".join(COLUMNAS)}
+                        FROM usuarios
+                        {filas_where}
+                        {orden}
+                        LIMIT %s
+                    ) f ON TRUE
+                    {orden};
+                """, params + filas_params + [limit + 1])
+                rows = cur.fetchall()
+
+        total = rows[0][-1] if rows else 0
+        rows = [row[:-1] for row in rows if row[0] is not None]
+
+        if hacia_atras and not rows:
+            return self.obtener_keyset(limit, None, False, filtro_campo, filtro_valor, orden_field, asc)
+
+        hay_mas = len(rows) > limit
+        rows = rows[:limit]
+        if hacia_atras:
+            rows.reverse()
+
+        posicion = COLUMNAS.index(orden_field)
+
+        def cursor_de(row):
+            return codificar_cursor(orden_field, asc, row[posicion], row[0])
+
+        usuarios = [Usuario(*row) for row in rows]
+        if not rows:
+            return usuarios, total, None, None
+        if hacia_atras:
+            anterior = cursor_de(rows[0]) if hay_mas else None
+            siguiente = cursor_de(rows[-1])
+        else:
+            anterior = cursor_de(rows[0]) if clave is not None else None
+            siguiente = cursor_de(rows[-1]) if hay_mas else None
+        return usuarios, total, anterior, siguiente
+
     #Validar si existe email
     def existe_email(self, email):
-        conn = get_connection()
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT 1 FROM usuarios WHERE email = %s LIMIT 1;
-            """, (email,))
-            exists = cur.fetchone() is not None
-        conn.close()
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT 1 FROM usuarios WHERE email = %s LIMIT 1;
+                """, (email,))
+                exists = cur.fetchone() is not None
         return exists
 
     #Insertar nuevo usuario
@@ -92,11 +209,15 @@ class UsuarioRepository:
                     usuario.telefono,
                     usuario.password
                 ))
-                return cur.fetchone()[0]
+                id_usuario = cur.fetchone()[0]
         except Exception:
             conn.rollback()
             return None
 
+        # Por si el chat id estaba cacheado como "sin usuario"
+        invalidar("usuarios")
+        return id_usuario
+
     #Actualizar usuario existente   
     def actualizar(self, usuario: Usuario):
         conn = get_connection()
@@ -120,7 +241,13 @@ class UsuarioRepository:
                     usuario.password,
                     usuario.id
                 ))
-            return True
         except Exception:
             conn.rollback()
             return False
+
+        # Quita el chat id anterior (etiqueta del usuario) y el nuevo si estaba cacheado
+        etiquetas = ["usuarios", f"usuario:{usuario.id}"]
+        if usuario.telegram:
+            etiquetas.append(f"telegram:{usuario.telegram}")
+        invalidar(*etiquetas)
+        return True
@@ -0,0 +1,202 @@
+# services/analisis_service.py
+"""
+Análisis de fotos de facturas con caché por contenido.
+
+El nodo Analizador_datos de n8n manda cada imagen al modelo de visión,
+también cuando el usuario reenvía la misma foto tras un fallo. Aquí la
+imagen se identifica por el SHA-256 de sus bytes y el JSON ya extraído se
+guarda en una CacheTTL (acotada por entradas, memoria y TTL), así que un
+reenvío no vuelve a llamar al modelo.
+
+El SHA-256 solo reconoce la misma foto byte a byte (reenvío del mismo
+archivo de Telegram); una foto nueva de la misma factura se analiza otra vez.
+
+El analizador es cualquier callable imagen(bytes) -> dict | str:
+  - AnalizadorOpenAI: el mismo prompt que usa n8n (necesita OPENAI_API_KEY)
+  - AnalizadorStub: respuesta fija con retardo configurable, para pruebas
+Si devuelve texto, se limpia como en el nodo Limpia_datos.
+"""
+import base64
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import requests
+
+from utils.cache import CacheTTL
+
+PROMPT_FACTURA = """Extrae todos los datos de esta factura y devuélvelos en JSON ESTRICTAMENTE con el siguiente formato:
+
+{
+  "tipo_movimiento": "venta/ compra",
+  "fecha_mov": "",
+  "codigo_mov": "",
+  "metodo_registro": "",
+  "items": [
+    {
+      "id_producto": "",
+      "nombre_producto": "",
+      "marca": "",
+      "cantidad": "",
+      "precio_unitario": "",
+      "precio_total": ""
+    }
+  ]
+}
+
+REGLAS IMPORTANTES:
+- Responde SOLO con el JSON.
+- NO incluyas ningún texto adicional antes o después.
+- NO uses ```json ni ningún tipo de bloque de código.
+- Todos los valores deben ser texto simple.
+- Si algún dato no aparece en la factura, devuelve una cadena vacía "".
+- “items” debe ser una lista con todos los productos de la factura.
+- Cuando sea precios no le pongas el signo de tipo de moneda
+-El método de registro siempre es "telegram"
+- El JSON debe ser válido y parseable.
+"""
+
+
+class AnalisisError(Exception):
+    """El analizador no devolvió una factura utilizable."""
+
+
+def limpiar_respuesta(texto):
+    """Convierte la respuesta del modelo en dict (misma limpieza que el nodo Limpia_datos)."""
+    limpio = texto.replace("```json", "").replace("```", "").strip()
+    limpio = limpio.replace("\n", " ")
+    limpio = re.sub(r",(\s*[}\]])", r"\1", limpio)
+    try:
+        return json.loads(limpio)
+    except json.JSONDecodeError as e:
+        raise AnalisisError(f"JSON inválido del analizador: {e}") from e
+
+
+def hash_imagen(imagen):
+    return hashlib.sha256(imagen).hexdigest()
+
+
+class AnalizadorStub:
+    """Analizador de pruebas: devuelve siempre `respuesta` tras `retardo` segundos."""
+
+    def __init__(self, respuesta=None, retardo=0.0):
+        self.respuesta = respuesta or {"tipo_movimiento": "compra", "codigo_mov": "", "items": []}
+        self.retardo = retardo
+        self.llamadas = 0
+
+    def __call__(self, imagen):
+        self.llamadas += 1
+        if self.retardo:
+            time.sleep(self.retardo)
+        return json.loads(json.dumps(self.respuesta))
+
+
+class AnalizadorOpenAI:
+    """Analiza la imagen con la API de OpenAI (el mismo modelo y prompt que n8n)."""
+
+    URL = "https://api.openai.com/v1/chat/completions"
+
+    def __init__(self, api_key=None, modelo="gpt-4o", max_tokens=500, timeout=60):
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.modelo = modelo
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+
+    def __call__(self, imagen):
+        if not self.api_key:
+            raise AnalisisError("Falta OPENAI_API_KEY")
+        try:
+            respuesta = requests.post(
+                self.URL,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json={
+                    "model": self.modelo,
+                    "max_tokens": self.max_tokens,
+                    "messages": [{
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": PROMPT_FACTURA},
+                            {"type": "image_url", "image_url": {
+                                "url": "data:image/jpeg;base64," + base64.b64encode(imagen).decode()
+                            }},
+                        ],
+                    }],
+                },
+                timeout=self.timeout,
+            )
+            respuesta.raise_for_status()
+            return respuesta.json()["choices"][0]["message"]["content"]
+        except requests.RequestException as e:
+            # Caída, timeout o error HTTP del modelo: la factura no se puede analizar ahora
+            raise AnalisisError(f"Error llamando al modelo: {e}") from e
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise AnalisisError(f"Respuesta inesperada del modelo: {e}") from e
+
+
+class AnalisisFacturaService:
+
+    def __init__(self, analizador=None, max_entradas=5000, max_bytes=32 * 1024 * 1024, ttl=7 * 24 * 3600.0):
+        self.analizador = analizador
+        self.cache = CacheTTL("analisis_facturas", max_entradas=max_entradas, max_bytes=max_bytes, ttl=ttl)
+        self._lock = threading.Lock()
+        self.llamadas_analizador = 0
+        self.latencia_analizador_ms = 0.0
+        self.latencia_ahorrada_ms = 0.0
+
+    def consultar(self, imagen):
+        """(hash, factura o None) sin llamar al analizador."""
+        clave = hash_imagen(imagen)
+        entrada = self.cache.obtener(clave)
+        if entrada is None:
+            return clave, None
+        with self._lock:
+            self.latencia_ahorrada_ms += entrada["latencia_ms"]
+        # La factura cacheada es compartida: cada llamada recibe su propia copia
+        return clave, copy.deepcopy(entrada["factura"])
+
+    def guardar(self, clave, factura, latencia_ms=0.0):
+        """Guarda el resultado de un análisis hecho fuera (p. ej. por n8n)."""
+        if isinstance(factura, str):
+            factura = limpiar_respuesta(factura)
+        self.cache.guardar(clave, {"factura": copy.deepcopy(factura), "latencia_ms": latencia_ms})
+
+    def analizar(self, imagen):
+        """
+        Devuelve (hash, factura, desde_cache). Solo llama al analizador si
+        la imagen no está en la caché; los errores no se cachean.
+        """
+        clave, factura = self.consultar(imagen)
+        if factura is not None:
+            return clave, factura, True
+        if self.analizador is None:
+            raise AnalisisError("No hay analizador configurado")
+
+        inicio = time.perf_counter()
+        respuesta = self.analizador(imagen)
+        latencia_ms = (time.perf_counter() - inicio) * 1000
+        factura = limpiar_respuesta(respuesta) if isinstance(respuesta, str) else respuesta
+        if not isinstance(factura, dict):
+            raise AnalisisError("El analizador no devolvió un objeto JSON")
+
+        with self._lock:
+            self.llamadas_analizador += 1
+            self.latencia_analizador_ms += latencia_ms
+        self.guardar(clave, factura, latencia_ms)
+        return clave, factura, False
+
+    def estadisticas(self):
+        cache = self.cache.estadisticas()
+        with self._lock:
+            return {
+                **cache,
+                "llamadas_analizador": self.llamadas_analizador,
+                "latencia_media_analizador_ms": (
+                    round(self.latencia_analizador_ms / self.llamadas_analizador, 1)
+                    if self.llamadas_analizador else 0.0
+                ),
+                "latencia_ahorrada_ms": round(self.latencia_ahorrada_ms, 1),
+            }
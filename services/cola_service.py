@@ -0,0 +1,251 @@
+# services/cola_service.py
+"""
+Cola de ingesta de facturas con trabajadores asyncio.
+
+Las facturas se encolan en cola_facturas (POST /cola/facturas de
+api/ingesta_api.py o ColaService.encolar) y un proceso trabajador las
+registra con IngestaService, como mucho `concurrencia` a la vez, así una
+ráfaga de fotos por Telegram se absorbe en la cola en lugar de lanzar todas
+las escrituras contra Postgres al mismo tiempo.
+
+  - Errores de la factura (FacturaInvalidaError): van directos a fallidas.
+  - Otros errores (conexión, bloqueos...): se reintentan con backoff
+    exponencial con jitter hasta max_intentos y después van a fallidas.
+  - Una factura cuyo trabajador no termina en plazo se vuelve a tomar; si
+    era su último intento, va a fallidas.
+
+    python -m services.cola_service trabajar [--concurrencia 4] [--lote 8]
+    python -m services.cola_service estado
+    python -m services.cola_service fallidas
+    python -m services.cola_service reencolar-fallidas [ID ...]
+
+El pool de conexiones (PGPOOL_MAX) debe admitir al menos `concurrencia`
+conexiones más una para tomar lotes.
+"""
+import argparse
+import asyncio
+import json
+import random
+import signal
+import statistics
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from repositories.cola_repository import ColaFacturasRepository
+from services.ingesta_service import FacturaInvalidaError, IngestaService, normalizar_factura
+
+
+class ColaLlenaError(Exception):
+    """La cola supera el máximo de facturas pendientes: el cliente debe reintentar más tarde."""
+
+
+class ColaService:
+
+    def __init__(self, repo=None, ingesta=None, max_pendientes=10000):
+        self.repo = repo or ColaFacturasRepository()
+        self.ingesta = ingesta or IngestaService()
+        self.max_pendientes = max_pendientes
+
+    def encolar(self, datos, max_intentos=5):
+        """
+        Guarda la factura en la cola y devuelve su id. Lanza ColaLlenaError si
+        ya hay max_pendientes por procesar (contrapresión hacia n8n).
+        """
+        if self.max_pendientes and self.repo.pendientes() >= self.max_pendientes:
+            raise ColaLlenaError(f"La cola tiene {self.max_pendientes} o más facturas pendientes")
+        try:
+            codigo_mov = normalizar_factura(datos)[0]["codigo_mov"] or None
+        except FacturaInvalidaError:
+            codigo_mov = None
+        return self.repo.encolar(datos, codigo_mov, max_intentos)
+
+    def estadisticas(self):
+        return self.repo.estadisticas()
+
+
+class TrabajadorCola:
+    """
+    Vacía la cola con como mucho `concurrencia` facturas en curso. Las
+    llamadas a la BD (bloqueantes) van a un pool de hilos del mismo tamaño.
+    """
+
+    def __init__(self, concurrencia=4, lote=None, plazo_segundos=300, espera_vacia=1.0,
+                 backoff_base=2.0, backoff_max=300.0, repo=None, ingesta=None):
+        self.concurrencia = concurrencia
+        self.lote = lote or concurrencia
+        self.plazo_segundos = plazo_segundos
+        self.espera_vacia = espera_vacia
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.repo = repo or ColaFacturasRepository()
+        self.ingesta = ingesta or IngestaService()
+
+        self.procesadas = 0
+        self.reintentos = 0
+        self.fallidas = 0
+        self.reservas_perdidas = 0
+        self.tiempos_ms = deque(maxlen=1000)
+        self._detener = None
+        self._executor = ThreadPoolExecutor(max_workers=concurrencia + 1, thread_name_prefix="cola")
+
+    def retraso(self, intentos):
+        """Backoff exponencial con jitter: base * 2^(intentos-1), acotado, ±50 %."""
+        retraso = min(self.backoff_max, self.backoff_base * 2 ** max(0, intentos - 1))
+        return retraso * random.uniform(0.5, 1.5)
+
+    async def _bd(self, funcion, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, funcion, *args)
+
+    async def _procesar(self, trabajo):
+        inicio = time.perf_counter()
+        try:
+            resultado = await self._bd(self.ingesta.ingerir, trabajo["payload"])
+        except FacturaInvalidaError as e:
+            # La factura en sí es incorrecta: reintentar no la arregla
+            if await self._bd(self.repo.descartar, trabajo, str(e), {"errores": e.errores}):
+                self.fallidas += 1
+            else:
+                self._reserva_perdida(trabajo)
+        except Exception as e:
+            if trabajo["intentos"] >= trabajo["max_intentos"]:
+                if await self._bd(self.repo.descartar, trabajo, str(e)):
+                    self.fallidas += 1
+                else:
+                    self._reserva_perdida(trabajo)
+            elif await self._bd(self.repo.reintentar, trabajo, str(e), self.retraso(trabajo["intentos"])):
+                self.reintentos += 1
+            else:
+                self._reserva_perdida(trabajo)
+        else:
+            if await self._bd(self.repo.completar, trabajo, json.loads(json.dumps(resultado, default=str))):
+                self.procesadas += 1
+            else:
+                self._reserva_perdida(trabajo)
+        finally:
+            self.tiempos_ms.append((time.perf_counter() - inicio) * 1000)
+
+    def _reserva_perdida(self, trabajo):
+        # Se pasó del plazo y otro trabajador la volvió a tomar (o ya se
+        # descartó): su estado lo decide quien tiene la reserva ahora
+        self.reservas_perdidas += 1
+        print(f"Factura {trabajo['id']}: reserva del intento {trabajo['intentos']} perdida, no se actualiza")
+
+    async def ejecutar(self, hasta_vaciar=False):
+        """
+        Bucle principal. Con hasta_vaciar=True termina cuando la cola no
+        tiene nada disponible (útil para benchmarks y lotes puntuales).
+        """
+        self._detener = asyncio.Event()
+        huecos = asyncio.Semaphore(self.concurrencia)
+        en_curso = set()
+
+        while not self._detener.is_set():
+            # Solo se toma de la cola lo que se puede empezar ya: el resto
+            # sigue disponible para otros trabajadores
+            await huecos.acquire()
+            libres = 1
+            while libres < self.lote and not huecos.locked():
+                await huecos.acquire()
+                libres += 1
+
+            try:
+                trabajos = await self._bd(self.repo.tomar, libres, self.plazo_segundos)
+            except Exception as e:
+                print("Error tomando facturas de la cola:", e)
+                trabajos = []
+
+            for _ in range(libres - len(trabajos)):
+                huecos.release()
+
+            if not trabajos:
+                if hasta_vaciar and not en_curso:
+                    break
+                try:
+                    await asyncio.wait_for(self._detener.wait(), self.espera_vacia)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            for trabajo in trabajos:
+                tarea = asyncio.create_task(self._procesar(trabajo))
+                en_curso.add(tarea)
+                tarea.add_done_callback(en_curso.discard)
+                tarea.add_done_callback(lambda _: huecos.release())
+
+        if en_curso:
+            await asyncio.gather(*en_curso, return_exceptions=True)
+
+    def detener(self):
+        if self._detener is not None:
+            self._detener.set()
+
+    def estadisticas(self):
+        tiempos = sorted(self.tiempos_ms)
+        return {
+            "procesadas": self.procesadas,
+            "reintentos": self.reintentos,
+            "fallidas": self.fallidas,
+            "reservas_perdidas": self.reservas_perdidas,
+            "proceso_medio_ms": round(statistics.fmean(tiempos), 1) if tiempos else 0.0,
+            "proceso_p95_ms": round(tiempos[int(len(tiempos) * 0.95) - 1], 1) if tiempos else 0.0,
+        }
+
+
+async def _trabajar(args):
+    trabajador = TrabajadorCola(concurrencia=args.concurrencia, lote=args.lote, plazo_segundos=args.plazo)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, trabajador.detener)
+        except NotImplementedError:
+            pass
+
+    async def informar():
+        while True:
+            await asyncio.sleep(args.informe)
+            cola = await asyncio.to_thread(ColaFacturasRepository.estadisticas)
+            print("cola:", cola, "| trabajador:", trabajador.estadisticas())
+
+    informe = asyncio.create_task(informar()) if args.informe else None
+    print(f"Trabajador de la cola con concurrencia {args.concurrencia}")
+    await trabajador.ejecutar(hasta_vaciar=args.hasta_vaciar)
+    if informe:
+        informe.cancel()
+    print("Trabajador detenido:", trabajador.estadisticas())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cola de ingesta de facturas")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_trabajar = sub.add_parser("trabajar", help="Procesar la cola")
+    p_trabajar.add_argument("--concurrencia", type=int, default=4)
+    p_trabajar.add_argument("--lote", type=int, default=None, help="facturas que se toman de cada vez")
+    p_trabajar.add_argument("--plazo", type=int, default=300, help="segundos antes de dar por abandonada una factura")
+    p_trabajar.add_argument("--informe", type=float, default=60.0, help="segundos entre informes (0 = ninguno)")
+    p_trabajar.add_argument("--hasta-vaciar", action="store_true", help="terminar cuando no quede nada")
+
+    sub.add_parser("estado", help="Profundidad y latencia de la cola")
+    p_fallidas = sub.add_parser("fallidas", help="Listar las facturas fallidas")
+    p_fallidas.add_argument("--limite", type=int, default=50)
+    p_reencolar = sub.add_parser("reencolar-fallidas", help="Volver a encolar facturas fallidas")
+    p_reencolar.add_argument("ids", nargs="*", type=int)
+
+    args = parser.parse_args()
+
+    if args.comando == "trabajar":
+        asyncio.run(_trabajar(args))
+    elif args.comando == "estado":
+        for clave, valor in ColaFacturasRepository.estadisticas().items():
+            print(f"{clave:<20}{valor}")
+    elif args.comando == "fallidas":
+        for f in ColaFacturasRepository.fallidas(args.limite):
+            print(f"{f['id']:>8}  {f['codigo_mov'] or '-':<16}{f['intentos']:>3}  {f['ultimo_error']}")
+    elif args.comando == "reencolar-fallidas":
+        n = ColaFacturasRepository.reencolar_fallidas(args.ids)
+        print(f"{n} factura(s) reencolada(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,307 @@
 # services/dashboard_service.py
+from models.serie_ventas import SerieVentas
 from repositories.dashboard_repository import DashboardRepository
+from repositories.prevision_repository import PrevisionRepository
+from repositories.reposicion_repository import ReposicionRepository
+from utils.cache import CacheTTL
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturoTimeout
+from dataclasses import dataclass, field
+import logging
+import os
 import pandas as pd
 import datetime
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Segundos que vive en caché cada consulta del dashboard. Las escrituras de
+# inventario/productos invalidan tras su commit (utils.cache.invalidar), así
+# que el TTL solo acota lo que puede tardar en verse un cambio hecho fuera de
+# la app. Los resultados de una consulta fallida no se cachean.
+TTL_DASHBOARD = {
+    "obtener_resumen_mes": 30,
+    "obtener_ventas_mes_actual": 60,
+    "obtener_ranking_productos_vendidos": 300,
+    "ultimas_ventas": 30,
+    "productos_bajo_stock": 60,
+    "ventas_por_categoria_mes": 120,
+    "serie_ventas": 60,
+    "ranking_productos": 300,
+    "reposicion_sugerida": 600,
+    "proximas_roturas": 600,
+}
+
+# Etiquetas de invalidación de cada consulta
+ETIQUETAS_DASHBOARD = {
+    "obtener_resumen_mes": ("ventas", "stock", "productos"),
+    "obtener_ventas_mes_actual": ("ventas",),
+    "obtener_ranking_productos_vendidos": ("ventas", "productos"),
+    "ultimas_ventas": ("ventas", "productos"),
+    "productos_bajo_stock": ("stock", "productos"),
+    "ventas_por_categoria_mes": ("ventas",),
+    "serie_ventas": ("ventas", "productos"),
+    "ranking_productos": ("ventas", "productos"),
+    "reposicion_sugerida": ("reposicion", "productos"),
+    "proximas_roturas": ("prevision", "productos"),
+}
+
+# Compartida por todas las sesiones de Streamlit del proceso
+_cache = CacheTTL("dashboard", max_entradas=128, max_bytes=32 * 1024 * 1024)
+
+# Valor que muestra un panel cuando su consulta falla o no llega a tiempo
+VACIOS_PANEL = {
+    "resumen": lambda: {"ventas_mes": 0, "ingresos_mes": 0.0, "ventas_hoy": 0, "productos_bajo_stock": 0},
+    "ventas_mes": lambda: pd.DataFrame(columns=["dia", "total_dia"]),
+    "ventas_categoria": lambda: pd.DataFrame(columns=["categoria", "total_categoria"]),
+    "ranking": lambda: pd.DataFrame(columns=["id_producto", "nombre_producto", "marca", "total_vendido", "importe"]),
+    "ultimas_ventas": lambda: pd.DataFrame(
+        columns=["codigo_mov", "nombre_producto", "cantidad", "precio_unitario", "precio_total", "fecha_mov"]
+    ),
+    "bajo_stock": lambda: pd.DataFrame(columns=["id_producto", "nombre_producto", "stock_actual", "stock_minimo"]),
+    "reposicion": lambda: pd.DataFrame(
+        columns=["id_producto", "nombre_producto", "marca", "stock_actual", "demanda_media",
+                 "dias_cobertura", "punto_pedido", "cantidad_sugerida", "calculado_en"]
+    ),
+    "roturas": lambda: pd.DataFrame(
+        columns=["id_producto", "nombre_producto", "marca", "stock_actual",
+                 "demanda_7d", "demanda_30d", "fecha_rotura", "calculado_en"]
+    ),
+}
+
+# Segundos que se espera a cada panel (desde que se lanzan todos)
+TIMEOUT_PANEL = {
+    "resumen": 3.0,
+    "ventas_mes": 5.0,
+    "ventas_categoria": 5.0,
+    "ranking": 5.0,
+    "ultimas_ventas": 3.0,
+    "bajo_stock": 3.0,
+    "reposicion": 5.0,
+    "roturas": 5.0,
+}
+
+# Renders de cargar_panel que pueden tener consultas en curso a la vez (de
+# todas las sesiones; los paneles que ya están en caché no cuentan). Cada
+# uno ocupa como mucho un hilo y una conexión por panel: por defecto, los
+# que caben en el pool (PGPOOL_MAX).
+RENDERS_CONCURRENTES = int(os.getenv(
+    "DASHBOARD_RENDERS_CONCURRENTES",
+    str(max(1, int(os.getenv("PGPOOL_MAX", "10")) // len(VACIOS_PANEL))),
+))
+
+# Postgres cancela las consultas del dashboard que pasen de este tiempo: una
+# consulta de un panel que ya no se espera no deja el hilo ni la conexión
+# ocupados indefinidamente
+STATEMENT_TIMEOUT_MS = int(os.getenv(
+    "DASHBOARD_STATEMENT_TIMEOUT_MS", str(int(max(TIMEOUT_PANEL.values()) * 1000))
+))
+
+# Un hilo por panel y render concurrente: los paneles de un render nunca
+# esperan en cola a los de otro
+_executor = ThreadPoolExecutor(
+    max_workers=len(VACIOS_PANEL) * RENDERS_CONCURRENTES, thread_name_prefix="dashboard"
+)
+_renders = threading.BoundedSemaphore(RENDERS_CONCURRENTES)
+
+
+@dataclass
+class PanelDashboard:
+    """Foto de todos los paneles del dashboard cargados a la vez."""
+    resumen: dict
+    ventas_mes: pd.DataFrame
+    ventas_categoria: pd.DataFrame
+    ranking: pd.DataFrame
+    ultimas_ventas: pd.DataFrame
+    bajo_stock: pd.DataFrame
+    reposicion: pd.DataFrame
+    roturas: pd.DataFrame
+    # panel -> motivo ("timeout" o el error) de los paneles que no se pudieron cargar
+    errores: dict = field(default_factory=dict)
+    # panel -> milisegundos que tardó su consulta
+    tiempos_ms: dict = field(default_factory=dict)
 
 
 class DashboardService:
     def __init__(self):
-        self.repo = DashboardRepository()
+        self.repo = DashboardRepository(STATEMENT_TIMEOUT_MS)
+        self.repo_reposicion = ReposicionRepository()
+        self.repo_prevision = PrevisionRepository()
+
+    @staticmethod
+    def estadisticas_cache():
+        return _cache.estadisticas()
+
+    @staticmethod
+    def _clave(metodo, *args):
+        return (metodo, datetime.date.today()) + args
+
+    def _cacheado(self, metodo, calcular, *args):
+        return _cache.obtener_o_calcular(
+            self._clave(metodo, *args),
+            calcular,
+            ttl=TTL_DASHBOARD[metodo],
+            etiquetas=ETIQUETAS_DASHBOARD[metodo],
+        )
+
+    def cargar_panel(
+        self,
+        timeout=None,
+        limite_ranking: int = 10,
+        limite_ultimas: int = 10,
+        periodo_ranking: str = "total",
+        limite_reposicion: int = 20,
+        limite_roturas: int = 20,
+    ) -> PanelDashboard:
+        """
+        Toma de la caché los paneles que ya están y lanza en paralelo las
+        consultas del resto, esperando a cada uno como mucho su timeout
+        (TIMEOUT_PANEL; `timeout` puede ser un número para todos o un dict
+        panel -> segundos). Un panel que falla o no termina a tiempo se
+        devuelve vacío y queda anotado en `errores`; el resto se muestra
+        igual. Si llega tarde (antes del statement timeout), su resultado
+        queda en caché para el siguiente render.
+
+        Solo un render con algún panel fuera de caché ocupa uno de los
+        RENDERS_CONCURRENTES huecos. Si están todos ocupados espera como
+        mucho el menor de sus timeouts; si no, esos paneles salen vacíos con
+        el error "saturado".
+        """
+        # panel -> (método cacheado, argumentos, tarea)
+        paneles = {
+            "resumen": ("obtener_resumen_mes", (), self.obtener_resumen_mes),
+            "ventas_mes": ("obtener_ventas_mes_actual", (), self.obtener_ventas_mes_actual),
+            "ventas_categoria": ("ventas_por_categoria_mes", (), self.ventas_por_categoria_mes),
+            "ranking": (
+                "ranking_productos", (periodo_ranking, limite_ranking),
+                lambda: self.ranking_productos(periodo_ranking, limite_ranking),
+            ),
+            "ultimas_ventas": ("ultimas_ventas", (limite_ultimas,), lambda: self.ultimas_ventas(limite_ultimas)),
+            "bajo_stock": ("productos_bajo_stock", (), self.productos_bajo_stock),
+            "reposicion": (
+                "reposicion_sugerida", (limite_reposicion,), lambda: self.reposicion_sugerida(limite_reposicion)
+            ),
+            "roturas": ("proximas_roturas", (limite_roturas,), lambda: self.proximas_roturas(limite_roturas)),
+        }
+        if isinstance(timeout, dict):
+            timeouts = {**TIMEOUT_PANEL, **timeout}
+        elif timeout is not None:
+            timeouts = dict.fromkeys(paneles, float(timeout))
+        else:
+            timeouts = TIMEOUT_PANEL
+
+        resultados, errores, tiempos = {}, {}, {}
+        faltante = object()
+        tareas = {}
+        for panel, (metodo, args, tarea) in paneles.items():
+            valor = _cache.obtener(self._clave(metodo, *args), faltante, contar_fallo=False)
+            if valor is faltante:
+                tareas[panel] = tarea
+            else:
+                resultados[panel], tiempos[panel] = valor, 0.0
+
+        if tareas and not _renders.acquire(timeout=min(timeouts[panel] for panel in tareas)):
+            for panel in tareas:
+                resultados[panel] = VACIOS_PANEL[panel]()
+                errores[panel] = "saturado"
+            tareas = {}
+
+        # El hueco se libera cuando terminan todas sus consultas, también
+        # las de los paneles que ya no se esperan
+        restantes = [len(tareas)]
+        restantes_lock = threading.Lock()
+
+        def liberar(_):
+            with restantes_lock:
+                restantes[0] -= 1
+                if restantes[0] == 0:
+                    _renders.release()
+
+        def medir(tarea):
+            inicio = time.perf_counter()
+            return tarea(), (time.perf_counter() - inicio) * 1000
+
+        inicio = time.monotonic()
+        futuros = {}
+        for panel, tarea in tareas.items():
+            futuros[panel] = _executor.submit(medir, tarea)
+            futuros[panel].add_done_callback(liberar)
+
+        for panel, futuro in futuros.items():
+            try:
+                restante = max(0.0, inicio + timeouts[panel] - time.monotonic())
+                resultados[panel], tiempos[panel] = futuro.result(timeout=restante)
+            except FuturoTimeout:
+                errores[panel] = "timeout"
+            except Exception as e:
+                logger.exception("[DashboardService][cargar_panel] Error en el panel %s", panel)
+                errores[panel] = str(e)
+            if panel in errores:
+                resultados[panel] = VACIOS_PANEL[panel]()
+
+        return PanelDashboard(**{panel: resultados[panel] for panel in paneles}, errores=errores, tiempos_ms=tiempos)
 
     def obtener_resumen_mes(self):
-        return self.repo.obtener_resumen_mes()
+        return self._cacheado("obtener_resumen_mes", self.repo.obtener_resumen_mes)
 
     def obtener_ventas_mes_actual(self) -> pd.DataFrame:
-        df = self.repo.obtener_ventas_mes_actual()
-        # Si está vacío devolvemos vacío
-        if df.empty:
-            # devolver rango completo del mes con ceros puede ser útil para gráficos
-            hoy = datetime.date.today()
-            start = datetime.date(hoy.year, hoy.month, 1)
-            if hoy.month == 12:
-                end = datetime.date(hoy.year, 12, 31)
-            else:
-                end = datetime.date(hoy.year, hoy.month + 1, 1) - datetime.timedelta(days=1)
-            all_days = pd.DataFrame({"dia": pd.date_range(start=start, end=end).date})
-            all_days["total_dia"] = 0.0
-            return all_days
-
-        # Construir rango completo del mes actual y hacer merge (rellenar con 0)
-        hoy = datetime.date.today()
-        start = datetime.date(hoy.year, hoy.month, 1)
-        if hoy.month == 12:
-            end = datetime.date(hoy.year, 12, 31)
-        else:
-            end = datetime.date(hoy.year, hoy.month + 1, 1) - datetime.timedelta(days=1)
-        all_days = pd.DataFrame({"dia": pd.date_range(start=start, end=end).date})
-        merged = all_days.merge(df, on="dia", how="left").fillna({"total_dia": 0})
-        merged["total_dia"] = merged["total_dia"].astype(float)
-        return merged
+        return self._cacheado("obtener_ventas_mes_actual", self._ventas_mes_actual)
+
+    def _ventas_mes_actual(self) -> pd.DataFrame:
+        # Todos los días del mes, con 0 los que no tienen ventas (los rellena la consulta)
+        inicio, fin = DashboardRepository._rango_mes()
+        serie = self.repo.serie_ventas(inicio, fin, "dia")
+        return pd.DataFrame({
+            "dia": serie.periodo.astype("datetime64[D]").tolist(),
+            "total_dia": serie.importe,
+        })
+
+    def serie_ventas(self, desde, hasta, granularidad: str = "dia", categoria=None, id_producto=None) -> SerieVentas:
+        """
+        Ventas de [desde, hasta) por hora, día, semana o mes, sin huecos.
+        Ver DashboardRepository.serie_ventas.
+        """
+        return self._cacheado(
+            "serie_ventas",
+            lambda: self.repo.serie_ventas(desde, hasta, granularidad, categoria, id_producto),
+            desde, hasta, granularidad, categoria, id_producto,
+        )
 
     def obtener_ranking_productos_vendidos(self, limit: int = 10):
-        return self.repo.obtener_ranking_productos_vendidos(limit)
+        return self._cacheado(
+            "obtener_ranking_productos_vendidos",
+            lambda: self.repo.obtener_ranking_productos_vendidos(limit),
+            limit,
+        )
+
+    def ranking_productos(self, periodo: str = "total", limite: int = 10):
+        return self._cacheado(
+            "ranking_productos",
+            lambda: self.repo.ranking_productos(periodo, limite),
+            periodo, limite,
+        )
 
     def ultimas_ventas(self, limite: int = 10):
-        return self.repo.ultimas_ventas(limite)
+        return self._cacheado("ultimas_ventas", lambda: self.repo.ultimas_ventas(limite), limite)
 
     def productos_bajo_stock(self):
-        return self.repo.productos_bajo_stock()
+        return self._cacheado("productos_bajo_stock", self.repo.productos_bajo_stock)
+
+    def reposicion_sugerida(self, limite: int = 20):
+        """Productos a pedir según el último cálculo de services/reposicion_service.py."""
+        return self._cacheado(
+            "reposicion_sugerida",
+            lambda: self.repo_reposicion.sugerencias(limite, STATEMENT_TIMEOUT_MS),
+            limite,
+        )
+
+    def proximas_roturas(self, limite: int = 20):
+        """Roturas de stock previstas por services/prevision_service.py, la más próxima primero."""
+        return self._cacheado(
+            "proximas_roturas",
+            lambda: self.repo_prevision.proximas_roturas(limite, STATEMENT_TIMEOUT_MS),
+            limite,
+        )
 
     def ventas_por_categoria_mes(self):
-        return self.repo.ventas_por_categoria_mes()
+        return self._cacheado("ventas_por_categoria_mes", self.repo.ventas_por_categoria_mes)
@@ -0,0 +1,186 @@
+# services/exportacion_service.py
+"""
+Exportación del histórico de movimientos y del catálogo a CSV o Parquet.
+
+Las filas nunca se cargan todas en memoria:
+  - CSV: COPY (consulta) TO STDOUT, que Postgres va generando por trozos
+  - Parquet: cursor con nombre leído en bloques de `tam_bloque` filas;
+    cada bloque se convierte en un RecordBatch de pyarrow y se escribe como
+    un row group con ParquetWriter
+así que la memoria depende del tamaño de bloque y no del de la tabla.
+
+Eso vale para el fichero que se escribe. La descarga desde la página de
+Inventarios no es de memoria constante: st.download_button lee el fichero
+completo y lo guarda en la memoria del servidor de Streamlit. Para
+históricos grandes se usa esta línea de comandos. Los ficheros de la
+página se crean con fichero_temporal() en un directorio propio, que se
+barre en cada exportación: se borran los de más de EDAD_MAXIMA_TEMPORALES
+segundos, p. ej. los de sesiones que se cerraron sin exportar otra vez.
+
+    python -m services.exportacion_service movimientos --formato parquet --salida movimientos.parquet [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD]
+    python -m services.exportacion_service productos --formato csv --salida productos.csv
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from repositories.exportacion_repository import ExportacionRepository
+
+FORMATOS = ("csv", "parquet")
+
+DIRECTORIO_TEMPORALES = os.path.join(tempfile.gettempdir(), "inventario_exportaciones")
+EDAD_MAXIMA_TEMPORALES = float(os.getenv("EXPORTACION_EDAD_MAXIMA", 3600))
+
+# (columna, expresión SQL, tipo en Parquet) de cada exportación
+COLUMNAS_MOVIMIENTOS = (
+    ("id_mov", "m.id_mov", pa.int64()),
+    ("codigo_mov", "m.codigo_mov", pa.string()),
+    ("fecha", "m.fecha", pa.timestamp("us")),
+    ("tipo_movimiento", "m.tipo_movimiento", pa.string()),
+    ("id_producto", "m.id_producto", pa.int32()),
+    ("nombre_producto", "p.nombre_producto", pa.string()),
+    ("marca", "p.marca", pa.string()),
+    ("categoria", "p.categoria", pa.string()),
+    ("cantidad", "m.cantidad::float8", pa.float64()),
+    ("precio_unitario", "m.precio_unitario::float8", pa.float64()),
+    ("fecha_mov", "t.fecha_mov", pa.timestamp("us")),
+    ("id_usuario", "t.id_usuario", pa.int32()),
+    ("referencia", "t.referencia", pa.string()),
+    ("metodo_registro", "t.metodo_registro", pa.string()),
+)
+
+COLUMNAS_PRODUCTOS = (
+    ("id_producto", "p.id_producto", pa.int32()),
+    ("nombre_producto", "p.nombre_producto", pa.string()),
+    ("categoria", "p.categoria", pa.string()),
+    ("marca", "p.marca", pa.string()),
+    ("stock_actual", "p.stock_actual::float8", pa.float64()),
+    ("stock_minimo", "p.stock_minimo::float8", pa.float64()),
+    ("precio_unitario", "p.precio_unitario::float8", pa.float64()),
+    ("estado", "p.estado", pa.string()),
+    ("fecha_creacion", "p.fecha_creacion", pa.timestamp("us")),
+)
+
+
+def _select(columnas):
+    return ",\n                   ".join(f"{expr} AS {nombre}" for nombre, expr, _ in columnas)
+
+
+def barrer_temporales(edad_maxima=EDAD_MAXIMA_TEMPORALES):
+    """Borra los ficheros de DIRECTORIO_TEMPORALES más antiguos que `edad_maxima` segundos."""
+    limite = time.time() - edad_maxima
+    try:
+        entradas = list(os.scandir(DIRECTORIO_TEMPORALES))
+    except FileNotFoundError:
+        return 0
+    borrados = 0
+    for entrada in entradas:
+        try:
+            if entrada.is_file() and entrada.stat().st_mtime < limite:
+                os.remove(entrada.path)
+                borrados += 1
+        except OSError:
+            # Otra sesión lo borró a la vez
+            pass
+    return borrados
+
+
+def fichero_temporal(formato):
+    """
+    Fichero abierto (binario, delete=False) en DIRECTORIO_TEMPORALES para
+    una exportación descargable; antes barre los caducados. Quien lo crea
+    lo borra cuando ya no lo necesita, y si no, lo borra el barrido.
+    """
+    os.makedirs(DIRECTORIO_TEMPORALES, exist_ok=True)
+    barrer_temporales()
+    return tempfile.NamedTemporaryFile(suffix=f".{formato}", dir=DIRECTORIO_TEMPORALES, delete=False)
+
+
+class ExportacionService:
+
+    def __init__(self, repo=None, tam_bloque=10_000):
+        self.repo = repo or ExportacionRepository()
+        self.tam_bloque = tam_bloque
+
+    def exportar(self, sql, params, columnas, destino, formato="csv"):
+        """
+        Exporta el resultado de `sql` (con las `columnas` en ese orden) a
+        `destino`: ruta o fichero binario abierto. Devuelve las filas escritas.
+        """
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato no válido: '{formato}' (usa {', '.join(FORMATOS)})")
+
+        if isinstance(destino, (str, bytes)) or hasattr(destino, "__fspath__"):
+            with open(destino, "wb") as fichero:
+                return self.exportar(sql, params, columnas, fichero, formato)
+
+        if formato == "csv":
+            return self.repo.copiar_csv(sql, params, destino)
+
+        esquema = pa.schema([(nombre, tipo) for nombre, _, tipo in columnas])
+        filas = 0
+        with pq.ParquetWriter(destino, esquema, compression="zstd") as escritor:
+            for bloque in self.repo.leer_por_bloques(sql, params, self.tam_bloque):
+                valores = list(zip(*bloque))
+                lote = pa.record_batch(
+                    [pa.array(valores[i], type=tipo) for i, (_, _, tipo) in enumerate(columnas)],
+                    schema=esquema,
+                )
+                escritor.write_batch(lote)
+                filas += len(bloque)
+                del bloque, valores, lote
+        return filas
+
+    def exportar_movimientos(self, destino, formato="csv", desde: date = None, hasta: date = None):
+        """
+        Exporta mov_inventario unido a transacciones y productos, en orden
+        de fecha. desde/hasta filtran por mov_inventario.fecha en [desde, hasta),
+        así que solo se leen las particiones de esos meses.
+        """
+        sql = f"""
+            SELECT {_select(COLUMNAS_MOVIMIENTOS)}
+            FROM mov_inventario m
+            LEFT JOIN transacciones t ON t.codigo_mov = m.codigo_mov
+            LEFT JOIN productos p ON p.id_producto = m.id_producto
+            WHERE (%(desde)s::timestamp IS NULL OR m.fecha >= %(desde)s::timestamp)
+              AND (%(hasta)s::timestamp IS NULL OR m.fecha < %(hasta)s::timestamp)
+            ORDER BY m.fecha, m.id_mov
+        """
+        return self.exportar(sql, {"desde": desde, "hasta": hasta}, COLUMNAS_MOVIMIENTOS, destino, formato)
+
+    def exportar_productos(self, destino, formato="csv"):
+        """Exporta el catálogo completo en orden de id_producto."""
+        sql = f"""
+            SELECT {_select(COLUMNAS_PRODUCTOS)}
+            FROM productos p
+            ORDER BY p.id_producto
+        """
+        return self.exportar(sql, {}, COLUMNAS_PRODUCTOS, destino, formato)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportación de movimientos y productos")
+    parser.add_argument("tabla", choices=("movimientos", "productos"))
+    parser.add_argument("--formato", choices=FORMATOS, default="csv")
+    parser.add_argument("--salida", required=True)
+    parser.add_argument("--desde", type=date.fromisoformat, default=None)
+    parser.add_argument("--hasta", type=date.fromisoformat, default=None)
+    parser.add_argument("--bloque", type=int, default=10_000, help="filas por bloque (Parquet)")
+    args = parser.parse_args()
+
+    service = ExportacionService(tam_bloque=args.bloque)
+    inicio = time.perf_counter()
+    if args.tabla == "movimientos":
+        filas = service.exportar_movimientos(args.salida, args.formato, args.desde, args.hasta)
+    else:
+        filas = service.exportar_productos(args.salida, args.formato)
+    print(f"{filas:,} filas exportadas a {args.salida} en {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
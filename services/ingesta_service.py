@@ -0,0 +1,235 @@
+# services/ingesta_service.py
+"""
+Ingesta de facturas que llegan por Telegram (flujo "Asitentente Telegram").
+
+Acepta el JSON que produce n8n, tanto la factura de Limpia_datos
+({"codigo_mov", "fecha_mov", "tipo_movimiento", "id_usuario",
+"id_telegram", "metodo_registro", "items": [...]}) como la lista aplanada
+de Estructura_datos (un elemento por item, con los datos de cabecera
+repetidos, opcionalmente envueltos en {"json": ...}).
+
+La factura se valida entera en una consulta (InventarioRepository.validar_factura)
+y la cabecera y todas sus líneas se guardan juntas con
+InventarioService.registrar_movimiento: o se registra todo o nada.
+"""
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from repositories.inventario_repository import InventarioRepository
+from services.analisis_service import AnalisisError
+from services.inventario_service import InventarioService, MovimientoEnConflictoError, StockInsuficienteError
+
+TIPOS_MOVIMIENTO = ("venta", "compra")
+_MILES = re.compile(r"[+-]?\d{1,3}(\.\d{3})+")
+FORMATOS_FECHA = ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y")
+
+
+class FacturaInvalidaError(ValueError):
+    """La factura no se puede registrar; `errores` trae un mensaje por problema."""
+
+    def __init__(self, codigo_mov, errores):
+        self.codigo_mov = codigo_mov
+        self.errores = errores
+        super().__init__(f"Factura {codigo_mov or '(sin código)'} rechazada: " + "; ".join(errores))
+
+
+class FacturaEnConflictoError(FacturaInvalidaError):
+    """El código de la factura ya está registrado con otro contenido."""
+
+
+def _texto(valor):
+    if valor is None:
+        return ""
+    return str(valor).strip()
+
+
+def _entero(valor):
+    texto = _texto(valor)
+    if not texto:
+        return None
+    try:
+        return int(Decimal(texto))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _cantidad(valor):
+    # El analizador devuelve texto: "3", "2,5", "1.000"... La coma es el
+    # decimal; sin coma, un punto seguido de grupos de tres cifras es el
+    # separador de miles ("1.000" = 1000, "1.000.000")
+    texto = _texto(valor).replace(" ", "")
+    if "," in texto:
+        texto = texto.replace(".", "").replace(",", ".")
+    elif _MILES.fullmatch(texto):
+        texto = texto.replace(".", "")
+    try:
+        return Decimal(texto)
+    except InvalidOperation:
+        return None
+
+
+def _fecha(valor):
+    texto = _texto(valor)
+    if not texto:
+        return datetime.now()
+    try:
+        return datetime.fromisoformat(texto)
+    except ValueError:
+        pass
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            continue
+    return None
+
+
+def normalizar_factura(datos):
+    """
+    Convierte cualquiera de los dos formatos de n8n en (cabecera, items).
+    cabecera: {"codigo_mov", "fecha_mov", "tipo_movimiento", "id_usuario",
+               "id_telegram", "metodo_registro", "referencia"} ya con tipos de Python.
+    items:    [{"nombre_producto", "marca", "cantidad"}] con la cantidad como Decimal
+              (None si no es un número).
+    """
+    if isinstance(datos, list):
+        filas = [d.get("json", d) if isinstance(d, dict) else {} for d in datos]
+        if not filas:
+            raise FacturaInvalidaError(None, ["La factura no tiene items"])
+        cabecera_cruda = filas[0]
+        items_crudos = filas
+    elif isinstance(datos, dict):
+        datos = datos.get("json", datos)
+        cabecera_cruda = datos
+        items_crudos = datos.get("items") or []
+    else:
+        raise FacturaInvalidaError(None, ["Formato de factura no reconocido"])
+
+    cabecera = {
+        "codigo_mov": _texto(cabecera_cruda.get("codigo_mov")),
+        "fecha_mov": _fecha(cabecera_cruda.get("fecha_mov")),
+        "tipo_movimiento": _texto(cabecera_cruda.get("tipo_movimiento")).lower(),
+        "id_usuario": _entero(cabecera_cruda.get("id_usuario")),
+        "id_telegram": _entero(cabecera_cruda.get("id_telegram")),
+        "metodo_registro": _texto(cabecera_cruda.get("metodo_registro")) or "telegram",
+        "referencia": _texto(cabecera_cruda.get("referencia")) or None,
+    }
+    items = [
+        {
+            "nombre_producto": _texto(item.get("nombre_producto")),
+            "marca": _texto(item.get("marca")),
+            "cantidad": _cantidad(item.get("cantidad")),
+        }
+        for item in items_crudos
+    ]
+    return cabecera, items
+
+
+class IngestaService:
+
+    def __init__(self, repo=None, inventario=None, analisis=None):
+        self.repo = repo or InventarioRepository()
+        self.inventario = inventario or InventarioService(self.repo)
+        self.analisis = analisis
+
+    def validar(self, datos):
+        """
+        Normaliza y valida la factura sin guardar nada.
+        Devuelve (cabecera, lineas) listos para registrar_movimiento o lanza
+        FacturaInvalidaError con todos los problemas encontrados.
+        """
+        cabecera, items = normalizar_factura(datos)
+        codigo_mov = cabecera["codigo_mov"]
+
+        errores = []
+        if not codigo_mov:
+            errores.append("Falta el código de movimiento")
+        if cabecera["fecha_mov"] is None:
+            errores.append("Fecha de movimiento no válida")
+        if cabecera["tipo_movimiento"] not in TIPOS_MOVIMIENTO:
+            errores.append(f"Tipo de movimiento no válido: '{cabecera['tipo_movimiento']}'")
+        if not items:
+            errores.append("La factura no tiene items")
+        for n, item in enumerate(items, start=1):
+            cantidad = item["cantidad"]
+            if cantidad is None or not cantidad.is_finite() or cantidad <= 0:
+                errores.append(f"Item {n} ({item['nombre_producto']}): cantidad no válida")
+            elif cantidad != cantidad.to_integral_value():
+                errores.append(f"Item {n} ({item['nombre_producto']}): la cantidad debe ser entera ({cantidad})")
+        if errores:
+            raise FacturaInvalidaError(codigo_mov, errores)
+
+        # Sin id_usuario, la misma consulta busca al usuario por id_telegram
+        # (índice de la migración 007): un chat revocado o reasignado se
+        # rechaza en cuanto cambia en la BD, desde cualquier proceso
+        validacion = self.repo.validar_factura(cabecera["id_usuario"], cabecera["id_telegram"], items)
+
+        id_usuario = validacion[0]["id_usuario"]
+        if id_usuario is None:
+            errores.append("El usuario no existe o no tiene Telegram vinculado")
+        for v in validacion:
+            if v["id_producto"] is None:
+                errores.append(f"Item {v['indice'] + 1}: no existe el producto '{v['nombre_producto']}' ({v['marca']})")
+            elif v["estado"] != "activo":
+                errores.append(f"Item {v['indice'] + 1}: el producto '{v['nombre_producto']}' está inactivo")
+        if errores:
+            raise FacturaInvalidaError(codigo_mov, errores)
+
+        cabecera["id_usuario"] = id_usuario
+        lineas = [
+            {"id_producto": v["id_producto"], "cantidad": v["cantidad"], "tipo_movimiento": cabecera["tipo_movimiento"]}
+            for v in validacion
+        ]
+        return cabecera, lineas
+
+    def ingerir(self, datos):
+        """
+        Valida y registra una factura de forma atómica.
+        Devuelve el resultado de registrar_movimiento
+        ({"codigo_mov", "id_transaccion", "fecha_mov", "ids_mov", "duplicada"});
+        reenviar una factura ya registrada no guarda nada y devuelve sus ids.
+        Lanza FacturaInvalidaError si la factura no es válida o no hay stock
+        y FacturaEnConflictoError si el código ya se usó con otro contenido.
+        """
+        cabecera, lineas = self.validar(datos)
+        try:
+            return self.inventario.registrar_movimiento(cabecera, lineas)
+        except StockInsuficienteError as e:
+            raise FacturaInvalidaError(
+                cabecera["codigo_mov"],
+                [
+                    f"Item {f['indice'] + 1} ({f['nombre_producto'] or f['id_producto']}): "
+                    f"{f['veredicto']} (pedido {f['cantidad']}, disponible {f['stock_actual'] or 0})"
+                    for f in e.fallos
+                ],
+            ) from e
+        except MovimientoEnConflictoError as e:
+            raise FacturaEnConflictoError(e.codigo_mov, [str(e)]) from e
+
+    def ingerir_imagen(self, imagen, id_telegram=None):
+        """
+        Analiza la foto de la factura (con la caché de AnalisisFacturaService,
+        así un reenvío de la misma foto no vuelve a llamar al modelo) y la
+        registra como ingerir(). Devuelve el resultado con "hash_imagen" y
+        "analisis_cacheado" añadidos.
+
+        El usuario sale solo del chat que envía la foto (`id_telegram`): lo
+        que el modelo lea en la imagen no identifica a nadie, así que se
+        descarta cualquier id_usuario/id_telegram de la factura y sin
+        id_telegram se rechaza.
+        """
+        if id_telegram is None:
+            raise FacturaInvalidaError(None, ["Falta el chat de Telegram que envía la factura"])
+        if self.analisis is None:
+            raise FacturaInvalidaError(None, ["No hay servicio de análisis de imágenes configurado"])
+        try:
+            clave, factura, cacheado = self.analisis.analizar(imagen)
+        except AnalisisError as e:
+            raise FacturaInvalidaError(None, [str(e)]) from e
+        if isinstance(factura.get("json"), dict):
+            factura = factura["json"]
+        factura["id_usuario"] = None
+        factura["id_telegram"] = id_telegram
+        resultado = self.ingerir(factura)
+        return {**resultado, "hash_imagen": clave, "analisis_cacheado": cacheado}
@@ -1,7 +1,175 @@
+from decimal import Decimal
+
+from database.connection import get_connection
 from repositories.inventario_repository import InventarioRepository
+from utils.cache import invalidar
+
+
+class StockInsuficienteError(Exception):
+    """
+    Alguna línea no se puede registrar al confirmar (sin stock, producto
+    inexistente o inactivo...). `fallos` son las líneas de validar_lineas
+    cuyo veredicto no es "ok".
+    """
+
+    def __init__(self, fallos):
+        self.fallos = fallos
+        detalle = ", ".join(
+            f"línea {f['indice'] + 1}, producto {f['id_producto']} ({f['veredicto']})"
+            for f in fallos
+        )
+        super().__init__(f"No se puede registrar el movimiento: {detalle}")
+
+
+class MovimientoEnConflictoError(Exception):
+    """
+    Ya hay una transacción con ese código pero con otro contenido (otro
+    usuario, otra referencia u otras líneas): no es un reenvío y no se
+    guarda nada.
+    """
+
+    def __init__(self, codigo_mov, diferencias):
+        self.codigo_mov = codigo_mov
+        self.diferencias = diferencias
+        super().__init__(
+            f"El código {codigo_mov} ya está registrado con otro contenido: " + "; ".join(diferencias)
+        )
+
+
+def _firma_lineas(lineas):
+    # Multiconjunto de líneas comparable: el orden y 2 / 2.0 / "2" dan igual
+    return sorted(
+        (int(l["id_producto"]), Decimal(str(l["cantidad"])).normalize(), l["tipo_movimiento"])
+        for l in lineas
+    )
+
+
+def diferencias_reenvio(cabecera, lineas, registrada, lineas_registradas):
+    """
+    Compara un movimiento con el ya guardado con su código. Devuelve la
+    lista de diferencias (vacía si es un reenvío exacto). La fecha no se
+    compara: si la factura no la trae se toma la hora de llegada, distinta
+    en cada reenvío.
+    """
+    diferencias = []
+    if cabecera["id_usuario"] != registrada["id_usuario"]:
+        diferencias.append(f"usuario {cabecera['id_usuario']} (registrado {registrada['id_usuario']})")
+    if (cabecera.get("referencia") or None) != (registrada["referencia"] or None):
+        diferencias.append(f"referencia '{cabecera.get('referencia')}' (registrada '{registrada['referencia']}')")
+    if _firma_lineas(lineas) != _firma_lineas(lineas_registradas):
+        diferencias.append(f"{len(lineas)} línea(s) distintas de las {len(lineas_registradas)} registradas")
+    return diferencias
 
 
 class InventarioService:
 
     def __init__(self, repo=None):
         self.repo = repo or InventarioRepository()
+
+    @staticmethod
+    def _normalizar_lineas(lineas, tipo_defecto):
+        # Si una línea no trae tipo se usa el de la cabecera
+        return [
+            {
+                "id_producto": int(l["id_producto"]),
+                "cantidad": l["cantidad"],
+                "tipo_movimiento": l.get("tipo_movimiento") or tipo_defecto,
+            }
+            for l in lineas
+        ]
+
+    def validar_lineas(self, lineas, tipo_movimiento="venta"):
+        """
+        Validación previa (sin bloquear) de todas las líneas en una consulta,
+        para la pantalla de revisión. Ver InventarioRepository.validar_lineas.
+        """
+        return self.repo.validar_lineas(self._normalizar_lineas(lineas, tipo_movimiento))
+
+    def registrar_movimiento(self, cabecera, lineas, codigo_mov=None):
+        """
+        Registra una transacción y todas sus líneas en una sola transacción
+        de BD (la cabecera con un INSERT y las líneas con un INSERT multifila).
+
+        cabecera: {"codigo_mov", "id_usuario", "fecha_mov", "referencia",
+                   "metodo_registro", "tipo_movimiento"} o None para añadir
+                  líneas a la transacción `codigo_mov`, que ya debe existir
+                  (se bloquea hasta el commit; si no existe, ValueError).
+        lineas:   [{"id_producto", "cantidad", "tipo_movimiento"}]; si una
+                  línea no trae tipo se usa el de la cabecera.
+
+        Si ya existe una transacción con ese código y el mismo contenido
+        (reenvío de Telegram, doble clic...) no se guarda nada y se devuelven
+        los ids existentes con duplicada=True; si el contenido es otro se
+        lanza MovimientoEnConflictoError.
+
+        Antes de insertar las líneas se bloquean los productos y se validan
+        todas en una consulta (validar_lineas); si alguna no es válida se
+        lanza StockInsuficienteError con el detalle por línea y no se guarda nada.
+
+        Devuelve {"codigo_mov", "id_transaccion", "fecha_mov", "ids_mov", "duplicada"}.
+        Si algo falla no se guarda nada y se relanza la excepción.
+        """
+        if not lineas:
+            raise ValueError("El movimiento no tiene líneas")
+
+        if cabecera:
+            codigo_mov = cabecera["codigo_mov"]
+        if not codigo_mov:
+            raise ValueError("El código de movimiento es obligatorio")
+
+        lineas = self._normalizar_lineas(lineas, (cabecera or {}).get("tipo_movimiento", "venta"))
+
+        conn = get_connection()
+        if not conn:
+            raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+
+        try:
+            id_transaccion, fecha_mov, creada = None, None, True
+            if cabecera:
+                # Va primero: si el código ya existe, un reenvío concurrente
+                # espera aquí al commit del original y no bloquea productos
+                id_transaccion, fecha_mov, creada = self.repo.insertar_transaccion(
+                    conn,
+                    codigo_mov,
+                    cabecera["id_usuario"],
+                    cabecera["fecha_mov"],
+                    cabecera.get("referencia"),
+                    cabecera.get("metodo_registro", "manual"),
+                )
+            else:
+                transaccion = self.repo.bloquear_transaccion(conn, codigo_mov)
+                if transaccion is None:
+                    raise ValueError(f"No existe la transacción {codigo_mov}")
+                id_transaccion, fecha_mov = transaccion
+
+            if creada:
+                validacion = self.repo.validar_lineas(lineas, conn, bloquear=True)
+                fallos = [v for v in validacion if v["veredicto"] != "ok"]
+                if fallos:
+                    raise StockInsuficienteError(fallos)
+                ids_mov = self.repo.insertar_movimientos(conn, codigo_mov, lineas)
+            else:
+                registrada, registradas = self.repo.movimiento_registrado(conn, codigo_mov)
+                diferencias = diferencias_reenvio(cabecera, lineas, registrada, registradas)
+                if diferencias:
+                    raise MovimientoEnConflictoError(codigo_mov, diferencias)
+                ids_mov = [l["id_mov"] for l in registradas]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        # Tras el commit: si se invalida antes, un render concurrente puede
+        # volver a cachear los datos sin el movimiento
+        if creada:
+            invalidar("ventas", "stock", *{f"producto:{l['id_producto']}" for l in lineas})
+
+        return {
+            "codigo_mov": codigo_mov,
+            "id_transaccion": id_transaccion,
+            "fecha_mov": fecha_mov,
+            "ids_mov": ids_mov,
+            "duplicada": not creada,
+        }
@@ -0,0 +1,284 @@
+# services/prevision_service.py
+"""
+Previsión de demanda y fecha de rotura de stock de todo el catálogo.
+
+Modelo: suavizado exponencial aditivo con estacionalidad semanal (nivel +
+un factor por día de la semana, sin tendencia). Para cada producto:
+
+    previsto_t = nivel + estacionalidad[día_semana(t)]
+    error_t    = ventas_t - previsto_t
+    nivel     += alpha · error_t
+    estacionalidad[día_semana(t)] += gamma · (1 - alpha) · error_t
+
+alpha y gamma se eligen por producto en una rejilla minimizando el error
+cuadrático de la previsión a un día. El ajuste avanza día a día pero cada
+paso es una operación NumPy sobre todos los productos del lote y todos los
+puntos de la rejilla a la vez (matrices productos × rejilla): no hay bucle
+por producto. Los lotes se reparten en un pool de procesos.
+
+Solo se reajustan los productos con ventas nuevas desde el último ajuste
+(o con un ajuste de más de `reajuste_dias` días). Al resto se le avanza el
+estado guardado con los días transcurridos, que por definición no tuvieron
+ventas, sin leer su serie.
+
+Con la previsión de los próximos `horizonte_dias` días y el stock actual se
+estima la fecha de rotura (primer día en que la demanda acumulada alcanza
+el stock).
+
+    python -m services.prevision_service calcular [--procesos 4] [--ventana 182] [--todos]
+
+Lanzarlo una vez al día (cron), como el cálculo de reposición.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from repositories.prevision_repository import PrevisionRepository
+
+REJILLA_ALPHA = (0.02, 0.05, 0.1, 0.2, 0.3, 0.5)
+REJILLA_GAMMA = (0.01, 0.05, 0.1, 0.2, 0.3)
+
+# Días de la serie que solo sirven para arrancar el nivel y la estacionalidad
+DIAS_ARRANQUE = 14
+
+
+def ajustar_lote(series, dia_semana_inicio, rejilla_alpha=REJILLA_ALPHA, rejilla_gamma=REJILLA_GAMMA):
+    """
+    Ajusta el modelo a cada fila de `series` (productos × días, el primer
+    día es un `dia_semana_inicio`: 0 = lunes). Devuelve un dict con arrays
+    por producto: alpha, gamma, nivel, estacionalidad (productos × 7,
+    indexada por día de la semana) y error_medio (RMSE a un día).
+    """
+    series = np.asarray(series, dtype=np.float64)
+    n, dias = series.shape
+    alphas, gammas = (a.ravel() for a in np.meshgrid(rejilla_alpha, rejilla_gamma, indexing="ij"))
+    g = len(alphas)
+
+    # Arranque: nivel = media de las dos primeras semanas, estacionalidad =
+    # desviación media de cada día de la semana respecto a ese nivel
+    arranque = min(DIAS_ARRANQUE, dias)
+    nivel0 = series[:, :arranque].mean(axis=1) if arranque else np.zeros(n)
+    estacion0 = np.zeros((n, 7))
+    for d in range(min(7, arranque)):
+        estacion0[:, (dia_semana_inicio + d) % 7] = series[:, d:arranque:7].mean(axis=1) - nivel0
+    estacion0 -= estacion0.mean(axis=1, keepdims=True)
+
+    # Día de la semana en el primer eje: estacion[k] es un bloque contiguo (n, g)
+    nivel = np.repeat(nivel0[:, None], g, axis=1)                       # (n, g)
+    estacion = np.repeat(estacion0.T[:, :, None], g, axis=2)            # (7, n, g)
+    sse = np.zeros((n, g))
+    error = np.empty((n, g))
+    factor_estacion = gammas * (1 - alphas)
+    columnas = np.ascontiguousarray(series.T)
+
+    for t in range(dias):
+        k = (dia_semana_inicio + t) % 7
+        np.subtract(columnas[t][:, None], nivel, out=error)
+        error -= estacion[k]
+        if t >= arranque:
+            sse += error * error
+        nivel += alphas * error
+        estacion[k] += factor_estacion * error
+
+    mejor = np.argmin(sse, axis=1)
+    filas = np.arange(n)
+    evaluados = max(1, dias - arranque)
+    return {
+        "alpha": alphas[mejor],
+        "gamma": gammas[mejor],
+        "nivel": nivel[filas, mejor],
+        "estacionalidad": estacion[:, filas, mejor].T,
+        "error_medio": np.sqrt(sse[filas, mejor] / evaluados),
+    }
+
+
+def avanzar_sin_ventas(nivel, estacionalidad, alpha, gamma, desde, hasta):
+    """
+    Avanza el estado de todos los productos por los días [desde, hasta)
+    (cada producto desde su propia fecha) suponiendo ventas 0.
+    desde: array de datetime64[D]; hasta: date. Devuelve (nivel, estacionalidad).
+    """
+    nivel = np.array(nivel, dtype=np.float64)
+    estacionalidad = np.array(estacionalidad, dtype=np.float64)
+    desde = np.asarray(desde, dtype="datetime64[D]")
+    hasta = np.datetime64(hasta, "D")
+    pendientes = (hasta - desde).astype(np.int64)
+    if not len(pendientes) or pendientes.max() <= 0:
+        return nivel, estacionalidad
+
+    filas = np.arange(len(nivel))
+    # 1970-01-01 fue jueves (3)
+    dia_semana = (desde.astype(np.int64) + 3) % 7
+    for paso in range(int(pendientes.max())):
+        activos = pendientes > paso
+        k = (dia_semana + paso) % 7
+        error = np.where(activos, -(nivel + estacionalidad[filas, k]), 0.0)
+        nivel += alpha * error
+        estacionalidad[filas, k] += gamma * (1 - alpha) * error
+    return nivel, estacionalidad
+
+
+def prever(nivel, estacionalidad, inicio, horizonte_dias):
+    """Demanda prevista (productos × horizonte) desde `inicio`, nunca negativa."""
+    k = (inicio.weekday() + np.arange(horizonte_dias)) % 7
+    return np.maximum(nivel[:, None] + estacionalidad[:, k], 0.0)
+
+
+def fechas_rotura(prevision, stock_actual, inicio):
+    """
+    Primer día en que la demanda acumulada alcanza el stock (hoy si ya no
+    hay stock); NaT si no se agota dentro del horizonte.
+    """
+    acumulada = np.cumsum(prevision, axis=1)
+    alcanza = acumulada >= np.asarray(stock_actual, dtype=np.float64)[:, None]
+    agotado = alcanza.any(axis=1)
+    primero = np.argmax(alcanza, axis=1)
+    primero = np.where(np.asarray(stock_actual) <= 0, 0, primero)
+    agotado |= np.asarray(stock_actual) <= 0
+    fechas = np.datetime64(inicio, "D") + primero.astype("timedelta64[D]")
+    return np.where(agotado, fechas, np.datetime64("NaT"))
+
+
+def _ajustar(args):
+    series, dia_semana_inicio = args
+    return ajustar_lote(series, dia_semana_inicio)
+
+
+class PrevisionService:
+
+    def __init__(self, repo=None, ventana_dias=182, horizonte_dias=60, reajuste_dias=28,
+                 procesos=None, tam_lote=5000):
+        self.repo = repo or PrevisionRepository()
+        self.ventana_dias = ventana_dias
+        self.horizonte_dias = horizonte_dias
+        self.reajuste_dias = reajuste_dias
+        self.procesos = procesos or os.cpu_count() or 1
+        self.tam_lote = tam_lote
+
+    def ajustar(self, series, dia_semana_inicio):
+        """Ajusta todas las filas de `series` por lotes, en paralelo si hay más de un lote."""
+        lotes = [
+            (series[i:i + self.tam_lote], dia_semana_inicio)
+            for i in range(0, len(series), self.tam_lote)
+        ]
+        if len(lotes) <= 1 or self.procesos <= 1:
+            resultados = [_ajustar(lote) for lote in lotes]
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.procesos, len(lotes))) as pool:
+                resultados = list(pool.map(_ajustar, lotes))
+        if not resultados:
+            return {
+                "alpha": np.empty(0), "gamma": np.empty(0), "nivel": np.empty(0),
+                "estacionalidad": np.empty((0, 7)), "error_medio": np.empty(0),
+            }
+        return {clave: np.concatenate([r[clave] for r in resultados]) for clave in resultados[0]}
+
+    def calcular(self, hoy: date = None, reajustar_todos: bool = False, guardar: bool = True):
+        """
+        Reajusta los productos que lo necesitan, avanza el estado del resto,
+        calcula la previsión y la fecha de rotura de todos y, si
+        guardar=True, sustituye prevision_demanda.
+        Devuelve (columnas, resumen) con los tiempos en ms y los productos
+        reajustados.
+        """
+        hoy = hoy or date.today()
+        ahora = datetime.now().replace(microsecond=0)
+        resumen = {}
+
+        inicio = time.perf_counter()
+        productos = self.repo.productos(self.reajuste_dias)
+        n = len(productos)
+        ids = np.array([p[0] for p in productos], dtype=np.int64)
+        stock = np.array([p[1] for p in productos], dtype=np.float64)
+        reajustar = np.array([reajustar_todos or p[2] for p in productos], dtype=bool)
+
+        alpha = np.array([p[3] if p[3] is not None else 0.0 for p in productos], dtype=np.float64)
+        gamma = np.array([p[4] if p[4] is not None else 0.0 for p in productos], dtype=np.float64)
+        nivel = np.array([p[5] if p[5] is not None else 0.0 for p in productos], dtype=np.float64)
+        estacionalidad = np.array([p[6] if p[6] is not None else [0.0] * 7 for p in productos],
+                                  dtype=np.float64).reshape(n, 7)
+        error_medio = np.array([p[7] if p[7] is not None else np.nan for p in productos], dtype=np.float64)
+        ajustado_en = np.array([p[8] for p in productos], dtype=object)
+        estado_hasta = np.array([p[9] or hoy for p in productos], dtype="datetime64[D]")
+
+        desde = hoy - timedelta(days=self.ventana_dias)
+        seleccion = np.flatnonzero(reajustar)
+        series = self.repo.series_ventas(ids[seleccion], desde, hoy)
+        resumen["lectura_ms"] = (time.perf_counter() - inicio) * 1000
+
+        inicio = time.perf_counter()
+        ajuste = self.ajustar(series, desde.weekday())
+        alpha[seleccion] = ajuste["alpha"]
+        gamma[seleccion] = ajuste["gamma"]
+        nivel[seleccion] = ajuste["nivel"]
+        estacionalidad[seleccion] = ajuste["estacionalidad"]
+        error_medio[seleccion] = ajuste["error_medio"]
+        ajustado_en[seleccion] = ahora
+        estado_hasta[seleccion] = np.datetime64(hoy, "D")
+        resumen["ajuste_ms"] = (time.perf_counter() - inicio) * 1000
+        resumen["reajustados"] = len(seleccion)
+
+        inicio = time.perf_counter()
+        nivel, estacionalidad = avanzar_sin_ventas(nivel, estacionalidad, alpha, gamma, estado_hasta, hoy)
+        prevision = prever(nivel, estacionalidad, hoy, self.horizonte_dias)
+        rotura = fechas_rotura(prevision, stock, hoy)
+        resumen["prevision_ms"] = (time.perf_counter() - inicio) * 1000
+
+        columnas = {
+            "id_producto": ids,
+            "alpha": alpha,
+            "gamma": gamma,
+            "nivel": nivel,
+            "estacionalidad": list(estacionalidad),
+            "error_medio": error_medio,
+            "ajustado_en": ajustado_en,
+            "estado_hasta": [hoy] * n,
+            "stock_actual": stock,
+            "demanda_7d": prevision[:, :7].sum(axis=1),
+            "demanda_30d": prevision[:, :30].sum(axis=1),
+            "fecha_rotura": [None if np.isnat(f) else f.astype(object) for f in rotura],
+            "calculado_en": [ahora] * n,
+        }
+
+        if guardar:
+            inicio = time.perf_counter()
+            self.repo.guardar(columnas)
+            resumen["guardado_ms"] = (time.perf_counter() - inicio) * 1000
+        return columnas, resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Previsión de demanda del catálogo")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_calcular = sub.add_parser("calcular", help="Recalcular prevision_demanda")
+    p_calcular.add_argument("--ventana", type=int, default=182, help="días de historia para ajustar")
+    p_calcular.add_argument("--horizonte", type=int, default=60, help="días de previsión")
+    p_calcular.add_argument("--reajuste", type=int, default=28, help="reajustar igualmente si el ajuste tiene más días")
+    p_calcular.add_argument("--procesos", type=int, default=None)
+    p_calcular.add_argument("--lote", type=int, default=5000, help="productos por lote de ajuste")
+    p_calcular.add_argument("--todos", action="store_true", help="reajustar todos los productos")
+
+    args = parser.parse_args()
+
+    if args.comando == "calcular":
+        service = PrevisionService(
+            ventana_dias=args.ventana,
+            horizonte_dias=args.horizonte,
+            reajuste_dias=args.reajuste,
+            procesos=args.procesos,
+            tam_lote=args.lote,
+        )
+        columnas, resumen = service.calcular(reajustar_todos=args.todos)
+        roturas = sum(f is not None for f in columnas["fecha_rotura"])
+        print(f"{len(columnas['id_producto'])} productos, {resumen['reajustados']} reajustados, "
+              f"{roturas} con rotura prevista en {args.horizonte} días")
+        print("Tiempos (ms):", {k: round(v) for k, v in resumen.items() if k.endswith("_ms")})
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,16 @@ class ProductoService:
     def listar(self, offset=0, limit=10, filtro_campo=None, filtro_valor=None, orden_field="id_producto", asc=True):
         return self.repo.obtener(offset, limit, filtro_campo, filtro_valor, orden_field, asc)
 
+    def listar_pagina(self, offset=0, limit=10, filtro_campo=None, filtro_valor=None, orden_field="id_producto", asc=True):
+        return self.repo.obtener_pagina(offset, limit, filtro_campo, filtro_valor, orden_field, asc)
+
+    def listar_keyset(self, limit=10, cursor=None, hacia_atras=False, filtro_campo=None,
+                      filtro_valor=None, orden_field="id_producto", asc=True):
+        return self.repo.obtener_keyset(limit, cursor, hacia_atras, filtro_campo, filtro_valor, orden_field, asc)
+
+    def buscar(self, texto, limite=20, campos=None):
+        return self.repo.buscar(texto, limite, campos)
+
     def crear(self, nombre, categoria, marca, precio_unitario):
         return self.repo.insertar(nombre, categoria, marca, precio_unitario)
 
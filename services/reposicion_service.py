@@ -0,0 +1,187 @@
+# services/reposicion_service.py
+"""
+Cálculo de reposición para todo el catálogo.
+
+Con la demanda diaria de la ventana (ventas_diarias, días sin ventas = 0)
+y el nivel de servicio de la categoría (stock_seguridad_categoria) calcula
+para cada producto activo, de una vez con NumPy:
+
+  demanda_media    d = unidades / días
+  desviacion       s = desviación típica diaria
+  dias_cobertura   stock_actual / d
+  stock_seguridad  z · s · √L            (z del nivel de servicio, L = plazo)
+  punto_pedido     d · L + stock_seguridad (como mínimo stock_minimo)
+  cantidad         si stock_actual <= punto_pedido, hasta llegar a
+                   d · (L + R) + z · s · √(L + R)  (R = periodo de revisión)
+
+y guarda el resultado en reposicion_sugerida, que es lo que lee el dashboard.
+
+stock_seguridad_categoria.stock_seguridad se interpreta como nivel de
+servicio: una fracción (0.95) o un porcentaje (95). Las categorías sin
+valor, o con uno fuera de rango (se avisa en el log), usan `nivel_defecto`.
+
+    python -m services.reposicion_service calcular [--ventana 90] [--plazo 7] [--revision 7]
+
+Lanzarlo una vez al día (cron), después de la foto de stock.
+"""
+import argparse
+import logging
+import time
+from datetime import date, datetime, timedelta
+from statistics import NormalDist
+
+import numpy as np
+
+from repositories.reposicion_repository import ReposicionRepository
+
+logger = logging.getLogger(__name__)
+
+
+def niveles_servicio(valores, defecto=0.95):
+    """
+    Normaliza los niveles de servicio a [0.5, 0.9999]. Se admite una
+    fracción en (0, 1] o un porcentaje en [50, 100]; 1 y 100 son el 100 %
+    (se recortan a 0.9999). Los vacíos usan `defecto`; cualquier otro valor
+    (0, negativos, entre 1 y 50, más de 100) también, y se avisa en el log
+    en lugar de dejar el stock de seguridad a 0 sin decir nada.
+    """
+    niveles = np.asarray(valores, dtype=np.float64)
+    fraccion = (niveles > 0) & (niveles <= 1)
+    porcentaje = (niveles >= 50) & (niveles <= 100)
+    invalidos = ~np.isnan(niveles) & ~fraccion & ~porcentaje
+    if invalidos.any():
+        logger.warning(
+            "Niveles de servicio fuera de (0, 1] y [50, 100], se usa %s: %s",
+            defecto, sorted(set(niveles[invalidos].tolist())),
+        )
+    niveles = np.where(fraccion, niveles, np.where(porcentaje, niveles / 100, defecto))
+    return np.clip(niveles, 0.5, 0.9999)
+
+
+def factores_z(niveles):
+    """z de la normal para cada nivel; solo se calcula una vez por nivel distinto."""
+    distintos, posiciones = np.unique(niveles, return_inverse=True)
+    normal = NormalDist()
+    return np.array([normal.inv_cdf(n) for n in distintos])[posiciones]
+
+
+def calcular_reposicion(stock_actual, stock_minimo, niveles, dias, suma, suma_cuadrados,
+                        plazo_dias=7, revision_dias=7):
+    """
+    Cálculo vectorizado: cada argumento es un array con un valor por
+    producto. Devuelve un dict columna -> array.
+    """
+    stock_actual = np.asarray(stock_actual, dtype=np.float64)
+    stock_minimo = np.asarray(stock_minimo, dtype=np.float64)
+    dias = np.asarray(dias, dtype=np.float64)
+    suma = np.asarray(suma, dtype=np.float64)
+    suma_cuadrados = np.asarray(suma_cuadrados, dtype=np.float64)
+
+    demanda = suma / dias
+    # Varianza muestral de la serie diaria con los días sin ventas a 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        varianza = np.where(dias > 1, (suma_cuadrados - suma * demanda) / (dias - 1), 0.0)
+        cobertura = np.where(demanda > 0, stock_actual / demanda, np.nan)
+    desviacion = np.sqrt(np.maximum(varianza, 0.0))
+
+    z = factores_z(niveles)
+    seguridad = z * desviacion * np.sqrt(plazo_dias)
+    punto_pedido = np.maximum(demanda * plazo_dias + seguridad, stock_minimo)
+    horizonte = plazo_dias + revision_dias
+    nivel_objetivo = np.maximum(demanda * horizonte + z * desviacion * np.sqrt(horizonte), punto_pedido)
+    cantidad = np.where(
+        (stock_actual <= punto_pedido) & (nivel_objetivo > 0),
+        np.ceil(np.maximum(nivel_objetivo - stock_actual, 0.0)),
+        0.0,
+    )
+
+    return {
+        "demanda_media": demanda,
+        "desviacion": desviacion,
+        "nivel_servicio": niveles,
+        "stock_actual": stock_actual,
+        "dias_cobertura": cobertura,
+        "stock_seguridad": seguridad,
+        "punto_pedido": punto_pedido,
+        "cantidad_sugerida": cantidad,
+    }
+
+
+class ReposicionService:
+
+    def __init__(self, repo=None, ventana_dias=90, plazo_dias=7, revision_dias=7, nivel_defecto=0.95):
+        self.repo = repo or ReposicionRepository()
+        self.ventana_dias = ventana_dias
+        self.plazo_dias = plazo_dias
+        self.revision_dias = revision_dias
+        self.nivel_defecto = nivel_defecto
+
+    def calcular(self, hasta: date = None, guardar: bool = True):
+        """
+        Calcula la reposición con la demanda de los `ventana_dias` días
+        anteriores a `hasta` (por defecto, hasta ayer incluido) y, si
+        guardar=True, sustituye reposicion_sugerida.
+        Devuelve (columnas, tiempos_ms) con tiempos de "consulta",
+        "calculo" y "guardado".
+        """
+        hasta = hasta or date.today()
+        desde = hasta - timedelta(days=self.ventana_dias)
+        tiempos = {}
+
+        inicio = time.perf_counter()
+        filas = self.repo.demanda_productos(desde, hasta)
+        tiempos["consulta"] = (time.perf_counter() - inicio) * 1000
+
+        inicio = time.perf_counter()
+        n = len(filas)
+        datos = np.array(filas, dtype=np.float64).reshape(n, 7) if n else np.empty((0, 7))
+        columnas = calcular_reposicion(
+            stock_actual=datos[:, 1],
+            stock_minimo=datos[:, 2],
+            niveles=niveles_servicio(datos[:, 3], self.nivel_defecto),
+            dias=datos[:, 4],
+            suma=datos[:, 5],
+            suma_cuadrados=datos[:, 6],
+            plazo_dias=self.plazo_dias,
+            revision_dias=self.revision_dias,
+        )
+        columnas["id_producto"] = datos[:, 0].astype(np.int64)
+        columnas["calculado_en"] = [datetime.now().replace(microsecond=0)] * n
+        columnas["ventana_dias"] = np.full(n, self.ventana_dias)
+        tiempos["calculo"] = (time.perf_counter() - inicio) * 1000
+
+        if guardar:
+            inicio = time.perf_counter()
+            self.repo.guardar(columnas)
+            tiempos["guardado"] = (time.perf_counter() - inicio) * 1000
+        return columnas, tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cálculo de reposición del catálogo")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_calcular = sub.add_parser("calcular", help="Recalcular reposicion_sugerida")
+    p_calcular.add_argument("--ventana", type=int, default=90, help="días de historia de demanda")
+    p_calcular.add_argument("--plazo", type=int, default=7, help="plazo de entrega en días")
+    p_calcular.add_argument("--revision", type=int, default=7, help="días entre pedidos")
+    p_calcular.add_argument("--nivel-defecto", type=float, default=0.95)
+
+    args = parser.parse_args()
+
+    if args.comando == "calcular":
+        service = ReposicionService(
+            ventana_dias=args.ventana,
+            plazo_dias=args.plazo,
+            revision_dias=args.revision,
+            nivel_defecto=args.nivel_defecto,
+        )
+        columnas, tiempos = service.calcular()
+        a_pedir = int(np.count_nonzero(columnas["cantidad_sugerida"]))
+        print(f"{len(columnas['id_producto'])} productos, {a_pedir} con pedido sugerido "
+              f"(consulta {tiempos['consulta']:.0f} ms, cálculo {tiempos['calculo']:.0f} ms, "
+              f"guardado {tiempos['guardado']:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
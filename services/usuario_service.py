@@ -43,6 +43,11 @@ class UsuarioService:
     def obtener_usuarios(self, offset, limit, filtro_campo, filtro_valor, orden):
         return self.repo.obtener(offset, limit, filtro_campo, filtro_valor, orden)
 
+    # Listar usuarios paginando por cursor
+    def obtener_usuarios_keyset(self, limit, cursor=None, hacia_atras=False,
+                                filtro_campo=None, filtro_valor=None, orden_field="nombre_usuario", asc=True):
+        return self.repo.obtener_keyset(limit, cursor, hacia_atras, filtro_campo, filtro_valor, orden_field, asc)
+
     # Actualizar usuario existente
     def actualizar_usuario(self, id_usuario, nombre, email, rol, telefono, password, telegram=None):
 
@@ -0,0 +1,25 @@
+# tests/conftest.py
+"""
+Las pruebas marcadas con @pytest.mark.integracion escriben en la base de
+datos (con el prefijo BENCH, que se borra al terminar): se saltan si no
+hay ninguna configurada (PGDATABASE, en el entorno o en el .env).
+Usar siempre una base de datos de pruebas.
+
+    python -m pytest                      # todas
+    python -m pytest -m "not integracion" # solo las unitarias
+"""
+import os
+
+import pytest
+
+# Carga el .env, igual que la aplicación
+import database.connection  # noqa: F401
+
+
+def pytest_collection_modifyitems(config, items):
+    if os.getenv("PGDATABASE"):
+        return
+    saltar = pytest.mark.skip(reason="No hay base de datos configurada (PGDATABASE)")
+    for item in items:
+        if "integracion" in item.keywords:
+            item.add_marker(saltar)
@@ -0,0 +1,116 @@
+import itertools
+
+import pytest
+
+from utils import cache
+from utils.cache import CacheTTL, _generacion, invalidar, no_cachear
+
+_etiquetas = itertools.count()
+
+
+@pytest.fixture
+def etiqueta():
+    # Las generaciones son globales del proceso: cada prueba usa su etiqueta
+    return f"prueba:{next(_etiquetas)}"
+
+
+def test_obtener_devuelve_copia(etiqueta):
+    c = CacheTTL("prueba")
+    c.guardar("k", {"a": 1}, etiquetas=(etiqueta,))
+    valor = c.obtener("k")
+    valor["a"] = 2
+    assert c.obtener("k") == {"a": 1}
+
+
+def test_guardar_descarta_generacion_antigua(etiqueta):
+    c = CacheTTL("prueba")
+    generacion = _generacion((etiqueta,))
+    invalidar(etiqueta)
+    c.guardar("k", 1, etiquetas=(etiqueta,), generacion=generacion)
+    assert c.obtener("k") is None
+
+    c.guardar("k", 1, etiquetas=(etiqueta,), generacion=_generacion((etiqueta,)))
+    assert c.obtener("k") == 1
+
+
+def test_invalidar_durante_el_calculo_no_guarda(etiqueta):
+    c = CacheTTL("prueba")
+
+    def calcular():
+        invalidar(etiqueta)
+        return "viejo"
+
+    assert c.obtener_o_calcular("k", calcular, etiquetas=(etiqueta,)) == "viejo"
+    assert c.obtener("k") is None
+    assert c.obtener_o_calcular("k", lambda: "nuevo", etiquetas=(etiqueta,)) == "nuevo"
+    assert c.obtener("k") == "nuevo"
+
+
+def test_invalidar_sin_etiquetas_lo_invalida_todo(etiqueta):
+    c = CacheTTL("prueba")
+    generacion = _generacion((etiqueta,))
+    c.guardar("a", 1, etiquetas=(etiqueta,))
+    c.guardar("b", 2)
+    invalidar()
+
+    assert c.obtener("a") is None and c.obtener("b") is None
+    assert _generacion((etiqueta,)) != generacion
+
+
+def test_invalidar_solo_la_etiqueta(etiqueta):
+    c = CacheTTL("prueba")
+    c.guardar("a", 1, etiquetas=(etiqueta,))
+    c.guardar("b", 2, etiquetas=(etiqueta + ":otra",))
+    invalidar(etiqueta)
+    assert c.obtener("a") is None
+    assert c.obtener("b") == 2
+
+
+def test_no_cachear():
+    c = CacheTTL("prueba")
+
+    def calcular():
+        no_cachear()
+        return "fallo"
+
+    assert c.obtener_o_calcular("k", calcular) == "fallo"
+    assert c.obtener("k") is None
+    # La marca no se queda puesta para el siguiente cálculo del hilo
+    c.obtener_o_calcular("k", lambda: "ok")
+    assert c.obtener("k") == "ok"
+
+
+def test_no_cachear_anidado_afecta_al_de_fuera():
+    interna, externa = CacheTTL("interna"), CacheTTL("externa")
+
+    def calcular_interno():
+        no_cachear()
+        return 1
+
+    externa.obtener_o_calcular("k", lambda: interna.obtener_o_calcular("k", calcular_interno) + 1)
+    assert interna.obtener("k") is None
+    assert externa.obtener("k") is None
+
+
+def test_ttl_y_desalojo(monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: ahora[0])
+    c = CacheTTL("prueba", max_entradas=2, ttl=10)
+    c.guardar("a", 1)
+    c.guardar("b", 2)
+    c.obtener("a")
+    c.guardar("c", 3)
+    # Se desaloja la menos usada recientemente
+    assert c.obtener("b") is None
+    ahora[0] += 11
+    assert c.obtener("a") is None
+
+    estadisticas = c.estadisticas()
+    assert estadisticas["desalojos"] == 1
+    assert estadisticas["expiradas"] == 1
+
+
+def test_obtener_sin_contar_fallo():
+    c = CacheTTL("prueba")
+    c.obtener("k", contar_fallo=False)
+    assert c.estadisticas()["fallos"] == 0
@@ -0,0 +1,69 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from services.ingesta_service import FacturaInvalidaError, _cantidad, normalizar_factura
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("3", Decimal("3")),
+    (3, Decimal("3")),
+    (" 12 ", Decimal("12")),
+    ("2,5", Decimal("2.5")),
+    ("1.5", Decimal("1.5")),
+    ("1.000", Decimal("1000")),
+    ("1.000.000", Decimal("1000000")),
+    ("1.000,5", Decimal("1000.5")),
+])
+def test_cantidad(valor, esperado):
+    assert _cantidad(valor) == esperado
+
+
+@pytest.mark.parametrize("valor", ["", None, "abc", "dos"])
+def test_cantidad_no_numerica(valor):
+    assert _cantidad(valor) is None
+
+
+def test_normalizar_lista_aplanada():
+    datos = [
+        {"json": {"codigo_mov": " F1 ", "tipo_movimiento": "VENTA", "id_usuario": "7",
+                  "fecha_mov": "15/01/2025", "nombre_producto": "Leche", "marca": "X", "cantidad": "2"}},
+        {"json": {"nombre_producto": "Pan", "marca": "Y", "cantidad": "1,5"}},
+    ]
+    cabecera, items = normalizar_factura(datos)
+
+    assert cabecera["codigo_mov"] == "F1"
+    assert cabecera["tipo_movimiento"] == "venta"
+    assert cabecera["id_usuario"] == 7
+    assert cabecera["fecha_mov"] == datetime(2025, 1, 15)
+    assert cabecera["metodo_registro"] == "telegram"
+    assert cabecera["referencia"] is None
+    assert items == [
+        {"nombre_producto": "Leche", "marca": "X", "cantidad": Decimal("2")},
+        {"nombre_producto": "Pan", "marca": "Y", "cantidad": Decimal("1.5")},
+    ]
+
+
+def test_normalizar_factura_con_items():
+    cabecera, items = normalizar_factura({"json": {
+        "codigo_mov": "F2", "id_telegram": "123", "fecha_mov": "2025-01-15T10:30:00",
+        "referencia": "", "items": [{"nombre_producto": "Sal", "marca": "", "cantidad": "x"}],
+    }})
+
+    assert cabecera["id_telegram"] == 123
+    assert cabecera["id_usuario"] is None
+    assert cabecera["fecha_mov"] == datetime(2025, 1, 15, 10, 30)
+    assert cabecera["referencia"] is None
+    assert items == [{"nombre_producto": "Sal", "marca": "", "cantidad": None}]
+
+
+def test_normalizar_fecha_no_valida():
+    cabecera, _ = normalizar_factura({"codigo_mov": "F3", "fecha_mov": "ayer", "items": []})
+    assert cabecera["fecha_mov"] is None
+
+
+@pytest.mark.parametrize("datos", [[], "factura", None])
+def test_normalizar_formato_no_reconocido(datos):
+    with pytest.raises(FacturaInvalidaError):
+        normalizar_factura(datos)
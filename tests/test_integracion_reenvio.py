@@ -0,0 +1,57 @@
+"""Reenvíos concurrentes de la misma factura (benchmarks/replay_idempotencia.py, en pequeño)."""
+import pytest
+
+from benchmarks.bench_ingesta import facturas
+from benchmarks.replay_idempotencia import con_otra_cantidad, reenviar_a_la_vez
+from benchmarks.semilla import PREFIJO, limpiar, sembrar
+from database.connection import get_connection
+from services.ingesta_service import FacturaEnConflictoError, IngestaService
+
+pytestmark = pytest.mark.integracion
+
+HILOS = 8
+ITEMS = 3
+
+
+@pytest.fixture
+def lista_facturas():
+    with get_connection() as conn:
+        sembrar(conn, n_movimientos=0, n_productos=10)
+        with conn.cursor() as cur:
+            cur.execute("SELECT MIN(id_usuario) FROM usuarios")
+            id_usuario = cur.fetchone()[0]
+            cur.execute(
+                "SELECT nombre_producto, marca FROM productos WHERE nombre_producto LIKE %s ORDER BY id_producto",
+                (PREFIJO + " producto %",),
+            )
+            productos = cur.fetchall()
+    try:
+        yield list(facturas("PYTEST", 3, ITEMS, id_usuario, productos))
+    finally:
+        with get_connection() as conn:
+            limpiar(conn)
+
+
+def test_reenvio_concurrente_se_registra_una_vez(lista_facturas):
+    service = IngestaService()
+    for factura in lista_facturas:
+        r = reenviar_a_la_vez(service, factura, HILOS)
+        resultados = r["resultados"]
+
+        assert r["transacciones"] == 1
+        assert r["lineas"] == ITEMS
+        assert r["stock_descontado"] == ITEMS
+        assert sum(not x["duplicada"] for x in resultados) == 1
+        assert len({x["id_transaccion"] for x in resultados}) == 1
+        assert len({tuple(x["ids_mov"]) for x in resultados}) == 1
+
+
+def test_mismo_codigo_con_otro_contenido_es_conflicto(lista_facturas):
+    service = IngestaService()
+    factura = lista_facturas[0]
+    service.ingerir(factura)
+
+    with pytest.raises(FacturaEnConflictoError):
+        service.ingerir(con_otra_cantidad(factura))
+    # El original sigue siendo un reenvío válido
+    assert service.ingerir(factura)["duplicada"]
@@ -0,0 +1,31 @@
+"""Registro de movimientos contra la BD: ventas concurrentes (benchmarks/stress_stock.py, en pequeño) y líneas sueltas."""
+import pytest
+
+from benchmarks.semilla import PREFIJO
+from benchmarks.stress_stock import estresar
+from database.connection import get_connection
+from services.inventario_service import InventarioService
+
+pytestmark = pytest.mark.integracion
+
+
+def test_ventas_concurrentes_sin_sobreventa():
+    # 8 hilos × 40 ventas de hasta 9 unidades contra 100 por SKU: se agota y hay rechazos
+    r = estresar(hilos=8, ventas=40, skus=3, stock=100)
+
+    assert r["resultados"]["errores"] == 0
+    assert r["resultados"]["rechazadas"] > 0
+    for id_producto, stock in r["stock_final"].items():
+        assert stock >= 0
+        assert stock == r["stock"] - r["vendido"][id_producto]
+
+
+def test_lineas_sin_transaccion():
+    codigo = f"{PREFIJO}-NO-EXISTE"
+    with pytest.raises(ValueError, match=codigo):
+        InventarioService().registrar_movimiento(None, [{"id_producto": 1, "cantidad": 1}], codigo_mov=codigo)
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM mov_inventario WHERE codigo_mov = %s", (codigo,))
+            assert cur.fetchone()[0] == 0
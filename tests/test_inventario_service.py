@@ -0,0 +1,41 @@
+from decimal import Decimal
+
+from services.inventario_service import diferencias_reenvio
+
+REGISTRADA = {"id_usuario": 1, "referencia": None}
+REGISTRADAS = [
+    {"id_mov": 10, "id_producto": 5, "cantidad": Decimal("2.000"), "tipo_movimiento": "venta"},
+    {"id_mov": 11, "id_producto": 6, "cantidad": Decimal("1"), "tipo_movimiento": "venta"},
+]
+
+
+def _lineas(*lineas):
+    return [{"id_producto": p, "cantidad": c, "tipo_movimiento": t} for p, c, t in lineas]
+
+
+def test_reenvio_exacto():
+    # Otro orden, otra representación de la cantidad y referencia vacía: es el mismo
+    cabecera = {"id_usuario": 1, "referencia": ""}
+    lineas = _lineas((6, 1, "venta"), ("5", "2", "venta"))
+    assert diferencias_reenvio(cabecera, lineas, REGISTRADA, REGISTRADAS) == []
+
+
+def test_reenvio_otro_usuario_y_referencia():
+    cabecera = {"id_usuario": 2, "referencia": "F-9"}
+    lineas = _lineas((5, 2, "venta"), (6, 1, "venta"))
+    diferencias = diferencias_reenvio(cabecera, lineas, REGISTRADA, REGISTRADAS)
+    assert len(diferencias) == 2
+    assert diferencias[0].startswith("usuario 2")
+    assert diferencias[1].startswith("referencia 'F-9'")
+
+
+def test_reenvio_otras_lineas():
+    cabecera = {"id_usuario": 1}
+    for lineas in (
+        _lineas((5, 3, "venta"), (6, 1, "venta")),      # otra cantidad
+        _lineas((5, 2, "compra"), (6, 1, "venta")),     # otro tipo
+        _lineas((5, 2, "venta")),                        # falta una
+        _lineas((5, 1, "venta"), (5, 1, "venta"), (6, 1, "venta")),  # repartida
+    ):
+        diferencias = diferencias_reenvio(cabecera, lineas, REGISTRADA, REGISTRADAS)
+        assert len(diferencias) == 1 and "línea" in diferencias[0]
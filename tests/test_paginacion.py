@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import pytest
+
+from utils.paginacion import codificar_cursor, condicion_keyset, decodificar_cursor
+
+
+@pytest.mark.parametrize("valor, id_fila", [("Leche", 3), (12.5, 7), (None, 9)])
+def test_cursor_ida_y_vuelta(valor, id_fila):
+    cursor = codificar_cursor("nombre_producto", True, valor, id_fila)
+    assert decodificar_cursor(cursor, "nombre_producto", True) == (valor, id_fila)
+
+
+def test_cursor_fecha_como_texto():
+    cursor = codificar_cursor("fecha_registro", False, datetime(2025, 1, 15, 10, 30), 1)
+    assert decodificar_cursor(cursor, "fecha_registro", False) == ("2025-01-15 10:30:00", 1)
+
+
+def test_cursor_de_otro_orden():
+    cursor = codificar_cursor("nombre_producto", True, "Leche", 3)
+    assert decodificar_cursor(cursor, "marca", True) is None
+    assert decodificar_cursor(cursor, "nombre_producto", False) is None
+
+
+@pytest.mark.parametrize("cursor", [None, "", "no-es-base64!", "e30=", "bm9wZQ=="])
+def test_cursor_invalido(cursor):
+    assert decodificar_cursor(cursor, "nombre_producto", True) is None
+
+
+def test_condicion_keyset_sin_clave():
+    condicion, parametros, orden = condicion_keyset("nombre", "id", True, False)
+    assert condicion is None and parametros == []
+    assert orden == " ORDER BY nombre ASC NULLS LAST, id ASC"
+
+
+def test_condicion_keyset_adelante_y_atras():
+    condicion, parametros, _ = condicion_keyset("nombre", "id", True, False, ("Leche", 3))
+    assert condicion == "((nombre, id) > (%s, %s) OR nombre IS NULL)"
+    assert parametros == ["Leche", 3]
+
+    condicion, _, orden = condicion_keyset("nombre", "id", True, True, ("Leche", 3))
+    assert condicion == "(nombre, id) < (%s, %s)"
+    assert orden == " ORDER BY nombre DESC NULLS FIRST, id DESC"
+
+
+def test_condicion_keyset_frontera_nula():
+    condicion, parametros, _ = condicion_keyset("nombre", "id", True, False, (None, 9))
+    assert condicion == "(nombre IS NULL AND id > %s)"
+    assert parametros == [9]
+
+    condicion, _, _ = condicion_keyset("nombre", "id", True, True, (None, 9))
+    assert condicion == "((nombre IS NULL AND id < %s) OR nombre IS NOT NULL)"
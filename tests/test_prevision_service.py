@@ -0,0 +1,42 @@
+from datetime import date
+
+import numpy as np
+
+from services.prevision_service import ajustar_lote, fechas_rotura, prever
+
+
+def test_ajustar_lote_serie_constante():
+    series = np.full((2, 56), 4.0)
+    series[1] = 0.0
+    ajuste = ajustar_lote(series, dia_semana_inicio=0)
+
+    np.testing.assert_allclose(ajuste["nivel"], [4, 0])
+    np.testing.assert_allclose(ajuste["estacionalidad"], 0, atol=1e-12)
+    np.testing.assert_allclose(ajuste["error_medio"], 0, atol=1e-12)
+    assert ajuste["estacionalidad"].shape == (2, 7)
+
+
+def test_ajustar_lote_estacionalidad_semanal():
+    # Empieza en miércoles (2): se vende 10 los sábados (5) y nada el resto
+    dias = np.arange(84)
+    series = np.where((2 + dias) % 7 == 5, 10.0, 0.0)[None, :]
+    ajuste = ajustar_lote(series, dia_semana_inicio=2)
+
+    prevision = prever(ajuste["nivel"], ajuste["estacionalidad"], date(2025, 1, 6), 7)  # lunes
+    assert np.argmax(prevision[0]) == 5
+    assert prevision[0, 5] > 5 * prevision[0, :5].max()
+
+
+def test_fechas_rotura():
+    prevision = np.array([
+        [1.0, 1.0, 1.0, 1.0],   # acumulada 1, 2, 3, 4
+        [1.0, 1.0, 1.0, 1.0],
+        [0.0, 0.0, 0.0, 0.0],
+    ])
+    fechas = fechas_rotura(prevision, [3, 10, 0], date(2025, 1, 1))
+
+    assert fechas[0] == np.datetime64("2025-01-03")
+    # No se agota dentro del horizonte
+    assert np.isnat(fechas[1])
+    # Sin stock: rotura hoy aunque no haya demanda
+    assert fechas[2] == np.datetime64("2025-01-01")
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from services.reposicion_service import calcular_reposicion, niveles_servicio
+
+
+def test_niveles_servicio_fraccion_y_porcentaje():
+    niveles = niveles_servicio([0.9, 95, 1, 100, 50])
+    np.testing.assert_allclose(niveles, [0.9, 0.95, 0.9999, 0.9999, 0.5])
+
+
+def test_niveles_servicio_invalidos_usan_defecto(caplog):
+    niveles = niveles_servicio([None, float("nan"), 0, -1, 20, 150], defecto=0.9)
+    np.testing.assert_allclose(niveles, [0.9] * 6)
+    # Los vacíos no avisan; los valores fuera de rango sí
+    assert "[-1.0, 0.0, 20.0, 150.0]" in caplog.text
+
+
+def test_calcular_reposicion_demanda_constante():
+    # 20 unidades en 10 días, sin variación: sin stock de seguridad
+    columnas = calcular_reposicion(
+        stock_actual=[10, 100, 0], stock_minimo=[5, 0, 0], niveles=[0.95] * 3,
+        dias=[10, 10, 10], suma=[20, 20, 0], suma_cuadrados=[40, 40, 0],
+        plazo_dias=7, revision_dias=7,
+    )
+
+    np.testing.assert_allclose(columnas["demanda_media"], [2, 2, 0])
+    np.testing.assert_allclose(columnas["desviacion"], [0, 0, 0])
+    np.testing.assert_allclose(columnas["punto_pedido"], [14, 14, 0])
+    # Por debajo del punto de pedido se repone hasta d · (L + R) = 28
+    np.testing.assert_allclose(columnas["cantidad_sugerida"], [18, 0, 0])
+    np.testing.assert_allclose(columnas["dias_cobertura"][:2], [5, 50])
+    assert np.isnan(columnas["dias_cobertura"][2])
+
+
+def test_calcular_reposicion_stock_minimo_y_seguridad():
+    # Ventas 0 y 10 en días alternos: media 5, varianza muestral 25 · 10 / 9
+    columnas = calcular_reposicion(
+        stock_actual=[0], stock_minimo=[100], niveles=[0.95],
+        dias=[10], suma=[50], suma_cuadrados=[500], plazo_dias=4, revision_dias=5,
+    )
+
+    desviacion = np.sqrt(250 / 9)
+    z = 1.6448536269514722
+    assert columnas["desviacion"][0] == pytest.approx(desviacion)
+    assert columnas["stock_seguridad"][0] == pytest.approx(z * desviacion * 2)
+    # El punto de pedido no baja del stock mínimo
+    assert columnas["punto_pedido"][0] == 100
+    assert columnas["cantidad_sugerida"][0] == 100
@@ -0,0 +1,221 @@
+# utils/cache.py
+"""
+Caché en memoria compartida por todas las sesiones del mismo proceso.
+
+Cada entrada tiene TTL propio y unas etiquetas ("ventas", "productos",
+"stock"...). Los repositorios llaman a invalidar(etiqueta) tras el commit,
+lo que borra de todas las cachés registradas las entradas con esa etiqueta.
+
+obtener_o_calcular no guarda un valor si alguna de sus etiquetas se
+invalidó mientras se calculaba (pudo leer datos anteriores a la escritura),
+ni si el cálculo llamó a no_cachear() (p. ej. un repositorio que devuelve
+ceros o un DataFrame vacío porque la consulta falló).
+"""
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import pandas as pd
+
+_caches = weakref.WeakSet()
+_caches_lock = threading.Lock()
+_oyentes = []
+
+# Generación de cada etiqueta (y de "invalidar todo"): sube en cada invalidar()
+_generaciones = {}
+_generacion_total = 0
+_generaciones_lock = threading.Lock()
+
+_local = threading.local()
+
+
+def _generacion(etiquetas):
+    with _generaciones_lock:
+        return _generacion_total, tuple(_generaciones.get(e, 0) for e in etiquetas)
+
+
+def no_cachear():
+    """Marca el resultado del obtener_o_calcular en curso (en este hilo) como no cacheable."""
+    _local.no_cachear = True
+
+
+def _tamano(valor):
+    """Estimación en bytes de lo que ocupa un valor cacheado."""
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(_tamano(k) + _tamano(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple, set)):
+        return sys.getsizeof(valor) + sum(_tamano(v) for v in valor)
+    return sys.getsizeof(valor)
+
+
+def _copia(valor):
+    # Los DataFrames y dicts se comparten entre sesiones: cada lector recibe su copia
+    if isinstance(valor, (pd.DataFrame, dict)):
+        return valor.copy()
+    return valor
+
+
+class _Entrada:
+    __slots__ = ("valor", "expira", "etiquetas", "tamano")
+
+    def __init__(self, valor, expira, etiquetas, tamano):
+        self.valor = valor
+        self.expira = expira
+        self.etiquetas = etiquetas
+        self.tamano = tamano
+
+
+class CacheTTL:
+    """Caché LRU acotada por número de entradas y por memoria, con TTL por entrada."""
+
+    def __init__(self, nombre, max_entradas=256, max_bytes=64 * 1024 * 1024, ttl=60.0):
+        self.nombre = nombre
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        self._bytes = 0
+
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.expiradas = 0
+        self.invalidadas = 0
+
+        with _caches_lock:
+            _caches.add(self)
+
+    def _quitar(self, clave):
+        entrada = self._entradas.pop(clave)
+        self._bytes -= entrada.tamano
+        return entrada
+
+    def obtener(self, clave, defecto=None, contar_fallo=True):
+        """
+        Valor cacheado (una copia) o `defecto`. Con contar_fallo=False un
+        fallo no cuenta en las estadísticas: para mirar antes de un
+        obtener_o_calcular que ya lo contará.
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += contar_fallo
+                return defecto
+            if entrada.expira <= time.monotonic():
+                self._quitar(clave)
+                self.expiradas += 1
+                self.fallos += contar_fallo
+                return defecto
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return _copia(entrada.valor)
+
+    def guardar(self, clave, valor, ttl=None, etiquetas=(), generacion=None):
+        """
+        Guarda `valor`. Si se pasa `generacion` (la de _generacion(etiquetas)
+        antes de calcularlo) y alguna etiqueta se ha invalidado desde
+        entonces, no se guarda.
+        """
+        tamano = _tamano(valor)
+        if tamano > self.max_bytes:
+            return
+        expira = time.monotonic() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            # Se comprueba con el lock tomado: un invalidar() posterior
+            # espera a este lock y borra la entrada
+            if generacion is not None and generacion != _generacion(etiquetas):
+                return
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = _Entrada(_copia(valor), expira, frozenset(etiquetas), tamano)
+            self._bytes += tamano
+
+            while self._entradas and (
+                len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes
+            ):
+                self._quitar(next(iter(self._entradas)))
+                self.desalojos += 1
+
+    def obtener_o_calcular(self, clave, calcular, ttl=None, etiquetas=()):
+        """
+        Devuelve el valor cacheado o lo calcula con `calcular()` y lo guarda,
+        salvo que se invalide alguna de sus etiquetas durante el cálculo o
+        este llame a no_cachear().
+        """
+        faltante = object()
+        valor = self.obtener(clave, faltante)
+        if valor is not faltante:
+            return valor
+
+        generacion = _generacion(etiquetas)
+        anterior = getattr(_local, "no_cachear", False)
+        _local.no_cachear = False
+        try:
+            valor = calcular()
+            cacheable = not _local.no_cachear
+        finally:
+            # Un cálculo anidado que no se cachea tampoco deja cachear al de fuera
+            _local.no_cachear = anterior or _local.no_cachear
+        if cacheable:
+            self.guardar(clave, valor, ttl, etiquetas, generacion)
+        return valor
+
+    def invalidar(self, *etiquetas):
+        """Borra las entradas con alguna de las etiquetas (todas si no se indica ninguna)."""
+        with self._lock:
+            if not etiquetas:
+                borrar = list(self._entradas)
+            else:
+                buscadas = set(etiquetas)
+                borrar = [c for c, e in self._entradas.items() if e.etiquetas & buscadas]
+            for clave in borrar:
+                self._quitar(clave)
+            self.invalidadas += len(borrar)
+            return len(borrar)
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "nombre": self.nombre,
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "ratio_aciertos": round(self.aciertos / consultas, 3) if consultas else 0.0,
+                "desalojos": self.desalojos,
+                "expiradas": self.expiradas,
+                "invalidadas": self.invalidadas,
+            }
+
+
+def al_invalidar(funcion):
+    """Registra `funcion(etiquetas)` para que se llame en cada invalidar()."""
+    with _caches_lock:
+        _oyentes.append(funcion)
+    return funcion
+
+
+def invalidar(*etiquetas):
+    """Invalida las etiquetas indicadas (todas si no se indica ninguna) en todas las cachés del proceso."""
+    global _generacion_total
+    with _generaciones_lock:
+        if etiquetas:
+            for etiqueta in etiquetas:
+                _generaciones[etiqueta] = _generaciones.get(etiqueta, 0) + 1
+        else:
+            _generacion_total += 1
+    with _caches_lock:
+        caches = list(_caches)
+        oyentes = list(_oyentes)
+    for funcion in oyentes:
+        funcion(etiquetas)
+    for cache in caches:
+        cache.invalidar(*etiquetas)
@@ -0,0 +1,71 @@
+# utils/paginacion.py
+"""
+Cursores opacos para la paginación por clave (keyset / seek).
+
+Un cursor guarda el campo y sentido de orden con los que se generó y la
+clave de la fila frontera (valor del campo de orden + id). La consulta
+siguiente pide las filas estrictamente posteriores (o anteriores) a esa
+clave, así que su coste no depende del número de página y no se saltan
+ni repiten filas aunque se inserten productos mientras se pagina.
+"""
+import base64
+import json
+
+
+def codificar_cursor(orden_field, asc, valor, id_fila):
+    datos = {"o": orden_field, "a": bool(asc), "v": [valor, id_fila]}
+    texto = json.dumps(datos, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(texto.encode("utf-8")).decode("ascii")
+
+
+def decodificar_cursor(cursor, orden_field, asc):
+    """
+    Devuelve (valor, id_fila) o None si el cursor está vacío, es inválido
+    o se generó con otro orden (en ese caso se empieza desde el principio).
+    """
+    if not cursor:
+        return None
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if datos["o"] != orden_field or datos["a"] != bool(asc):
+            return None
+        valor, id_fila = datos["v"]
+        return valor, id_fila
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def condicion_keyset(orden_field, id_field, asc, hacia_atras, clave=None):
+    """
+    Predicado de fila (con sus parámetros) y ORDER BY para pedir la página
+    siguiente o anterior a `clave` ((valor, id_fila) de decodificar_cursor;
+    sin clave no hay predicado). Hacia atrás se invierte el orden y luego
+    hay que dar la vuelta a las filas.
+
+    Las filas con el campo de orden a NULL van siempre al final del listado
+    (NULLS LAST en ambos sentidos): la comparación de filas
+    (campo, id) > (valor, id) da NULL con un NULL y las dejaría fuera, así
+    que se tratan en ramas aparte.
+    Devuelve (condicion, parametros, orden).
+    """
+    adelante = asc != hacia_atras
+    comparador = ">" if adelante else "<"
+    direccion = "ASC" if adelante else "DESC"
+    nulos = "FIRST" if hacia_atras else "LAST"
+    orden = f" ORDER BY {orden_field} {direccion} NULLS {nulos}, {id_field} {direccion}"
+    if clave is None:
+        return None, [], orden
+
+    valor, id_fila = clave
+    if valor is None:
+        # Frontera entre los NULL: hacia delante solo quedan NULL; hacia
+        # atrás, los NULL anteriores y todos los que tienen valor
+        condicion = f"({orden_field} IS NULL AND {id_field} {comparador} %s)"
+        if hacia_atras:
+            condicion = f"({condicion} OR {orden_field} IS NOT NULL)"
+        return condicion, [id_fila], orden
+
+    condicion = f"({orden_field}, {id_field}) {comparador} (%s, %s)"
+    if not hacia_atras:
+        condicion = f"({condicion} OR {orden_field} IS NULL)"
+    return condicion, [valor, id_fila], orden